@@ -0,0 +1,235 @@
+"""Extract and validate the missense mutations of the COSMIC export and the TCGA MAF files for mutation.py.
+
+CosmicMutantExport.tsv is divided into byte ranges that begin and end on line boundaries, and each range is parsed by a
+worker process. A worker splits each line only as far as the last column needed, validates the candidate mutations of
+its range against the UniProt sequence store in one batch, and returns the output lines of the valid ones with the
+repeats within the range removed. The main process then merges the ranges in the order of the file and removes the
+mutations that were already seen in earlier ranges. Whether a mutation is valid depends only on its UniProt ID and
+protein mutation, so this gives the same output as reading the file line by line.
+
+The TCGA files are parsed concurrently, one file per worker. A worker returns the valid rows of its file in the order
+of its lines, with the repeats within the file removed, and the files are yielded in order as soon as each one and the
+files before it are done, so that the caller can save its progress after each file. Repeats across files, and against
+COSMIC, are left to the caller, which removes them with external_dedup.py."""
+
+import multiprocessing
+import os
+
+import common_tools
+import interning
+import mutation_validation
+import sequence_store
+
+CHUNK_SIZE = 1 << 26  # number of bytes of the COSMIC file parsed by a worker at once
+
+RELEVANT_MUTATIONS = ("Substitution - Missense", "Missense_Mutation")
+MUTATION_TYPE_CONVERT = {"Deletion - Frameshift":           "Del_Frameshift",
+                         "Deletion - In frame":             "Del_Inframe",
+                         "Insertion - Frameshift":          "Ins_Frameshift",
+                         "Insertion - In frame":            "Ins_Inframe",
+                         "Substitution - Missense":         "Missense",
+                         "Substitution - coding silent":    "Silent",
+                         "Missense_Mutation":               "Missense",
+                         "Silent":                          "Silent",
+                         "Frame_Shift_Del":                 "Del_Frameshift",
+                         "In_Frame_Del":                    "Del_Inframe",
+                         "Frame_Shift_Ins":                 "Ins_Frameshift",
+                         "In_Frame_Ins":                    "Ins_Inframe"}
+
+# columns of CosmicMutantExport.tsv
+COSMIC_GENE_NAME_COLUMN = 0
+COSMIC_MUTATION_ID_COLUMN = 16
+COSMIC_PROTEIN_MUTATION_COLUMN = 18
+COSMIC_MUTATION_TYPE_COLUMN = 19
+
+# columns of the TCGA MAF files
+TCGA_MUTATION_TYPE_COLUMN = 8
+TCGA_PROTEIN_MUTATION_COLUMN = 36
+TCGA_GENE_NAME_COLUMN = 60
+TCGA_UNIPROT_COLUMN = 67
+
+worker_cosmic_to_uniprot = None  # map from gene name to UniProt ID, set in each worker process by init_worker
+worker_uniprot_seq = None  # sequence store, opened in each worker process by init_worker
+worker_uniprot_codes = None  # interning.AccessionCodes, opened in each worker process by init_worker
+
+
+def load_cosmic_uniprot(filepath):
+    """Return a dictionary that maps each gene name in the COSMIC mapping file at filepath to a UniProt ID."""
+    cosmic_to_uniprot = {}
+    with open(filepath) as uniprot_file:
+        next(uniprot_file)
+        for line in uniprot_file:
+            line = line.split()
+            if len(line) == 2:
+                cosmic_to_uniprot[line[0]] = line[1]
+    return cosmic_to_uniprot
+
+
+def valid_rows(uniprot_seq, uniprot_codes, candidates):
+    """Validate the list of candidate mutations against the sequence store uniprot_seq in one batch. Each candidate is a
+    list [gene_name, uniprot_id, mutation_id, protein_mutation, mutation_type, source, mutation_position]. Return a
+    tuple (rows, num_skipped), where rows is the list of tuples (key, output line) for the valid candidates, in order,
+    keeping only the first of the candidates with the same UniProt ID and protein mutation. key is the mutation packed
+    by interning.pack_mutation with the codes in uniprot_codes. Valid candidates whose mutant residue is not a letter or
+    "*" cannot be packed, so they are left out of rows, and num_skipped is the number of them."""
+    valid = mutation_validation.validate(uniprot_seq, [x[1] for x in candidates], [x[6] for x in candidates],
+                                         [x[3][0] for x in candidates])[0]
+    rows = []
+    num_skipped = 0
+    seen = set()
+    for candidate, is_valid in zip(candidates, valid.tolist()):
+        if not is_valid:
+            continue
+        try:
+            key = interning.pack_mutation(uniprot_codes.code(candidate[1]), candidate[3])
+        except KeyError:
+            num_skipped += 1
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        new_data = candidate[:6]
+        new_data[4] = MUTATION_TYPE_CONVERT[new_data[4]]
+        for x in range(len(new_data)):
+            if not new_data[x]:
+                new_data[x] = "-"
+        rows.append((key, "\t".join(new_data) + "\n"))
+    return rows, num_skipped
+
+
+def cosmic_candidates(lines, cosmic_to_uniprot):
+    """Given an iterable of lines of the COSMIC file, return the list of candidate mutations in them, in the form taken
+    by valid_rows."""
+    candidates = []
+    last_column = COSMIC_MUTATION_TYPE_COLUMN + 1
+    for line in lines:
+        if "Missense" not in line:  # cheap check before splitting the line
+            continue
+        line = line.rstrip("\r\n").split("\t", last_column)
+        if len(line) < last_column:
+            continue
+        gene_name = line[COSMIC_GENE_NAME_COLUMN]
+        if "_" in gene_name:
+            gene_name = gene_name[:gene_name.index("_")]
+        mutation_type = line[COSMIC_MUTATION_TYPE_COLUMN]
+        protein_mutation = line[COSMIC_PROTEIN_MUTATION_COLUMN][2:]
+        uniprot_id = cosmic_to_uniprot.get(gene_name, "-")
+        if mutation_type not in RELEVANT_MUTATIONS or "?" in protein_mutation or uniprot_id == "-":
+            # If this mutation has an unwanted type or has unknown UniProt ID, then ignore it.
+            continue
+
+        try:
+            mutation_position = int(protein_mutation[1:-1])
+        except ValueError:  # if mutation is formatted weirdly, skip it
+            print("\t" + protein_mutation + "is formatted weirdly, skipping")
+            continue
+        candidates.append([gene_name, uniprot_id, line[COSMIC_MUTATION_ID_COLUMN], protein_mutation, mutation_type,
+                           "COSMIC", mutation_position])
+    return candidates
+
+
+def tcga_candidates(lines):
+    """Given an iterable of lines of a TCGA MAF file without its 2 header lines, return the list of candidate mutations
+    in them, in the form taken by valid_rows."""
+    candidates = []
+    last_column = TCGA_UNIPROT_COLUMN + 1
+    for line in lines:
+        if "Missense_Mutation" not in line:  # cheap check before splitting the line
+            continue
+        line = line.rstrip("\r\n").split("\t", last_column)
+        if len(line) < last_column:
+            continue
+        mutation_type = line[TCGA_MUTATION_TYPE_COLUMN]
+        gene_name = line[TCGA_GENE_NAME_COLUMN]
+        protein_mutation = line[TCGA_PROTEIN_MUTATION_COLUMN][2:]
+        uniprot_id = line[TCGA_UNIPROT_COLUMN]
+        if mutation_type not in RELEVANT_MUTATIONS or "?" in protein_mutation or not uniprot_id or not protein_mutation:
+            # If this mutation has an unwanted type or has unknown UniProt ID, then ignore it.
+            continue
+
+        try:
+            mutation_position = int(protein_mutation[1:-1])
+        except ValueError:
+            print("\t" + protein_mutation + "is formatted weirdly, skipping")
+            continue
+        candidates.append([gene_name, uniprot_id, "-", protein_mutation, mutation_type, "TCGA", mutation_position])
+    return candidates
+
+
+def update_codes():
+    """Give codes to the proteins of the sequence store that have none yet, before the worker processes read them."""
+    interning.open_codes(sequence_store.open_store())
+
+
+def init_worker(cosmic_to_uniprot=None):
+    """Store the mapping from gene name to UniProt ID, which is only needed for COSMIC, and open the sequence store and
+    the UniProt codes in a worker process. The codes must already be up to date (see update_codes)."""
+    global worker_cosmic_to_uniprot, worker_uniprot_seq, worker_uniprot_codes
+    worker_cosmic_to_uniprot = cosmic_to_uniprot
+    worker_uniprot_seq = sequence_store.open_store()
+    worker_uniprot_codes = interning.open_codes()
+
+
+def extract_cosmic_chunk(args):
+    """Given a tuple (filepath, start, end), return a tuple (rows, num_skipped), as returned by valid_rows, for the
+    lines of the COSMIC file that begin within that byte range."""
+    filepath, start, end = args
+    candidates = cosmic_candidates(common_tools.chunk_lines(filepath, start, end), worker_cosmic_to_uniprot)
+    return valid_rows(worker_uniprot_seq, worker_uniprot_codes, candidates)
+
+
+def extract_cosmic(filepath, cosmic_to_uniprot, num_processes=None, start=0):
+    """Yield tuples (rows, num_skipped, offset) for successive parts of the COSMIC file at filepath, where rows and
+    num_skipped are as returned by valid_rows for that part, and offset is the byte offset at which the next part
+    begins. Passing such an offset as start continues the extraction from there; a start of 0 skips the header line.
+    The file is parsed by num_processes worker processes, which defaults to the number of CPUs."""
+    if start == 0:
+        with open(filepath, "rb") as f:
+            start = len(f.readline())
+    update_codes()
+    num_processes = num_processes or os.cpu_count() or 1
+    num_chunks = (os.path.getsize(filepath) - start) // CHUNK_SIZE + 1
+    chunks = [(filepath, chunk_start, end) for chunk_start, end in
+              common_tools.file_chunks(filepath, num_chunks, start)]
+    if num_processes == 1:
+        init_worker(cosmic_to_uniprot)
+        for chunk in chunks:
+            yield extract_cosmic_chunk(chunk) + (chunk[2],)
+        return
+    with multiprocessing.Pool(num_processes, initializer=init_worker, initargs=(cosmic_to_uniprot,)) as pool:
+        for chunk, (rows, num_skipped) in zip(chunks, pool.imap(extract_cosmic_chunk, chunks)):
+            yield rows, num_skipped, chunk[2]
+
+
+def extract_tcga_file(args):
+    """Given a tuple (filepath, start), return a tuple (lines, num_skipped), where lines is the list of valid output
+    lines of the TCGA MAF file at filepath from byte offset start, which must be on a line boundary, to the end, in
+    order, keeping only the first line of each mutation, and num_skipped is as returned by valid_rows. A start of 0
+    skips the 2 header lines."""
+    filepath, start = args
+    with open(filepath, "rb") as f:
+        if start == 0:
+            f.readline()
+            f.readline()  # skip first 2 lines
+            start = f.tell()
+    candidates = tcga_candidates(common_tools.chunk_lines(filepath, start, os.path.getsize(filepath)))
+    rows, num_skipped = valid_rows(worker_uniprot_seq, worker_uniprot_codes, candidates)
+    return [row for key, row in rows], num_skipped
+
+
+def extract_tcga(filepaths, num_processes=None, start=0):
+    """Given a list of paths to TCGA MAF files, yield for each file, in order, a tuple (lines, num_skipped) as returned
+    by extract_tcga_file. A file is yielded as soon as it and the files before it are parsed. The first file
+    is read from byte offset start, and the files are parsed by num_processes worker processes, which defaults to the
+    number of CPUs."""
+    tasks = [(filepath, start if file_index == 0 else 0) for file_index, filepath in enumerate(filepaths)]
+    update_codes()
+    num_processes = min(num_processes or os.cpu_count() or 1, max(len(tasks), 1))
+    if num_processes == 1:
+        init_worker()
+        for task in tasks:
+            yield extract_tcga_file(task)
+        return
+    with multiprocessing.Pool(num_processes, initializer=init_worker) as pool:
+        for result in pool.imap(extract_tcga_file, tasks):
+            yield result
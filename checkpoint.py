@@ -0,0 +1,75 @@
+"""Save and restore the progress of long-running extraction scripts, so that a script that is killed can resume where it
+left off and still write exactly the same output file.
+
+A checkpoint is a JSON file next to the output file, named <output>.checkpoint. It holds the number of bytes of the
+output file that are complete, the position of the script in its input files, and the sizes and modification times of
+the input files. It is written only after the output file has been flushed to disk, and it is replaced atomically, so
+the output file is always at least as long as the checkpoint says. On resume, the output file is truncated to the
+recorded length, and the script continues from the recorded position and rebuilds any other state from the output
+file. A checkpoint is ignored if any input file has changed since it was written."""
+
+import json
+import os
+
+
+def checkpoint_filepath(output_filepath):
+    """Return the path of the checkpoint file of the output file at output_filepath."""
+    return output_filepath + ".checkpoint"
+
+
+def input_signature(filepaths):
+    """Return a dictionary that maps each of filepaths to a list [size, modification time in ns] of the file."""
+    signature = {}
+    for filepath in filepaths:
+        stat = os.stat(filepath)
+        signature[filepath] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def load_checkpoint(output_filepath, signature):
+    """Return the position saved in the checkpoint of the output file at output_filepath, or None if there is no usable
+    checkpoint. A checkpoint is usable if it was saved for input files with the given signature (see input_signature)
+    and the output file is at least as long as it says."""
+    try:
+        with open(checkpoint_filepath(output_filepath)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (state.get("inputs") != signature or not os.path.isfile(output_filepath)
+            or os.path.getsize(output_filepath) < state["output_offset"]):
+        return None
+    return state
+
+
+def save_checkpoint(fwrite, output_filepath, signature, position):
+    """Flush the open output file fwrite to disk and record that the script has written it up to its current end after
+    reaching position in its input files, where position is any JSON-serializable value."""
+    fwrite.flush()
+    os.fsync(fwrite.fileno())
+    state = {"inputs": signature, "position": position, "output_offset": fwrite.tell()}
+    temp_filepath = checkpoint_filepath(output_filepath) + ".tmp"
+    with open(temp_filepath, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filepath, checkpoint_filepath(output_filepath))
+
+
+def open_output(output_filepath, state, header, buffering=-1):
+    """Open the output file for writing. If state is a checkpoint returned by load_checkpoint, then the file is
+    truncated to the length recorded in it and opened for appending. Otherwise, the file is created and header is
+    written."""
+    if state is None:
+        fwrite = open(output_filepath, "w", buffering=buffering)
+        fwrite.write(header)
+        return fwrite
+    os.truncate(output_filepath, state["output_offset"])
+    return open(output_filepath, "a", buffering=buffering)
+
+
+def remove_checkpoint(output_filepath):
+    """Delete the checkpoint of the output file at output_filepath after the script has finished."""
+    try:
+        os.remove(checkpoint_filepath(output_filepath))
+    except FileNotFoundError:
+        pass
@@ -1,31 +1,49 @@
 """Extract the missense mutations of interest from ClinVar (date file at
-ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited/variant_summary.txt.gz).
+ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited/variant_summary.txt.gz). The file is read gzipped if
+../Mutation Control/ClinVar/variant_summary.txt.gz exists, and unzipped from variant_summary.txt otherwise.
 
-Bisque is used to map the RefSeq IDs to UniProt. In the case that a RefSeq ID can be mapped to multiple UniProt IDs, an
-arbitrary one is chosen.
+The RefSeq IDs are mapped to UniProt with the index of id_mapping.py. In the case that a RefSeq ID can be mapped to
+multiple UniProt IDs, one is chosen as described there. To use a different mapping, pass a mapping file that was saved
+by Bisque, which has RefSeq IDs in the first column and UniProt IDs in the fourth column of comma-separated lines.
 
-Argument to this script must be a comma-separated list of Clinical significance values to extract, surrounded by
-quotes."""
+This script takes the following arguments in the order given:
 
+comma-separated list of Clinical significance values to extract, surrounded by quotes
+(optional) --mapping followed by the path to the mapping file"""
+
+import os
 import sys
 import common_tools
+import id_mapping
+import interning
+import mutation_validation
+import sequence_store
 
-clinvar_filepath = "../Mutation Control/ClinVar/variant_summary.txt"
+clinvar_filepath = "../Mutation Control/ClinVar/variant_summary.txt.gz"
+if not os.path.isfile(clinvar_filepath):
+    clinvar_filepath = "../Mutation Control/ClinVar/variant_summary.txt"
 output_filepath = "../Mutation Control/ClinVar.txt"
 
 assert len(sys.argv) > 1, "Need Clinical Significance argument"
 clinsig_filter = set(sys.argv[1].split(","))  # set of clinical significance to accept
 print("Keeping only mutations {}".format(clinsig_filter))
+mapping_filepath = None
+if len(sys.argv) > 2:
+    assert len(sys.argv) == 4 and sys.argv[2] == "--mapping"
+    mapping_filepath = sys.argv[3]
+    assert os.path.isfile(mapping_filepath)
 
 fwrite = open(output_filepath, "w")
 fwrite.write("GeneName\tUniProtID\tMutationID\tProteinMutation\n")
-clinvar_file = open(clinvar_filepath)
+clinvar_file = common_tools.open_text(clinvar_filepath)
 next(clinvar_file)  # skip first line
 genename_mutationid_proteinmutation = []  # list of tuple (GeneName, UniProtID, MutationID, ProteinMutation)
 refseq_ids = set()  # list of RefSeq IDs that need to be mapped to UniProt
 
-# extract relevant data from ClinVar file
+# extract relevant data from ClinVar file, streaming it and filtering each line as it is read
 for line in clinvar_file:
+    if "(p." not in line or "GRCh38" not in line:
+        continue  # cheap check before splitting the line
     line_l = line.rstrip().split("\t")
     type = line_l[1]
     name = line_l[2]
@@ -37,56 +55,52 @@ for line in clinvar_file:
         continue  # filter out mutations we don't want
     rs_num = line_l[9]
     protein_mutation = name[name.index("(p.")+3: name.rindex(")")]
-    protein_mutation = common_tools.mutation_abbrev(protein_mutation)  # convert to 1-letter abbreviations
+    try:
+        protein_mutation = common_tools.mutation_abbrev(protein_mutation)  # convert to 1-letter abbreviations
+    except KeyError:  # skip this mutation if it is not a substitution between two standard amino acids
+        continue
     refseq_id = name[:name.index("(")]
     # temporarily hold RefSeq ID instead of UniProt ID
     genename_mutationid_proteinmutation.append([gene_symbol, refseq_id, rs_num, protein_mutation])
     refseq_ids.add(refseq_id)
+clinvar_file.close()
 
 
-# get help from user to do mapping with Bisque
-with open("to_map.txt", "w") as to_map:
-    to_map.write("\n".join(refseq_ids))
-    to_map.write("\n")
-input("Use Bisque and store result in text format in from_map.txt. Make sure there are no headers.\n"
-      "Press Enter when you are done.\n")
-
-while True:
-    try:
-        from_map = open("from_map.txt")
-        break
-    except FileNotFoundError:
-        input("from_map.txt not found. Press Enter to try again.\n")
-
-refseq2uniprot = {}
-for line in from_map:
-    line_l = line.rstrip().split(",")
-    refseq = line_l[0]
-    uniprot = line_l[3]
-    refseq2uniprot[refseq] = uniprot
+if mapping_filepath is None:
+    id_map = id_mapping.open_index()
+    refseq2uniprot = id_map.lookup(refseq_ids)
+    id_map.close()
+else:
+    refseq2uniprot = {}
+    with open(mapping_filepath) as from_map:
+        for line in from_map:
+            line_l = line.rstrip().split(",")
+            refseq = line_l[0]
+            uniprot = line_l[3]
+            refseq2uniprot[refseq] = uniprot
 
 # filter out unmappable ones, mismatches, and repeats
-uniprot2seq = common_tools.uniprot2seq(refseq2uniprot.values())
-filtered_mutations = []
-map_count = 0  # number of successful maps
-mismatch_count = 0  # number of mismatches
-already_seen = set()  # set of (UniProtID, ProteinMutation)
+uniprot_seq = sequence_store.open_store()
+uniprot_codes = interning.open_codes(uniprot_seq)
+candidates = []
+already_seen = set()  # set of packed (UniProtID, ProteinMutation) keys
 for entry in genename_mutationid_proteinmutation:
-    mutation_position = int(entry[3][1:-1])
-    original = entry[3][0]
     try:
         entry[1] = refseq2uniprot[entry[1]]
     except KeyError:
         continue
-    if entry[1] in uniprot2seq:
-        seq = uniprot2seq[entry[1]]
-        if (entry[1], entry[3]) not in already_seen:
-            already_seen.add((entry[1], entry[3]))
-            if mutation_position < len(seq) and seq[mutation_position] == original:
-                filtered_mutations.append(entry)
-                map_count += 1
-            else:
-                mismatch_count += 1
+    if entry[1] not in uniprot_seq:
+        continue
+    key = interning.pack_mutation(uniprot_codes.code(entry[1]), entry[3])
+    if key not in already_seen:
+        already_seen.add(key)
+        candidates.append(entry)
+valid, reasons = mutation_validation.validate(uniprot_seq, [x[1] for x in candidates],
+                                              [int(x[3][1:-1]) for x in candidates], [x[3][0] for x in candidates])
+filtered_mutations = [entry for entry, is_valid in zip(candidates, valid.tolist()) if is_valid]
+statistics = mutation_validation.validation_statistics(reasons)
+map_count = statistics["Valid"]  # number of successful maps
+mismatch_count = statistics["Invalid"]  # number of mismatches
 
 # write mutations to file
 for entry in filtered_mutations:
@@ -95,4 +109,4 @@ for entry in filtered_mutations:
 print("Successfully mapped: {}".format(map_count))
 print("Mismatches: {}".format(mismatch_count))
 
-clinvar_file.close()
+fwrite.close()
@@ -1,47 +1,45 @@
 """Common functions and constants to be reused in multiple scripts."""
 
+import gzip
 import os
 
+import hgvs_protein
+import sequence_store
+
+
+amino_acid_abbrev = hgvs_protein.STANDARD_ABBREV  # map from 3-letter abbreviation to 1-letter abbreviation
 
-amino_acid_abbrev = {'Cys':'C', 'Asp':'D', 'Ser':'S', 'Gln':'Q', 'Lys':'K', 'Ile':'I', 'Pro':'P', 'Thr':'T', 'Phe':'F',
-                     'Asn':'N', 'Gly':'G', 'His':'H', 'Leu':'L', 'Arg':'R', 'Trp':'W', 'Ala':'A', 'Val':'V', 'Glu':'E',
-                     'Tyr':'Y', 'Met':'M'}
 
 def mutation_abbrev(m):
     """Given mutation m as a string that has 3-letter amino acid abbreviations, return the mutation using 1-letter
-    amino acid abbreviations. Example: "Ser180Asn" becomes "S180N"."""
-    start_position = -1
-    end_position = -1
-    for x in range(len(m)):
-        if m[x].isdigit() and start_position == -1:
-            start_position = x
-        elif start_position != -1 and end_position == -1 and not m[x].isdigit():
-            end_position = x
-            break
-    return amino_acid_abbrev[m[:start_position]] + m[start_position: end_position] + amino_acid_abbrev[m[end_position:]]
+    amino acid abbreviations. Example: "Ser180Asn" becomes "S180N". Raise KeyError if m is not a substitution between
+    two of the 20 standard amino acids, such as "Gly12=" or "Arg97Ter". Use hgvs_protein directly to parse those."""
+    change = hgvs_protein.parse_three_letter(m)
+    if not hgvs_protein.is_standard(change) or m.endswith("="):
+        raise KeyError(m)
+    return hgvs_protein.one_letter(change)
 
 
 def uniprot2seq(uniprots):
     """Return a dictionary that maps each UniProtID of the list uniprots to its sequence, prepended with ">".
-    This is done by searching the folder ../UniProt Sequences/ for the FASTA sequence. If a certain sequence is not
-    found or if the file does not contain a valid FASTA sequence, then ignore it."""
-    uniprot_seq = {}
-    for uniprot in uniprots:
-        try:
-            with open("../UniProt Sequences/" + uniprot + ".fasta") as seq_file:
-                seq = seq_file.read()
-                seq = ">" + seq[seq.index("\n")+1:].replace("\n", "")
-                uniprot_seq[uniprot] = seq
-        except (FileNotFoundError, ValueError):
-            pass
-    return uniprot_seq
+    The sequences are read from the packed sequence store of ../UniProt Sequences/ (see sequence_store.py). If a
+    certain sequence is not found or if its file does not contain a valid FASTA sequence, then ignore it."""
+    store = sequence_store.open_store()
+    return {uniprot: store[uniprot] for uniprot in uniprots if uniprot in store}
 
 
 def uniprot2seq_all():
-    """Return a dictionary that maps each UniProtID in ../UniProt Sequences/ to its sequence, prepended with ">".
-    If a file does not contain a valid FASTA sequence, then ignore it."""
-    uniprots = [x[:x.index(".")] for x in os.listdir("../UniProt Sequences")]
-    return uniprot2seq(uniprots)
+    """Return a read-only mapping from each UniProtID in ../UniProt Sequences/ to its sequence, prepended with ">".
+    The mapping is the memory-mapped sequence store, so sequences are only read when they are looked up. If a file does
+    not contain a valid FASTA sequence, then it is not in the mapping."""
+    return sequence_store.open_store()
+
+
+def open_text(filepath):
+    """Open the file at filepath for reading text, decompressing it if it is gzipped or bgzipped."""
+    with open(filepath, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(filepath, "rt") if gzipped else open(filepath)
 
 
 def head(filepath, n, start=0):
@@ -61,3 +59,32 @@ def head(filepath, n, start=0):
             break
     file.close()
     return "".join(lines)
+
+
+def file_chunks(filepath, num_chunks, start=0):
+    """Divide the file at filepath into at most num_chunks byte ranges of roughly equal size that begin and end on line
+    boundaries. Return a list of (start, end) byte offsets that together cover the file from byte offset start, which
+    must be on a line boundary, to the end."""
+    size = os.path.getsize(filepath)
+    boundaries = [start]
+    with open(filepath, "rb") as f:
+        for i in range(1, num_chunks):
+            f.seek(max(start + (size - start) * i // num_chunks, boundaries[-1]))
+            f.readline()  # move to the start of the next line
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(a, b) for a, b in zip(boundaries, boundaries[1:]) if a < b]
+
+
+def chunk_lines(filepath, start, end, encoding="utf8"):
+    """Yield the decoded lines of the file at filepath that begin within the byte range [start, end). start must be on
+    a line boundary, as returned by file_chunks."""
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode(encoding)
@@ -7,113 +7,256 @@ This script takes the following arguments in the order given:
 path the to file containing the mutations
     Must be tab-delimited with columns GeneName, UniProtID, MutationID, ProteinMutation in that order
 type of disordered region to consider, must be "All", "Exp", or "DisProt"
+
+In batch mode, the reference data are loaded only once and the counts for every combination of mutation file and type
+of disordered region are written to one table. Batch mode takes the following arguments in the order given:
+
+--batch
+path to the output file
+    Written as JSON if the path ends in ".json", and as a tab-delimited table otherwise
+comma-separated list of types of disordered region to consider, each of which must be "All", "Exp", or "DisProt"
+paths to one or more files containing the mutations
+
+Breakdown mode writes the counts and numbers of residues for each protein and for each Pfam interface domain (from the
+PfamA and PfamB columns of hSIN_organized.txt) in a single pass over the mutations. Memory use grows with the number of
+proteins and domains, not with the number of mutations. Only proteins for which there is at least one mutation, disorder
+data are available, and interface data are available are included. A mutation in more than one domain is counted once
+for each domain. Breakdown mode takes the following arguments in the order given:
+
+--breakdown
+path the to file containing the mutations
+type of disordered region to consider, must be "All", "Exp", or "DisProt"
+prefix of the output files
+    The tables are written to <prefix>_protein.tsv and <prefix>_pfam.tsv
+
+The counting and batch modes also accept "--processes N" before the other arguments. The mutation files are then
+split into chunks on line boundaries, which are parsed and classified by N worker processes that share the reference
+data, and the per-chunk counts are combined. The results are identical to those of a run with a single process.
 """
 
 import sys
 import os
+import json
+import multiprocessing
+import numpy as np
+import common_tools
+import index_cache
+import mutation_reader
+import region_index
+import residue_annotation
+
+CATEGORIES = ("Mutations in disordered interface",
+              "Mutations in structured interface",
+              "Disordered interface total # of residues",
+              "Structured interface total # of residues",
+              "Total number of proteins considered")
+
+
+def count_mutations(annotation, batches, disorder_types):
+    """Classify the mutations in the iterable of mutation_reader.MutationBatch objects, whose UniProt codes must be the
+    protein indexes of annotation, and return a list with one tuple (in_disordered_interface, in_structured_interface,
+    mut_uniprot) for each of disorder_types. mut_uniprot is the sorted array of protein indexes of the mutated proteins.
+    Only mutations for proteins that show up in the interface data and the disorder data are considered, and mutations
+    whose position could not be read are skipped."""
+    in_disordered_interface = [0] * len(disorder_types)
+    in_structured_interface = [0] * len(disorder_types)
+    mut_uniprot = [np.zeros(0, dtype=np.int32)] * len(disorder_types)
+    for batch in batches:
+        residue_flags, protein_flags = residue_annotation.classify(annotation, batch.uniprot, batch.position)
+        readable = batch.position > 0
+        for i, disorder_type in enumerate(disorder_types):
+            disorder_mask = residue_annotation.DISORDER_MASKS[disorder_type]
+            considered = (readable & ((protein_flags & residue_annotation.INTERFACE) != 0)
+                          & ((protein_flags & disorder_mask) != 0))
+            in_interface = considered & ((residue_flags & residue_annotation.INTERFACE) != 0)
+            in_disorder = (residue_flags & disorder_mask) != 0
+            in_disordered_interface[i] += int(np.count_nonzero(in_interface & in_disorder))
+            in_structured_interface[i] += int(np.count_nonzero(in_interface & ~in_disorder))
+            mut_uniprot[i] = np.union1d(mut_uniprot[i], batch.uniprot[considered])
+    return list(zip(in_disordered_interface, in_structured_interface, mut_uniprot))
+
+
+def count_residues(residue_totals, mut_uniprot):
+    """Given the result of residue_annotation.interface_residue_totals and the protein indexes of the mutated proteins,
+    return a tuple (disordered_interface_size, structured_interface_size, total_protein_count)."""
+    disordered_residues, structured_residues = residue_totals
+    return int(disordered_residues[mut_uniprot].sum()), int(structured_residues[mut_uniprot].sum()), len(mut_uniprot)
+
+
+# residue annotation used by worker processes, set by init_worker
+worker_annotation = None
+
+
+def init_worker(annotation):
+    """Make annotation available to the functions run by a worker process. When processes are forked, the annotation
+    is shared with the parent process instead of being copied."""
+    global worker_annotation
+    worker_annotation = annotation
+
+
+def count_chunk(args):
+    """Run count_mutations in a worker process on one chunk of a mutation file. args is a tuple (mutation_filepath,
+    start, end, disorder_types), where start and end are byte offsets returned by common_tools.file_chunks."""
+    mutation_filepath, start, end, disorder_types = args
+    batches = mutation_reader.read_mutation_batches(mutation_filepath, dict(worker_annotation.protein_index),
+                                                    start=start, end=end)
+    return count_mutations(worker_annotation, batches, disorder_types)
+
 
+def count_mutation_files(annotation, mutation_filepaths, disorder_types, num_processes=1):
+    """Return a list of (mutation filepath, disorder type, counts) tuples for every combination of mutation file and
+    type of disordered region, where counts are in the order of CATEGORIES. Each mutation file is read and classified
+    only once, in batches of bounded size. If num_processes is greater than 1, then each mutation file is split into
+    chunks that are counted by a pool of worker processes. Counts of mutations are then added up, and the mutated
+    proteins of all chunks are merged before their residues are counted, so the results are the same as with a single
+    process."""
+    residue_totals = {x: residue_annotation.interface_residue_totals(annotation, x) for x in disorder_types}
+    pool = None
+    if num_processes > 1:
+        pool = multiprocessing.Pool(num_processes, initializer=init_worker, initargs=(annotation,))
+    results = []
+    try:
+        for mutation_filepath in mutation_filepaths:
+            if pool is None:
+                # Intern UniProt IDs with the protein indexes of the annotation. IDs that are not annotated get codes
+                # past the last protein index.
+                batches = mutation_reader.read_mutation_batches(mutation_filepath, dict(annotation.protein_index))
+                counts = count_mutations(annotation, batches, disorder_types)
+            else:
+                chunks = common_tools.file_chunks(mutation_filepath, num_processes * 4)
+                chunk_counts = pool.map(count_chunk, [(mutation_filepath, start, end, disorder_types)
+                                                      for start, end in chunks])
+                counts = [(sum(x[i][0] for x in chunk_counts), sum(x[i][1] for x in chunk_counts),
+                           np.unique(np.concatenate([x[i][2] for x in chunk_counts])))
+                          for i in range(len(disorder_types))]
+            for disorder_type, (in_disordered_interface, in_structured_interface, mut_uniprot) in \
+                    zip(disorder_types, counts):
+                results.append((mutation_filepath, disorder_type,
+                                (in_disordered_interface, in_structured_interface)
+                                + count_residues(residue_totals[disorder_type], mut_uniprot)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
 
-def range_to_set(r):
-    """Given a string r similar to the form "a;b-c", return the set {a, b, b+1, ... , c-1, c}"""
-    r = [x.split("-") for x in r.split(";")]
-    s = set()
-    for x in r:
-        if len(x) == 1:
-            s.add(int(x[0]))
+
+def breakdown_mutations(annotation, domain_table, batches, disorder_type):
+    """Classify the mutations in the iterable of mutation_reader.MutationBatch objects, whose UniProt codes must be the
+    protein indexes of annotation, and accumulate the counts of each protein and each interval of domain_table. Return
+    a tuple (protein_counts, domain_counts), where protein_counts holds arrays (mutations, in_disordered_interface,
+    in_structured_interface) indexed by protein, and domain_counts holds arrays (in_disordered_interface,
+    in_structured_interface) indexed by domain interval. Only mutations for proteins that show up in the interface data
+    and the disorder data are considered."""
+    disorder_mask = residue_annotation.DISORDER_MASKS[disorder_type]
+    num_proteins = len(annotation.uniprot_ids)
+    protein_counts = tuple(np.zeros(num_proteins, dtype=np.int64) for _ in range(3))
+    domain_counts = tuple(np.zeros(len(domain_table.starts), dtype=np.int64) for _ in range(2))
+    for batch in batches:
+        residue_flags, protein_flags = residue_annotation.classify(annotation, batch.uniprot, batch.position)
+        considered = ((batch.position > 0) & ((protein_flags & residue_annotation.INTERFACE) != 0)
+                      & ((protein_flags & disorder_mask) != 0))
+        in_interface = considered & ((residue_flags & residue_annotation.INTERFACE) != 0)
+        in_disorder = (residue_flags & disorder_mask) != 0
+        categories = (considered, in_interface & in_disorder, in_interface & ~in_disorder)
+        for counts, category in zip(protein_counts, categories):
+            counts += np.bincount(batch.uniprot[category], minlength=num_proteins)
+        for counts, category in zip(domain_counts, categories[1:]):
+            # count the mutated residues that fall in each domain interval
+            residues = np.sort(annotation.offsets[batch.uniprot[category]] + batch.position[category] - 1)
+            counts += np.searchsorted(residues, domain_table.ends) - np.searchsorted(residues, domain_table.starts)
+    return protein_counts, domain_counts
+
+
+def write_breakdown(output_prefix, annotation, domain_table, disorder_type, protein_counts, domain_counts):
+    """Write the per-protein and per-Pfam tables for the result of breakdown_mutations."""
+    mutations, in_disordered_interface, in_structured_interface = protein_counts
+    disordered_residues, structured_residues = residue_annotation.interface_residue_totals(annotation, disorder_type)
+    with open(output_prefix + "_protein.tsv", "w") as fwrite:
+        fwrite.write("UniProtID\tMutations\t" + "\t".join(CATEGORIES[:4]) + "\n")
+        for i in np.flatnonzero(mutations):
+            fwrite.write("\t".join((annotation.uniprot_ids[i], str(mutations[i]), str(in_disordered_interface[i]),
+                                    str(in_structured_interface[i]), str(disordered_residues[i]),
+                                    str(structured_residues[i]))) + "\n")
+
+    # include only the domain intervals of proteins that are considered
+    mutated = mutations[domain_table.protein] > 0
+    pfam = domain_table.pfam[mutated]
+    num_pfams = len(domain_table.pfam_ids)
+    domain_residues = residue_annotation.domain_residue_totals(annotation, domain_table, disorder_type)
+    proteins = np.bincount(np.unique(domain_table.protein[mutated] * num_pfams + pfam) % num_pfams,
+                           minlength=num_pfams)
+    columns = [np.bincount(pfam, weights=x[mutated], minlength=num_pfams).astype(np.int64)
+               for x in domain_counts + domain_residues]
+    with open(output_prefix + "_pfam.tsv", "w") as fwrite:
+        fwrite.write("PfamID\tProteins\t" + "\t".join(CATEGORIES[:4]) + "\n")
+        for i in np.flatnonzero(proteins):
+            fwrite.write("\t".join([domain_table.pfam_ids[i], str(proteins[i])] + [str(x[i]) for x in columns]) + "\n")
+
+
+def write_results(output_filepath, results):
+    """Write the results of count_mutation_files to output_filepath as JSON if the path ends in ".json", and as a
+    tab-delimited table otherwise."""
+    with open(output_filepath, "w") as fwrite:
+        if output_filepath.endswith(".json"):
+            json.dump([dict(zip(("MutationFile", "DisorderType") + CATEGORIES, (x[0], x[1]) + x[2]))
+                       for x in results], fwrite, indent=4)
+            fwrite.write("\n")
         else:
-            s.update(list(range(int(x[0]), int(x[1])+1)))
-    return s
-
-
-# check that arguments are correct
-assert len(sys.argv) == 3
-assert os.path.isfile(sys.argv[1])
-assert sys.argv[2] in ("All", "Exp", "DisProt")
-
-mutation_filepath = sys.argv[1]
-disorder_type = sys.argv[2]
-
-# read interface data file and construct mapping from UniProt ID to set containing locations of interface regions
-with open("../Interface Data/hSIN_organized.txt") as idataf:
-    idata = [x.split() for x in idataf.readlines() if x[:8] != "UniProtA"]
-uniprot_interface = {}
-for x in idata:
-    uniprotid_a = x[0]
-    uniprotid_b = x[1]
-    iregion_a = x[3]
-    iregion_b = x[5]
-    if uniprotid_a in uniprot_interface:
-        uniprot_interface[uniprotid_a].update(range_to_set(iregion_a))
-    else:
-        uniprot_interface[uniprotid_a] = range_to_set(iregion_a)
-    if uniprotid_b in uniprot_interface:
-        uniprot_interface[uniprotid_b].update(range_to_set(iregion_b))
+            fwrite.write("\t".join(("MutationFile", "DisorderType") + CATEGORIES) + "\n")
+            for mutation_filepath, disorder_type, counts in results:
+                fwrite.write("\t".join([mutation_filepath, disorder_type] + [str(x) for x in counts]) + "\n")
+
+
+if __name__ == "__main__":
+    num_processes = 1
+    if len(sys.argv) > 2 and sys.argv[1] == "--processes":
+        num_processes = int(sys.argv[2])
+        assert num_processes >= 1
+        del sys.argv[1:3]
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--breakdown":
+        # check that arguments are correct
+        assert len(sys.argv) == 5
+        assert os.path.isfile(sys.argv[2])
+        assert sys.argv[3] in region_index.DISORDER_TYPES
+
+        mutation_filepath = sys.argv[2]
+        disorder_type = sys.argv[3]
+        output_prefix = sys.argv[4]
+
+        annotation = index_cache.load_annotation()
+        domain_table = residue_annotation.build_domain_table(annotation, index_cache.load_domain_index())
+        batches = mutation_reader.read_mutation_batches(mutation_filepath, dict(annotation.protein_index))
+        protein_counts, domain_counts = breakdown_mutations(annotation, domain_table, batches, disorder_type)
+        write_breakdown(output_prefix, annotation, domain_table, disorder_type, protein_counts, domain_counts)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # check that arguments are correct
+        assert len(sys.argv) >= 5
+        output_filepath = sys.argv[2]
+        disorder_types = sys.argv[3].split(",")
+        mutation_filepaths = sys.argv[4:]
+        assert all(x in region_index.DISORDER_TYPES for x in disorder_types)
+        assert all(os.path.isfile(x) for x in mutation_filepaths)
+
+        # Construct the bit flag annotation of every residue once. It holds all types of disordered region, which are
+        # read from the cached disorder data in a single pass.
+        annotation = index_cache.load_annotation()
+        write_results(output_filepath, count_mutation_files(annotation, mutation_filepaths, disorder_types,
+                                                            num_processes))
     else:
-        uniprot_interface[uniprotid_b] = range_to_set(iregion_b)
-
-# Read disorder region data file and construct mapping from UniProt ID to set containing locations of disordered
-# regions. Type of data included depends on user input.
-with open("../Disordered Region Data/DisorderData.txt") as ddataf:
-    ddata = []
-    for x in ddataf.readlines():
-        xl = x.rstrip().split("\t")
-        if disorder_type == "DisProt":
-            if xl[0] != "Source" and xl[0] == "DisProt":
-                ddata.append(xl)
-        elif disorder_type == "Exp":
-            if xl[0] != "Source" and xl[7] == "Exp":
-                ddata.append(xl)
-        elif disorder_type == "All":
-            if xl[0] != "Source":
-                ddata.append(xl)
-        else:
-            assert False, "Incorrect disorder type indicated"
-uniprot_disorder = {}
-for x in ddata:
-    uniprot = x[1]
-    dregion = x[5]
-    uniprot_disorder[uniprot] = range_to_set(dregion)
-
-# read mutation data and consider only mutations for proteins that show up in the interface data and
-# the disorder data
-with open(mutation_filepath) as mutf:
-    mutdata = []
-    for x in mutf.readlines():
-        xl = x.split()
-        if xl[1] in uniprot_interface and xl[1] in uniprot_disorder:
-            mutdata.append(xl)
-
-# count number of mutations in each category
-in_disordered_interface = 0
-in_structured_interface = 0
-mut_uniprot = set()  #
-for x in mutdata:
-    uniprot = x[1]
-    # try:
-    mut_location = int(x[3][1:-1])
-    # except ValueError:
-    #     continue
-    if mut_location in uniprot_interface[uniprot]:
-        if mut_location in uniprot_disorder[uniprot]:
-            in_disordered_interface += 1
-        else:
-            in_structured_interface += 1
-    mut_uniprot.add(uniprot)
-
-# count total number of residues in each category
-disordered_interface_size = 0
-structured_interface_size = 0
-total_protein_count = 0
-for x in uniprot_interface:
-    if x in uniprot_disorder and x in mut_uniprot:
-        disordered_interface_residues = uniprot_interface[x].intersection(uniprot_disorder[x])
-        disordered_interface_size += len(disordered_interface_residues)
-        structured_interface_residues = uniprot_interface[x].difference(uniprot_disorder[x])
-        structured_interface_size += len(structured_interface_residues)
-        total_protein_count += 1
-
-print("Mutations in disordered interface\t" + str(in_disordered_interface))
-print("Mutations in structured interface\t" + str(in_structured_interface))
-print("Disordered interface total # of residues\t" + str(disordered_interface_size))
-print("Structured interface total # of residues\t" + str(structured_interface_size))
-print("Total number of proteins considered\t" + str(total_protein_count))
+        # check that arguments are correct
+        assert len(sys.argv) == 3
+        assert os.path.isfile(sys.argv[1])
+        assert sys.argv[2] in region_index.DISORDER_TYPES
+
+        mutation_filepath = sys.argv[1]
+        disorder_type = sys.argv[2]
+
+        # Construct the bit flag annotation of every residue from the cached interface data and all types of disorder
+        # data. Only the flags of the chosen type of disordered region are considered.
+        annotation = index_cache.load_annotation()
+
+        counts = count_mutation_files(annotation, [mutation_filepath], [disorder_type], num_processes)[0][2]
+        for category, count in zip(CATEGORIES, counts):
+            print(category + "\t" + str(count))
@@ -0,0 +1,96 @@
+"""Extract missense mutations from the dbSNP XML dumps in ../Mutation Control/dbSNP (neutral.xml and
+nonpathogenic.xml), which have one <Rs> record per line.
+
+The file is divided into byte ranges that begin and end on line boundaries, and each range is scanned by a worker
+process with a single regular expression that matches both the rsID of a record and the HGVS protein changes inside it.
+The RefSeq ID of a change is the text between the closest ">" to its left and ":p.". The worker then maps the RefSeq IDs
+of its range to UniProt with the index of id_mapping.py, validates the mutations against the sequence store in one
+batch, and packs the valid ones into mutation keys (see interning.py). The results of the ranges are yielded in the
+order of the file, so a caller can pass them straight to an external_dedup.Deduplicator and keep the first occurrence of
+each mutation, and only the ranges being processed are held in memory."""
+
+import multiprocessing
+import os
+import re
+
+import common_tools
+import id_mapping
+import interning
+import mutation_validation
+import sequence_store
+
+CHUNK_SIZE = 1 << 26  # maximum number of bytes scanned by a worker at once
+
+# group 1 is the rsID of a record, and groups 2 and 3 are the RefSeq ID and the protein change of an HGVS entry
+RECORD_PATTERN = re.compile(r'<Rs rsId="([^"]*)"|>([^<>]*):p\.([^<]*)</hgvs>')
+
+worker_id_map = None  # id_mapping.IDMapping, opened in each worker process by init_worker
+worker_uniprot_seq = None  # sequence store, opened in each worker process by init_worker
+worker_uniprot_codes = None  # interning.AccessionCodes, opened in each worker process by init_worker
+
+
+def extract_records(text):
+    """Return the list of distinct (rsID, RefSeq ID, protein mutation) tuples of the records in text, in the order they
+    first appear. Protein mutations are converted to 1-letter amino acid abbreviations, and changes that are not
+    substitutions between two standard amino acids are skipped."""
+    rsid_refseqid_mutation = {}  # used as an ordered set
+    rsid = None
+    for match in RECORD_PATTERN.finditer(text):
+        if match.group(1) is not None:
+            rsid = "rs" + match.group(1)
+        elif rsid is not None:
+            try:
+                rsid_refseqid_mutation[(rsid, match.group(2), common_tools.mutation_abbrev(match.group(3)))] = None
+            except KeyError:  # skip this mutation if there's unknown information
+                pass
+    return list(rsid_refseqid_mutation)
+
+
+def init_worker():
+    """Open the ID mapping index, the sequence store and the UniProt codes in a worker process. The codes must already
+    be up to date."""
+    global worker_id_map, worker_uniprot_seq, worker_uniprot_codes
+    worker_id_map = id_mapping.open_index()
+    worker_uniprot_seq = sequence_store.open_store()
+    worker_uniprot_codes = interning.open_codes()
+
+
+def extract_chunk(args):
+    """Given a tuple (filepath, start, end), return a tuple (rows, keys, reasons) for the records in that byte range of
+    the file. rows is the list of (UniProt ID, rsID, RefSeq ID, protein mutation) tuples of the valid mutations, in
+    order, and keys is a uint64 array of their packed mutation keys. reasons is a uint8 array of the
+    mutation_validation reason codes of all mutations whose RefSeq ID maps to a UniProt ID with a sequence."""
+    filepath, start, end = args
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf8")
+    mutations = extract_records(text)
+    refseq_uniprot = worker_id_map.lookup({m[1] for m in mutations})
+    # ignore the mutations that have no RefSeq-UniProt mapping or whose UniProt sequence we don't have
+    candidates = [(refseq_uniprot[m[1]],) + m for m in mutations
+                  if m[1] in refseq_uniprot and refseq_uniprot[m[1]] in worker_uniprot_seq]
+    valid, reasons = mutation_validation.validate(worker_uniprot_seq, [x[0] for x in candidates],
+                                                  [int(x[3][1:-1]) for x in candidates], [x[3][0] for x in candidates])
+    rows = [x for x, is_valid in zip(candidates, valid.tolist()) if is_valid]
+    keys = interning.mutation_keys(worker_uniprot_codes, [x[0] for x in rows], [x[3] for x in rows])
+    return rows, keys, reasons
+
+
+def extract_uniprot_mutations(filepath, num_processes=None):
+    """Yield a tuple (rows, keys, reasons), as returned by extract_chunk, for each byte range of the dbSNP XML
+    file at filepath, in the order of the file. The ranges are processed by num_processes worker processes, which
+    defaults to the number of CPUs."""
+    # build the ID mapping index and give codes to new proteins before the workers read them
+    id_mapping.open_index().close()
+    interning.open_codes(sequence_store.open_store())
+    num_processes = num_processes or os.cpu_count() or 1
+    num_chunks = max(os.path.getsize(filepath) // CHUNK_SIZE + 1, num_processes)
+    chunks = [(filepath, start, end) for start, end in common_tools.file_chunks(filepath, num_chunks)]
+    if num_processes == 1:
+        init_worker()
+        for chunk in chunks:
+            yield extract_chunk(chunk)
+        return
+    with multiprocessing.Pool(num_processes, initializer=init_worker) as pool:
+        for result in pool.imap(extract_chunk, chunks):
+            yield result
@@ -1,18 +1,45 @@
 """Disprot is a database containing experimentally-determined disordered regions in proteins. This script submits
 queries to obtain data for all human proteins from the website. disprot_human_ids.txt contains the IDs of all
-human protein entries. Data are saved in ../Disordered Region Data/DisProt."""
+human protein entries. Data are saved in ../Disordered Region Data/DisProt. Downloads are made by http_fetch.py and
+recorded in the manifest of the directory (see download_manifest.py), so running the script again downloads only what
+is missing. The IDs whose downloads failed after all retries are printed.
 
-from urllib.request import urlopen
+Run with --refresh to update the mirror: every entry is requested again with the validators the server sent with it,
+so that only the entries that changed are downloaded. Either way, the IDs whose entries were changed or newly
+downloaded are written to ../Disordered Region Data/DisProt.changed.txt."""
+
+import sys
+
+import download_manifest
+import http_fetch
+
+DISPROT_URL = "http://www.disprot.org/ws/get/"
+OUTPUT_DIRECTORY = "../Disordered Region Data/DisProt/"
+MAX_CONCURRENCY = 10  # number of requests in flight at once
+RATE_LIMIT = 10  # largest number of requests per second sent to DisProt
+
+refresh = len(sys.argv) > 1
+if refresh:
+    assert sys.argv[1:] == ["--refresh"], "Usage: disprot_query.py [--refresh]"
 
 # obtain IDs of proteins to query
 ids_file = open("disprot_human_ids.txt")
 ids = ids_file.read().split()
 ids_file.close()
 
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY)
+manifest.expect(ids)
+
 # perform queries and write to files
-for x in ids:
-    json_data = urlopen("http://www.disprot.org/ws/get/" + x).read().decode("ascii", "ignore")
-    print(json_data)
-    data_file = open("../Disordered Region Data/DisProt/" + x + ".json", "w")
-    data_file.write(json_data)
-    data_file.close()
+keys = manifest.refresh_list(OUTPUT_DIRECTORY) if refresh else [(x, {}) for x in manifest.missing()]
+requests = [http_fetch.Request(x, DISPROT_URL + x, OUTPUT_DIRECTORY + x + ".json", headers) for x, headers in keys]
+changed_ids = []
+for result in http_fetch.fetch_all(requests, max_concurrency=MAX_CONCURRENCY,
+                                   rate_limits={http_fetch.host(DISPROT_URL): RATE_LIMIT}):
+    if manifest.record_fetch(result, result.key + ".json"):
+        changed_ids.append(result.key)
+        print(result.key)
+    elif not result.ok:
+        print(result.key + ": " + result.error)
+manifest.close()
+download_manifest.write_report(download_manifest.report_filepath(OUTPUT_DIRECTORY), changed_ids)
@@ -0,0 +1,223 @@
+"""Keep track of the files downloaded by a script in a persistent manifest, so that a restarted download resumes with
+what is missing instead of listing or reparsing its output directory.
+
+A manifest is an SQLite database next to the output directory, such as ../Mutation Control/UniProt.manifest.sqlite for
+../Mutation Control/UniProt. It holds one row per key, such as a UniProt ID, with its status (pending, done or failed),
+the file the key was saved in, the byte size and SHA-256 checksum of that file, the last error, the time of the last
+update, and the ETag and Last-Modified validators that the server sent with the file. The status is indexed, so finding
+the keys that are not done is a query that does not touch the done ones.
+
+To refresh a mirror, every key is requested again with the validators of its file as If-None-Match and
+If-Modified-Since headers, so that the server answers 304 Not Modified without a body for the files that have not
+changed. record_fetch tells which keys changed, and write_report saves them for incremental rebuilds downstream.
+
+The keys that a download needs are added with expect. When a manifest is first created for a directory that already
+holds downloads, it is seeded from the files in the directory, so that earlier downloads are not repeated. Updates are
+committed in batches; after a crash, the updates of the last batch are lost and those keys are downloaded again.
+
+Example:
+    manifest = open_manifest("../Mutation Control/UniProt/")
+    manifest.expect(ids)
+    for uniprot_id in manifest.missing():
+        ...
+        manifest.record_done(uniprot_id, uniprot_id + ".fasta", size, checksum)
+    manifest.close()
+"""
+
+import datetime
+import hashlib
+import os
+import sqlite3
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+COMMIT_INTERVAL = 1000  # number of updates committed at once
+READ_SIZE = 1 << 20  # number of bytes of a file hashed at once
+
+
+def manifest_filepath(directory):
+    """Return the path of the manifest of the output directory."""
+    return directory.rstrip("/\\") + ".manifest.sqlite"
+
+
+def file_checksum(filepath):
+    """Return a tuple (size, SHA-256 checksum in hexadecimal) of the file at filepath."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(filepath, "rb") as f:
+        for data in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(data)
+            size += len(data)
+    return size, digest.hexdigest()
+
+
+def report_filepath(directory):
+    """Return the path of the report of the keys changed by the last refresh of the output directory."""
+    return directory.rstrip("/\\") + ".changed.txt"
+
+
+def write_report(filepath, ids):
+    """Write the sorted distinct IDs in the iterable ids to the report at filepath, one per line."""
+    with open(filepath + ".tmp", "w") as report_file:
+        report_file.writelines(x + "\n" for x in sorted(set(ids)))
+    os.replace(filepath + ".tmp", filepath)
+
+
+def now():
+    """Return the current time as text, as stored in the manifest."""
+    return datetime.datetime.now().isoformat(" ", "seconds")
+
+
+class DownloadManifest:
+    """The status of each key of a download. See the module docstring."""
+
+    def __init__(self, filepath):
+        self.connection = sqlite3.connect(filepath)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS downloads (key TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                                "filename TEXT, size INTEGER, checksum TEXT, error TEXT, updated TEXT, etag TEXT, "
+                                "last_modified TEXT)")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(downloads)")]
+        for column in ("etag", "last_modified"):  # added to the manifests made before validators were stored
+            if column not in columns:
+                self.connection.execute("ALTER TABLE downloads ADD COLUMN " + column + " TEXT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS downloads_status ON downloads (status)")
+        self.connection.commit()
+        self.num_updates = 0  # number of updates not yet committed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def updated(self):
+        """Commit the updates if enough of them have accumulated."""
+        self.num_updates += 1
+        if self.num_updates >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.num_updates = 0
+
+    def expect(self, keys):
+        """Add the keys that are not yet in the manifest as pending."""
+        updated = now()
+        self.connection.executemany("INSERT OR IGNORE INTO downloads (key, status, updated) VALUES (?, ?, ?)",
+                                    ((key, PENDING, updated) for key in keys))
+        self.commit()
+
+    def record_done(self, key, filename, size, checksum, etag=None, last_modified=None):
+        """Record that key was downloaded into the file filename, relative to the output directory, of the given size
+        and checksum, with the validators etag and last_modified if the server sent them. Return whether the checksum
+        differs from the one recorded before, which is the case for a key that was not done."""
+        row = self.connection.execute("SELECT checksum FROM downloads WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.connection.execute("INSERT INTO downloads (key, status) VALUES (?, ?)", (key, DONE))
+        # update the row in place, so that it keeps its rowid and thus its place in the order of the keys
+        self.connection.execute("UPDATE downloads SET status = ?, filename = ?, size = ?, checksum = ?, error = NULL, "
+                                "updated = ?, etag = ?, last_modified = ? WHERE key = ?",
+                                (DONE, filename, size, checksum, now(), etag, last_modified, key))
+        self.updated()
+        return row is None or row[0] != checksum
+
+    def record_unchanged(self, key):
+        """Record that the server reported the file of key as not modified."""
+        self.connection.execute("UPDATE downloads SET status = ?, error = NULL, updated = ? WHERE key = ?",
+                                (DONE, now(), key))
+        self.updated()
+
+    def record_fetch(self, result, filename):
+        """Record the http_fetch.Result of downloading the key result.key into the file filename. A 304 response is
+        recorded as unchanged. Return whether the file of the key changed."""
+        if not result.ok:
+            self.record_failed(result.key, result.error)
+            return False
+        if result.status == 304:
+            self.record_unchanged(result.key)
+            return False
+        return self.record_done(result.key, filename, result.size, result.checksum, result.headers.get("etag"),
+                                result.headers.get("last-modified"))
+
+    def record_failed(self, key, error):
+        """Record that the download of key failed with the error message error. A key that was done before keeps its
+        file, size and checksum."""
+        self.connection.execute("INSERT OR IGNORE INTO downloads (key, status) VALUES (?, ?)", (key, FAILED))
+        self.connection.execute("UPDATE downloads SET status = ?, error = ?, updated = ? WHERE key = ?",
+                                (FAILED, error, now(), key))
+        self.updated()
+
+    def status(self, key):
+        """Return the status of key, or None if it is not in the manifest."""
+        row = self.connection.execute("SELECT status FROM downloads WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def entry(self, key):
+        """Return a dictionary of the row of key, or None if it is not in the manifest."""
+        cursor = self.connection.execute("SELECT * FROM downloads WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return dict(zip((column[0] for column in cursor.description), row)) if row else None
+
+    def missing(self):
+        """Return the list of keys that are pending or failed, in the order they were added."""
+        return [row[0] for row in self.connection.execute(
+            "SELECT key FROM downloads WHERE status IN (?, ?) ORDER BY rowid", (PENDING, FAILED))]
+
+    def refresh_list(self, directory):
+        """Return the list of tuples (key, headers) of all keys, in the order they were added, where headers is a
+        dictionary of the conditional request headers built from the validators of the file of the key. Keys that
+        are not done, or whose file is missing from directory, get no headers, so that they are downloaded in full."""
+        keys = []
+        for key, status, filename, etag, last_modified in self.connection.execute(
+                "SELECT key, status, filename, etag, last_modified FROM downloads ORDER BY rowid").fetchall():
+            headers = {}
+            if status == DONE and os.path.isfile(os.path.join(directory, filename)):
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+            keys.append((key, headers))
+        return keys
+
+    def counts(self):
+        """Return a dictionary that maps each status to the number of keys with that status."""
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM downloads GROUP BY status"))
+
+    def seed(self, directory, keys_of_file):
+        """Record the files already in directory as done. keys_of_file is a function that, given the path of a file,
+        returns the list of keys that the file holds."""
+        for filename in sorted(os.listdir(directory)):
+            filepath = os.path.join(directory, filename)
+            if not os.path.isfile(filepath) or filename.endswith(".part"):
+                continue
+            size, checksum = file_checksum(filepath)
+            for key in keys_of_file(filepath):
+                self.record_done(key, filename, size, checksum)
+        self.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def file_stem(filepath):
+    """Return the list holding the name of the file at filepath without its extension, the key of a file that holds
+    one download, such as "P04637" for "P04637.fasta"."""
+    return [os.path.splitext(os.path.basename(filepath))[0]]
+
+
+def open_manifest(directory, keys_of_file=file_stem):
+    """Return the DownloadManifest of the output directory. If the manifest does not exist yet, then it is created and
+    seeded with the files in the directory, whose keys are given by keys_of_file as in DownloadManifest.seed. The new
+    manifest is written under a temporary name first so that an interrupted seeding is started over."""
+    filepath = manifest_filepath(directory)
+    if not os.path.exists(filepath):
+        temp_filepath = filepath + ".tmp"
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        with DownloadManifest(temp_filepath) as manifest:
+            if os.path.isdir(directory):
+                manifest.seed(directory, keys_of_file)
+        os.replace(temp_filepath, filepath)
+    return DownloadManifest(filepath)
@@ -0,0 +1,127 @@
+"""Test whether substitution mutations are enriched or depleted in disordered interface regions and in structured
+interface regions, compared with random mutations.
+
+Each null replicate places the same number of mutations on each protein as the observed set does, with positions drawn
+uniformly and independently over the residues of the protein, and counts how many fall in disordered and structured
+interface residues. Only proteins for which interface data and disorder data are available are considered, as in
+count_mutations_in_disordered_interface.py. Since the positions of a protein are drawn independently, the number of
+its k mutations that land in its d disordered interface residues out of L residues follows Binomial(k, d / L), and the
+number of the remaining mutations that land in its s structured interface residues follows
+Binomial(k - hits, s / (L - d)). Replicates are drawn from these distributions for all proteins and many replicates at
+once, which gives the same null distribution as classifying every random position but without materializing them.
+
+For each category, the script prints the observed count, the mean and 95% interval of the null distribution, the fold
+enrichment over the null mean, empirical one-sided p-values for enrichment and depletion, and 95% Wilson confidence
+intervals of those p-values, which reflect the Monte Carlo error of using a finite number of replicates.
+
+This script takes the following arguments in the order given:
+
+path the to file containing the mutations
+    Must be tab-delimited with columns GeneName, UniProtID, MutationID, ProteinMutation in that order
+type of disordered region to consider, must be "All", "Exp", or "DisProt"
+number of null replicates to draw
+(optional) seed of the random number generator
+"""
+
+import sys
+import os
+import numpy as np
+import index_cache
+import mutation_reader
+import region_index
+import residue_annotation
+
+# number of replicates drawn at once, which bounds memory use to about BLOCK_SIZE * (number of proteins) integers
+BLOCK_SIZE = 256
+
+
+def observed_counts(annotation, mutation_filepath, disorder_type):
+    """Classify the mutations in mutation_filepath and return a tuple (in_disordered_interface,
+    in_structured_interface, mutations_per_protein), where mutations_per_protein holds the number of considered
+    mutations of each protein of annotation."""
+    disorder_mask = residue_annotation.DISORDER_MASKS[disorder_type]
+    in_disordered_interface = 0
+    in_structured_interface = 0
+    mutations_per_protein = np.zeros(len(annotation.uniprot_ids), dtype=np.int64)
+    for batch in mutation_reader.read_mutation_batches(mutation_filepath, dict(annotation.protein_index)):
+        residue_flags, protein_flags = residue_annotation.classify(annotation, batch.uniprot, batch.position)
+        considered = ((batch.position > 0) & ((protein_flags & residue_annotation.INTERFACE) != 0)
+                      & ((protein_flags & disorder_mask) != 0))
+        in_interface = considered & ((residue_flags & residue_annotation.INTERFACE) != 0)
+        in_disorder = (residue_flags & disorder_mask) != 0
+        in_disordered_interface += int(np.count_nonzero(in_interface & in_disorder))
+        in_structured_interface += int(np.count_nonzero(in_interface & ~in_disorder))
+        mutations_per_protein += np.bincount(batch.uniprot[considered], minlength=len(mutations_per_protein))
+    return in_disordered_interface, in_structured_interface, mutations_per_protein
+
+
+def null_replicates(annotation, disorder_type, mutations_per_protein, num_replicates, rng):
+    """Return a tuple (disordered, structured) of arrays with the number of random mutations that fall in disordered
+    interface and structured interface residues in each of num_replicates null replicates. Each replicate has
+    mutations_per_protein[i] mutations on protein i, drawn uniformly over its residues."""
+    disordered_residues, structured_residues = residue_annotation.interface_residue_totals(annotation, disorder_type)
+    mutated = mutations_per_protein > 0
+    k = mutations_per_protein[mutated]
+    lengths = np.diff(annotation.offsets)[mutated]
+    d = disordered_residues[mutated]
+    s = structured_residues[mutated]
+    p_disordered = d / lengths
+    p_structured = np.divide(s, lengths - d, out=np.zeros(len(k)), where=lengths > d)
+
+    disordered = np.zeros(num_replicates, dtype=np.int64)
+    structured = np.zeros(num_replicates, dtype=np.int64)
+    for start in range(0, num_replicates, BLOCK_SIZE):
+        size = (min(BLOCK_SIZE, num_replicates - start), len(k))
+        hits = rng.binomial(k, p_disordered, size=size)
+        disordered[start: start + size[0]] = hits.sum(axis=1)
+        structured[start: start + size[0]] = rng.binomial(k - hits, p_structured, size=size).sum(axis=1)
+    return disordered, structured
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """Return the Wilson score interval (low, high) of a binomial proportion."""
+    p = successes / trials
+    center = (p + z * z / (2 * trials)) / (1 + z * z / trials)
+    margin = z * np.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / (1 + z * z / trials)
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+def summarize(observed, null):
+    """Given an observed count and the array of counts of the null replicates, return a list of the statistics printed
+    for one category."""
+    num_replicates = len(null)
+    null_mean = float(null.mean())
+    at_least = int(np.count_nonzero(null >= observed))
+    at_most = int(np.count_nonzero(null <= observed))
+    return [observed, null_mean, float(np.percentile(null, 2.5)), float(np.percentile(null, 97.5)),
+            observed / null_mean if null_mean else float("nan"),
+            (at_least + 1) / (num_replicates + 1), wilson_interval(at_least, num_replicates),
+            (at_most + 1) / (num_replicates + 1), wilson_interval(at_most, num_replicates)]
+
+
+if __name__ == "__main__":
+    # check that arguments are correct
+    assert len(sys.argv) in (4, 5)
+    assert os.path.isfile(sys.argv[1])
+    assert sys.argv[2] in region_index.DISORDER_TYPES
+    assert int(sys.argv[3]) > 0
+
+    mutation_filepath = sys.argv[1]
+    disorder_type = sys.argv[2]
+    num_replicates = int(sys.argv[3])
+    rng = np.random.default_rng(int(sys.argv[4]) if len(sys.argv) == 5 else None)
+
+    annotation = index_cache.load_annotation()
+    in_disordered_interface, in_structured_interface, mutations_per_protein = \
+        observed_counts(annotation, mutation_filepath, disorder_type)
+    null_disordered, null_structured = null_replicates(annotation, disorder_type, mutations_per_protein,
+                                                       num_replicates, rng)
+
+    print("Category\tObserved\tNullMean\tNull2.5%\tNull97.5%\tFoldEnrichment\tPEnriched\tPEnrichedCI\tPDepleted"
+          "\tPDepletedCI")
+    for category, observed, null in (("Mutations in disordered interface", in_disordered_interface, null_disordered),
+                                     ("Mutations in structured interface", in_structured_interface, null_structured)):
+        stats = summarize(observed, null)
+        print("\t".join([category, str(stats[0])] + ["{:.6g}".format(x) for x in stats[1:6]]
+                        + ["{:.6g}-{:.6g}".format(*stats[6]), "{:.6g}".format(stats[7]),
+                           "{:.6g}-{:.6g}".format(*stats[8])]))
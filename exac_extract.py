@@ -1,77 +1,266 @@
 """ExAC mutation data were obtained from ftp://ftp.broadinstitute.org/pub/ExAC_release/current/ExAC.r0.3.1.sites.vep.vcf.gz
-and unzipped. Extract the missense mutation data from this file into the standard format."""
+Extract the missense mutation data from this file into the standard format.
 
+The file may be read uncompressed, gzipped, or bgzipped, as the .vcf.gz files from the ExAC site are, without unzipping
+it first. Uncompressed and bgzipped files are divided into byte ranges that are parsed by worker processes, and the
+results are written in the order of the file. A bgzipped file is divided at the boundaries of its BGZF blocks, which can
+be decompressed independently. A file that is gzipped but not bgzipped must be decompressed in order, so it is read by
+the main process alone.
+
+Progress is saved to a checkpoint file (see checkpoint.py) after each part of the input is written. If the script is
+interrupted, running it again on the same input resumes from the last checkpoint and produces the same output file.
+
+Only the Consequence, Gene, SWISSPROT and HGVSp fields of each VEP annotation in the CSQ field are read. Their indexes
+are taken from the description of the CSQ field in the header of the file.
+
+This script takes the following optional arguments in the order given:
+
+--processes N
+    number of worker processes, which defaults to the number of CPUs
+path to the VCF file, which defaults to ../Mutation Control/ExAC/ExAC.r0.3.1.sites.vep.vcf.gz
+"""
+
+import gzip
+import multiprocessing
+import os
+import struct
+import sys
+
+import checkpoint
 import common_tools
 
+EXAC_FILEPATH = "../Mutation Control/ExAC/ExAC.r0.3.1.sites.vep.vcf.gz"
+OUTPUT_FILEPATH = "../Mutation Control/ExAC.txt"
+CHUNK_SIZE = 1 << 24  # number of bytes of the input file parsed by a worker at once
+WRITE_BUFFER_SIZE = 1 << 20
+
+# fields of a VEP annotation in the CSQ field of ExAC.r0.3.1, used if the header does not describe them
+CSQ_FORMAT = ("Allele|Consequence|IMPACT|SYMBOL|Gene|Feature_type|Feature|BIOTYPE|EXON|INTRON|HGVSc|HGVSp|"
+              "cDNA_position|CDS_position|Protein_position|Amino_acids|Codons|Existing_variation|ALLELE_NUM|"
+              "DISTANCE|STRAND|VARIANT_CLASS|MINIMISED|SYMBOL_SOURCE|HGNC_ID|CANONICAL|TSL|CCDS|ENSP|SWISSPROT|"
+              "TREMBL|UNIPARC|SIFT|PolyPhen|DOMAINS|HGVS_OFFSET|GMAF|AFR_MAF|AMR_MAF|ASN_MAF|EAS_MAF|EUR_MAF|"
+              "SAS_MAF|AA_MAF|EA_MAF|CLIN_SIG|SOMATIC|PHENO|PUBMED|MOTIF_NAME|MOTIF_POS|HIGH_INF_POS|"
+              "MOTIF_SCORE_CHANGE|LoF_info|LoF_flags|LoF_filter|LoF|context|ancestral")
+CSQ_HEADER_PREFIX = "##INFO=<ID=CSQ,"
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"  # gzip member with extra fields, as every BGZF block starts
+
+worker_csq_indexes = None  # (consequence, gene, uniprot, HGVSp) indexes, set in each worker process by init_worker
+
+
+def csq_indexes(csq_format):
+    """Given the "|"-separated names of the fields of a VEP annotation, return a tuple of the indexes of the
+    Consequence, Gene, SWISSPROT and HGVSp fields."""
+    header = csq_format.split("|")
+    return (header.index("Consequence"), header.index("Gene"), header.index("SWISSPROT"), header.index("HGVSp"))
+
+
+def read_csq_format(filepath):
+    """Return the "|"-separated names of the fields of the CSQ annotations described in the header of the VCF file, or
+    CSQ_FORMAT if the header does not describe them."""
+    with common_tools.open_text(filepath) as vcf_file:
+        for line in vcf_file:
+            if not line.startswith("#"):
+                break
+            if line.startswith(CSQ_HEADER_PREFIX) and "Format: " in line:
+                return line[line.index("Format: ") + len("Format: "):].split('"')[0].strip()
+    return CSQ_FORMAT
+
 
 def hgvsp2standard(s):
     """Given a string s representing a mutation of the form 'ENSP00000334393.3:p.Gly9Asp', return the mutation using
-    1-letter amino acid abbreviations.
+    1-letter amino acid abbreviations, or None if it is not a substitution between two standard amino acids.
     Example: 'ENSP00000334393.3:p.Gly9Asp' becomes 'G9D'."""
-    i = s.rindex(".")
-    return common_tools.mutation_abbrev(s[i+1:])
-
-
-mutation_file = open("../Mutation Control/ExAC/ExAC.r0.3.1.sites.vep.vcf")
-fwrite = open("../Mutation Control/ExAC.txt", "w")
-
-header = ("Allele|Consequence|IMPACT|SYMBOL|Gene|Feature_type|Feature|BIOTYPE|EXON|INTRON|HGVSc|HGVSp|cDNA_position|"
-         "CDS_position|Protein_position|Amino_acids|Codons|Existing_variation|ALLELE_NUM|DISTANCE|STRAND|VARIANT_CLASS|"
-         "MINIMISED|SYMBOL_SOURCE|HGNC_ID|CANONICAL|TSL|CCDS|ENSP|SWISSPROT|TREMBL|UNIPARC|SIFT|PolyPhen|DOMAINS|"
-         "HGVS_OFFSET|GMAF|AFR_MAF|AMR_MAF|ASN_MAF|EAS_MAF|EUR_MAF|SAS_MAF|AA_MAF|EA_MAF|CLIN_SIG|SOMATIC|PHENO|PUBMED|"
-         "MOTIF_NAME|MOTIF_POS|HIGH_INF_POS|MOTIF_SCORE_CHANGE|LoF_info|LoF_flags|LoF_filter|LoF|context|ancestral")\
-            .split("|")
-num_columns = len(header)
-consequence_index = header.index("Consequence")
-genename_index = header.index("Gene")
-uniprot_index = header.index("SWISSPROT")
-protmutation_index = header.index("HGVSp")
-
-fwrite.write("\t".join(header))
-
-# uniprot2seq = common_tools.uniprot2seq_all()
-
-# skip headers
-for line in mutation_file:
-    if line == "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n":
-        break
-
-fwrite.write("GeneName\tUniProtID\tMutationID\tProteinMutation\n")
-# i = 0
-consequences = set()
-for line in mutation_file:
-    start = line.index(";CSQ=") + len(";CSQ=")
-    end = line.index(";AC_POPMAX")
-
-    # List of data for relevant mutations in this line. Each element of mutations is a list of data bits corresponding
-    # to the header.
-    mutations = [m.split("|") for m in line[start: end].split(",")]
-
-    for m in mutations:
-        assert len(m) == num_columns, m
-        consequence = m[consequence_index]
-        genename = m[genename_index]
-        uniprot = m[uniprot_index]
-        protmutation = m[protmutation_index]
-
-        # skip mutations that are not missense or contain missing information
-        if "missense_variant" not in consequence or uniprot == "" or protmutation == "":
+    try:
+        return common_tools.mutation_abbrev(s[s.rindex(".")+1:])
+    except KeyError:
+        return None
+
+
+def extract_lines(lines, indexes):
+    """Given an iterable of lines of the VCF file and the indexes returned by csq_indexes, return the lines of the
+    output file for the missense mutations in them, joined into one string."""
+    consequence_index, genename_index, uniprot_index, protmutation_index = indexes
+    max_index = max(indexes)
+    output = []
+    for line in lines:
+        if line.startswith("#") or "missense_variant" not in line:
             continue
+        start = line.find(";CSQ=")
+        if start == -1:
+            continue
+        start += len(";CSQ=")
+        end = line.find(";", start)
+        if end == -1:
+            end = line.find("\t", start)
+        if end == -1:
+            end = len(line.rstrip("\n"))
+
+        for annotation in line[start: end].split(","):
+            # split only as far as the last field needed
+            m = annotation.split("|", max_index + 1)
+            if len(m) <= max_index:
+                continue
+            consequence = m[consequence_index]
+            genename = m[genename_index]
+            uniprot = m[uniprot_index]
+            protmutation = m[protmutation_index]
+
+            # skip mutations that are not missense or contain missing information
+            if "missense_variant" not in consequence or uniprot == "" or protmutation == "":
+                continue
+            protmutation = hgvsp2standard(protmutation)
+            if protmutation is None:
+                continue
+
+            if genename == "":
+                genename = "-"
+            output.append(genename + "\t" + uniprot + "\t-\t" + protmutation + "\n")
+    return "".join(output)
+
+
+def bgzf_block_size(f):
+    """Read the header of the BGZF block at the current position of the binary file f and return the total size of the
+    block in bytes, or 0 at the end of the file. Raise ValueError if the block is not a BGZF block."""
+    header = f.read(12)
+    if not header:
+        return 0
+    if len(header) < 12 or header[:4] != BGZF_MAGIC:
+        raise ValueError("not a BGZF block")
+    extra = f.read(struct.unpack("<H", header[10:12])[0])
+    i = 0
+    while i + 4 <= len(extra):
+        subfield_length = struct.unpack("<H", extra[i+2: i+4])[0]
+        if extra[i: i+2] == b"BC" and subfield_length == 2:
+            return struct.unpack("<H", extra[i+4: i+6])[0] + 1
+        i += 4 + subfield_length
+    raise ValueError("not a BGZF block")
+
+
+def is_bgzf(filepath):
+    """Return whether the file at filepath is bgzipped."""
+    with open(filepath, "rb") as f:
+        try:
+            return bgzf_block_size(f) > 0
+        except ValueError:
+            return False
+
+
+def bgzf_chunks(filepath, start=0, chunk_size=CHUNK_SIZE):
+    """Return a list of (start, end) byte offsets of ranges of whole BGZF blocks of roughly chunk_size bytes that
+    together cover the bgzipped file at filepath from byte offset start, which must be at the start of a block, to the
+    end."""
+    size = os.path.getsize(filepath)
+    boundaries = [start]
+    with open(filepath, "rb") as f:
+        position = start
+        while position < size:
+            f.seek(position)
+            position += bgzf_block_size(f)
+            if position - boundaries[-1] >= chunk_size:
+                boundaries.append(position)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def read_bgzf_lines(filepath, start, end):
+    """Return the decompressed text of the lines of the bgzipped file at filepath that belong to the BGZF blocks in the
+    byte range [start, end). A line belongs to the range in which the newline before it is decompressed, so each line
+    belongs to exactly one range. The last line is completed from the blocks that follow the range."""
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        data = gzip.decompress(f.read(end - start))
+        if start > 0:
+            i = data.find(b"\n")
+            if i == -1:  # no line begins in this range
+                return ""
+            data = data[i+1:]
+        tail = []
+        while True:
+            block_start = f.tell()
+            block_size = bgzf_block_size(f)
+            if block_size == 0:
+                break
+            f.seek(block_start)
+            block = gzip.decompress(f.read(block_size))
+            i = block.find(b"\n")
+            if i != -1:
+                tail.append(block[:i+1])
+                break
+            tail.append(block)
+    return (data + b"".join(tail)).decode("utf8")
+
+
+def init_worker(indexes):
+    """Store the indexes of the needed CSQ fields in a worker process."""
+    global worker_csq_indexes
+    worker_csq_indexes = indexes
+
+
+def extract_chunk(args):
+    """Given a tuple (filepath, start, end, bgzipped), return the output lines for the lines of the VCF file that begin
+    within that byte range."""
+    filepath, start, end, bgzipped = args
+    if bgzipped:
+        lines = read_bgzf_lines(filepath, start, end).split("\n")
+    else:
+        lines = common_tools.chunk_lines(filepath, start, end)
+    return extract_lines(lines, worker_csq_indexes)
 
-        if genename == "":
-            genename = "-"
-        fwrite.write("\t".join((genename, uniprot, "-", hgvsp2standard(protmutation))))
-        fwrite.write("\n")
 
+def extract_exac(filepath, num_processes=None, start=0):
+    """Yield tuples (output, offset) for successive parts of the VCF file at filepath, where output holds the output
+    lines for the missense mutations in that part and offset is the position in the input at which the next part
+    begins. Passing such an offset as start continues the extraction from there. Offsets are in bytes of the file
+    itself, except for gzipped files that are not bgzipped, where they are in bytes of the decompressed file."""
+    indexes = csq_indexes(read_csq_format(filepath))
+    with open(filepath, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    if gzipped and not is_bgzf(filepath):
+        with gzip.open(filepath, "rb") as vcf_file:
+            vcf_file.seek(start)
+            offset = start
+            for lines in iter(lambda: vcf_file.readlines(CHUNK_SIZE), []):
+                offset += sum(len(line) for line in lines)
+                yield extract_lines(b"".join(lines).decode("utf8").split("\n"), indexes), offset
+        return
 
-    # print(mutations)
-    # if i == 100:
-    #     break
-    # i += 1
+    num_processes = num_processes or os.cpu_count() or 1
+    if gzipped:
+        chunks = [(filepath, chunk_start, end, True) for chunk_start, end in bgzf_chunks(filepath, start)]
+    else:
+        num_chunks = (os.path.getsize(filepath) - start) // CHUNK_SIZE + 1
+        chunks = [(filepath, chunk_start, end, False) for chunk_start, end in
+                  common_tools.file_chunks(filepath, num_chunks, start)]
+    if num_processes == 1:
+        init_worker(indexes)
+        for chunk in chunks:
+            yield extract_chunk(chunk), chunk[2]
+        return
+    with multiprocessing.Pool(num_processes, initializer=init_worker, initargs=(indexes,)) as pool:
+        for chunk, output in zip(chunks, pool.imap(extract_chunk, chunks)):
+            yield output, chunk[2]
 
 
-mutation_file.close()
-fwrite.close()
-print(consequences)
+if __name__ == "__main__":
+    num_processes = None
+    if len(sys.argv) > 2 and sys.argv[1] == "--processes":
+        num_processes = int(sys.argv[2])
+        assert num_processes >= 1
+        del sys.argv[1:3]
+    assert len(sys.argv) <= 2
+    exac_filepath = sys.argv[1] if len(sys.argv) == 2 else EXAC_FILEPATH
+    assert os.path.isfile(exac_filepath)
 
-# todo test what consequences we have in whole file
+    # resume from the last checkpoint if a previous run was interrupted
+    signature = checkpoint.input_signature([exac_filepath])
+    state = checkpoint.load_checkpoint(OUTPUT_FILEPATH, signature)
+    if state is not None:
+        print("Resuming from input offset {}".format(state["position"]))
+    with checkpoint.open_output(OUTPUT_FILEPATH, state, "GeneName\tUniProtID\tMutationID\tProteinMutation\n",
+                                WRITE_BUFFER_SIZE) as fwrite:
+        for output, offset in extract_exac(exac_filepath, num_processes, state["position"] if state else 0):
+            fwrite.write(output)
+            checkpoint.save_checkpoint(fwrite, OUTPUT_FILEPATH, signature, offset)
+    checkpoint.remove_checkpoint(OUTPUT_FILEPATH)
@@ -0,0 +1,170 @@
+"""Remove repeated keys from a stream that may be too large to hold in a set, keeping the first occurrence of each key.
+
+Keys are unsigned 64-bit integers, such as the packed mutation keys of interning.py. They are added in batches and
+numbered in the order they are added. Whenever the buffered keys exceed the memory budget, they are sorted by key and
+written to a temporary file as a run that holds each key once with its smallest number. The runs are merged block by
+block into a single run, from which a bitmap of the numbers of the keys to keep is built, so memory use is bounded by
+the budget rather than the number of keys. Lines of output may be spooled to a temporary file along with their keys and
+read back afterwards with the repeats removed.
+
+Example:
+    with Deduplicator() as dedup:
+        for keys, lines in batches:
+            dedup.add(keys, lines)
+        for line in dedup.kept_lines():
+            fwrite.write(line)
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+DEFAULT_MEMORY_BUDGET = 1 << 30  # maximum number of bytes of keys held in memory at once
+RUN_DTYPE = np.dtype([("key", "<u8"), ("index", "<u8")])
+KEEP_BATCH_SIZE = 1 << 22  # number of keys whose flags are read from the bitmap at once
+
+
+def sorted_run(keys, start):
+    """Given an array of keys numbered from start, return an array of RUN_DTYPE that holds each key once with its
+    smallest number, sorted by key."""
+    order = np.argsort(keys, kind="stable")
+    run = np.empty(len(keys), dtype=RUN_DTYPE)
+    run["key"] = keys[order]
+    run["index"] = order + start
+    return first_of_each_key(run)
+
+
+def first_of_each_key(run):
+    """Given an array of RUN_DTYPE sorted by key and then number, return the first entry of each key."""
+    first = np.ones(len(run), dtype=bool)
+    first[1:] = run["key"][1:] != run["key"][:-1]
+    return run[first]
+
+
+class Deduplicator:
+    """External-memory removal of repeated keys. See the module docstring."""
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, directory=None):
+        """Buffer at most memory_budget bytes of keys in memory, and write temporary files to a new directory inside
+        directory, which defaults to the system temporary directory."""
+        self.memory_budget = memory_budget
+        self.directory = tempfile.mkdtemp(prefix="dedup", dir=directory)
+        self.buffer = []  # list of arrays of keys not yet written to a run
+        self.buffer_start = 0  # number of the first key in the buffer
+        self.count = 0  # number of keys added
+        self.runs = []  # list of paths to run files
+        self.num_files = 0  # number of run files created, used to name them
+        self.spool = None  # file of spooled lines
+        self.keep = None  # bitmap of the numbers of the keys to keep, built by finish
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, keys, lines=None):
+        """Add an array-like of keys. If lines is given, it is a list of lines of text ending in newlines, one for each
+        key, which are spooled to a temporary file to be read back by kept_lines. Lines must be given either with every
+        batch or with none."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if lines is not None:
+            assert len(lines) == len(keys) and (self.spool is not None or self.count == 0)
+            if self.spool is None:
+                self.spool = open(os.path.join(self.directory, "spool.txt"), "w+", encoding="utf8")
+            self.spool.writelines(lines)
+        self.buffer.append(keys)
+        self.count += len(keys)
+        if (self.count - self.buffer_start) * RUN_DTYPE.itemsize >= self.memory_budget:
+            self.flush()
+
+    def new_run_filepath(self):
+        """Return the path of a new run file."""
+        self.num_files += 1
+        return os.path.join(self.directory, "run{}.bin".format(self.num_files))
+
+    def flush(self):
+        """Write the buffered keys to a new run."""
+        if self.count == self.buffer_start:
+            return
+        run = sorted_run(np.concatenate(self.buffer), self.buffer_start)
+        self.runs.append(self.new_run_filepath())
+        run.tofile(self.runs[-1])
+        self.buffer = []
+        self.buffer_start = self.count
+
+    def merge(self):
+        """Merge all keys added so far into a single run, and return the number of distinct keys."""
+        self.flush()
+        if len(self.runs) > 1:
+            sources = [np.memmap(run, dtype=RUN_DTYPE, mode="r") for run in self.runs]
+            block_size = max(self.memory_budget // (RUN_DTYPE.itemsize * 2 * len(sources)), 1)
+            positions = [0] * len(sources)
+            merged_filepath = self.new_run_filepath()
+            with open(merged_filepath, "wb") as merged_file:
+                while True:
+                    active = [i for i in range(len(sources)) if positions[i] < len(sources[i])]
+                    if not active:
+                        break
+                    # Every key up to the cutoff is in the current blocks, because a run holds each key only once.
+                    cutoff = min(sources[i]["key"][min(positions[i] + block_size, len(sources[i])) - 1] for i in active)
+                    parts = []
+                    for i in active:
+                        end = min(positions[i] + block_size, len(sources[i]))
+                        end = positions[i] + int(np.searchsorted(sources[i]["key"][positions[i]: end], cutoff, "right"))
+                        parts.append(np.asarray(sources[i][positions[i]: end]))
+                        positions[i] = end
+                    block = np.concatenate(parts)
+                    block = block[np.lexsort((block["index"], block["key"]))]
+                    first_of_each_key(block).tofile(merged_file)
+            del sources
+            for run in self.runs:
+                os.remove(run)
+            self.runs = [merged_filepath]
+        return os.path.getsize(self.runs[0]) // RUN_DTYPE.itemsize if self.runs else 0
+
+    def finish(self):
+        """Merge the runs and build the bitmap of the keys to keep. Return the number of keys to keep."""
+        num_kept = self.merge()
+        self.keep = np.zeros((self.count + 7) // 8, dtype=np.uint8)
+        if self.runs:
+            run = np.memmap(self.runs[0], dtype=RUN_DTYPE, mode="r")
+            block_size = max(self.memory_budget // RUN_DTYPE.itemsize, 1)
+            for start in range(0, len(run), block_size):
+                # set the bits of the numbers in the block, combining the bits that fall in the same byte
+                indexes = np.sort(run["index"][start: start + block_size])
+                byte_indexes = indexes >> np.uint64(3)
+                bits = (np.uint8(128) >> (indexes & np.uint64(7)).astype(np.uint8)).astype(np.uint8)
+                firsts = np.flatnonzero(np.r_[True, byte_indexes[1:] != byte_indexes[:-1]])
+                self.keep[byte_indexes[firsts]] |= np.add.reduceat(bits, firsts).astype(np.uint8)
+            del run
+        return num_kept
+
+    def keep_flags(self, start, stop):
+        """Return a boolean array of whether each of the keys numbered start to stop - 1 is the first occurrence of its
+        key. finish must have been called."""
+        offset = start & 7
+        flags = np.unpackbits(self.keep[start >> 3: (stop + 7) >> 3])
+        return flags[offset: offset + stop - start].astype(bool)
+
+    def kept_lines(self):
+        """Yield the spooled lines whose keys are the first occurrences of their keys, in the order they were added.
+        finish is called first if needed."""
+        if self.keep is None:
+            self.finish()
+        if self.spool is None:
+            return
+        self.spool.seek(0)
+        for start in range(0, self.count, KEEP_BATCH_SIZE):
+            flags = self.keep_flags(start, min(start + KEEP_BATCH_SIZE, self.count))
+            for is_kept, line in zip(flags.tolist(), self.spool):
+                if is_kept:
+                    yield line
+
+    def close(self):
+        """Delete the temporary files."""
+        if self.spool is not None:
+            self.spool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
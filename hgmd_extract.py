@@ -1,45 +1,53 @@
 """Extract substitution disease mutations from HGMD. Include only those that have "DM" in the Variant_class
-column (this excludes "DM?"). Include only those for which there exists a mapping from HGMD to UniProt ID without any
-errors or warnings.
+column (this excludes "DM?"). Include only those whose RefSeq protein can be mapped to a UniProt ID with the index of
+id_mapping.py and whose original amino acid matches the canonical UniProt sequence.
 
 Data extracted are non-repetitive at the protein level."""
 
 import io
 
-# construct mapping from HGMD to UniProt, ignoring errors and mismatches
-mismatches = set()  # set of protein mutations (in HGMD format) for which a mismatch was found
-with open("../Mutation Data/HGMD/hgmd2uniprot.txt") as map_f:
-    hgmd2uniprot = {}
-    for x in map_f.readlines():
-        xs = x.strip().split()
-        if len(xs) != 1 and xs[1] != "BISQUE" and xs[1] != "WARNING:" and xs[1] != "WARNING":
-            hgmd2uniprot[xs[0]] = xs[1]
-        elif len(xs) >= 3 and "Mismatch" in xs[3]:
-            mismatches.add(xs[0])
-
-# read mutations from HGMD and write file
+import hgvs_protein
+import id_mapping
+import mutation_validation
+import sequence_store
+
+# read mutations from HGMD, keeping the substitutions whose protein mutation can be parsed
+rows = []  # list of (gene name, RefSeq ID, mutation ID, protein mutation in HGMD format, variant class, parsed change)
+with io.open("../Mutation Data/HGMD/HGMD_substitutions_2015.3.tsv", encoding="utf8") as mut_file:
+    for x in mut_file:
+        xs = x.split("\t")
+        protein_mutation = xs[7]
+        if ":" not in protein_mutation:
+            continue
+        change = hgvs_protein.parse(protein_mutation.split(":")[1])
+        if change.error == hgvs_protein.OK:
+            rows.append((xs[8], protein_mutation.split(":")[0], xs[2], protein_mutation, xs[1], change))
+
+# construct mapping from RefSeq to UniProt, and check the original amino acids against the UniProt sequences
+id_map = id_mapping.open_index()
+refseq2uniprot = id_map.lookup(x[1] for x in rows)
+id_map.close()
+uniprot_seq = sequence_store.open_store()
+rows = [x for x in rows if refseq2uniprot.get(x[1]) in uniprot_seq]  # ignore mutations that cannot be mapped
+valid = mutation_validation.validate(uniprot_seq, [refseq2uniprot[x[1]] for x in rows],
+                                     [x[5].position for x in rows], [x[5].original for x in rows])[0]
+
+# write file
 fwrite = open("../Mutation Data/HGMDMutationData.txt", "w")
 fwrite.write("GeneName\tUniProtID\tMutationID\tProteinMutation\n")
 
 already_seen = set()
 mismatch_count = 0  # number of mismatches found in mapping from HGMD to UniProt
 match_count = 0  # total number of HGMD mutations extracted
-with io.open("../Mutation Data/HGMD/HGMD_substitutions_2015.3.tsv", encoding="utf8") as mut_file:
-    for x in mut_file.readlines():
-        xs = x.split("\t")
-        gene_name = xs[8]
-        protein_mutation = xs[7]
-        if protein_mutation not in hgmd2uniprot:  # ignore mutations for which no mapping to UniProt can be found
-            if protein_mutation in mismatches:
-                mismatch_count += 1
-            continue
-        uniprotid = hgmd2uniprot[protein_mutation]
-        mutationid = xs[2]
-        if xs[1] == "DM" and protein_mutation != "\\N" and protein_mutation not in already_seen:
-            protein_mutation2 = protein_mutation.split(":")[1][2:]
-            fwrite.write("\t".join((gene_name, uniprotid, mutationid, protein_mutation2)) + "\n")
-            match_count += 1
-        already_seen.add(protein_mutation)
+for (gene_name, refseq_id, mutationid, protein_mutation, variant_class, change), is_valid in zip(rows, valid.tolist()):
+    if not is_valid:
+        mismatch_count += 1
+        continue
+    if variant_class == "DM" and protein_mutation not in already_seen:
+        protein_mutation2 = protein_mutation.split(":")[1][2:]
+        fwrite.write("\t".join((gene_name, refseq2uniprot[refseq_id], mutationid, protein_mutation2)) + "\n")
+        match_count += 1
+    already_seen.add(protein_mutation)
 
 fwrite.close()
 print("{} mismatches, {} matches".format(mismatch_count, match_count))
@@ -0,0 +1,107 @@
+"""Parse single-residue protein changes in HGVS p. notation, such as "Ser180Asn", "S180N", "Gly12=" or "Arg97Ter".
+
+A change may be written with 3-letter or 1-letter amino acid abbreviations, and may be preceded by "p." and enclosed in
+parentheses. The result is a ProteinChange of 1-letter residues, where a stop codon (Ter) is "*", selenocysteine (Sec)
+is "U", and a synonymous change ("=") has the same original and mutant residue. Instead of raising exceptions, a
+ProteinChange carries one of the following error codes:
+
+OK - the change was parsed
+MALFORMED - the string is not a substitution of a single residue
+UNKNOWN_RESIDUE - an amino acid abbreviation is not recognized
+
+The same changes occur many times across dbSNP, ClinVar and ExAC, so parsed results are memoized in bounded caches."""
+
+import functools
+import re
+from collections import namedtuple
+
+CACHE_SIZE = 1 << 16
+
+OK = 0
+MALFORMED = 1
+UNKNOWN_RESIDUE = 2
+
+# map from 3-letter abbreviation to 1-letter abbreviation of the 20 standard amino acids
+STANDARD_ABBREV = {'Cys':'C', 'Asp':'D', 'Ser':'S', 'Gln':'Q', 'Lys':'K', 'Ile':'I', 'Pro':'P', 'Thr':'T', 'Phe':'F',
+                   'Asn':'N', 'Gly':'G', 'His':'H', 'Leu':'L', 'Arg':'R', 'Trp':'W', 'Ala':'A', 'Val':'V', 'Glu':'E',
+                   'Tyr':'Y', 'Met':'M'}
+STANDARD_RESIDUES = frozenset(STANDARD_ABBREV.values())
+
+# map from 3-letter abbreviation to 1-letter abbreviation of every residue that may appear in a change
+THREE_TO_ONE = dict(STANDARD_ABBREV, Sec="U", Pyl="O", Xaa="X", Ter="*")
+ONE_LETTER_RESIDUES = frozenset(THREE_TO_ONE.values())
+
+THREE_LETTER_PATTERN = re.compile(r"([A-Z][a-z]{2})([0-9]+)([A-Z][a-z]{2}|\*|=)")
+ONE_LETTER_PATTERN = re.compile(r"([A-Z*])([0-9]+)([A-Z*=])")
+
+# A parsed protein change. original and mutant are 1-letter residues and position is the 1-indexed position. If error
+# is not OK, then original and mutant are "" and position is 0.
+ProteinChange = namedtuple("ProteinChange", ["original", "position", "mutant", "error"])
+
+MALFORMED_CHANGE = ProteinChange("", 0, "", MALFORMED)
+UNKNOWN_RESIDUE_CHANGE = ProteinChange("", 0, "", UNKNOWN_RESIDUE)
+
+
+def strip_notation(m):
+    """Given a protein change m, return it without a leading "p." and without enclosing parentheses."""
+    if m.startswith("p."):
+        m = m[2:]
+    if m.startswith("(") and m.endswith(")"):
+        m = m[1:-1]
+    return m
+
+
+def match_change(match, original, mutant):
+    """Given a match of a change pattern and the 1-letter residues that its first and last groups stand for, return the
+    ProteinChange. A mutant of "=" stands for the original residue."""
+    if original not in ONE_LETTER_RESIDUES or (mutant not in ONE_LETTER_RESIDUES and mutant != "="):
+        return UNKNOWN_RESIDUE_CHANGE
+    return ProteinChange(original, int(match.group(2)), original if mutant == "=" else mutant, OK)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_three_letter(m):
+    """Given a protein change m written with 3-letter amino acid abbreviations, such as "Ser180Asn", return its
+    ProteinChange."""
+    match = THREE_LETTER_PATTERN.fullmatch(strip_notation(m))
+    if match is None:
+        return MALFORMED_CHANGE
+    mutant = match.group(3)
+    if len(mutant) == 3:
+        mutant = THREE_TO_ONE.get(mutant, "")
+    return match_change(match, THREE_TO_ONE.get(match.group(1), ""), mutant)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_one_letter(m):
+    """Given a protein change m written with 1-letter amino acid abbreviations, such as "S180N", return its
+    ProteinChange."""
+    match = ONE_LETTER_PATTERN.fullmatch(strip_notation(m))
+    if match is None:
+        return MALFORMED_CHANGE
+    return match_change(match, match.group(1), match.group(3))
+
+
+def parse(m):
+    """Given a protein change m written with either 3-letter or 1-letter amino acid abbreviations, return its
+    ProteinChange."""
+    change = parse_three_letter(m)
+    if change.error == MALFORMED:
+        return parse_one_letter(m)
+    return change
+
+
+def parse_batch(changes, parser=parse):
+    """Given an iterable of protein changes, such as a column of a mutation file, return the list of their
+    ProteinChange objects. parser may be parse, parse_three_letter, or parse_one_letter."""
+    return [parser(m) for m in changes]
+
+
+def one_letter(change):
+    """Given a ProteinChange, return it as a string with 1-letter amino acid abbreviations, such as "S180N"."""
+    return change.original + str(change.position) + change.mutant
+
+
+def is_standard(change):
+    """Return whether the ProteinChange was parsed and changes one of the 20 standard amino acids into another."""
+    return change.error == OK and change.original in STANDARD_RESIDUES and change.mutant in STANDARD_RESIDUES
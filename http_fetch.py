@@ -0,0 +1,347 @@
+"""Download many URLs concurrently with asyncio, for the scripts that query MobiDB, DisProt, UniProt and dbSNP.
+
+Requests are served by a fixed number of coroutines on one thread, so at most max_concurrency requests are in flight at
+once. Connections are kept alive with HTTP/1.1 and reused for later requests to the same host, with at most
+max_per_host open connections to a host. A host may be given a rate limit in requests per second. A request that fails
+because of a network error, a timeout, a 429 or a 5xx status is retried after an exponential backoff with full jitter,
+up to max_retries times. A response body is either streamed to a file, which is written under a temporary name and
+renamed when complete so that a partial download never looks finished, or kept in memory.
+
+Only the standard library is used, and only asyncio calls that exist in Python 3.6. Any server that speaks HTTP/1.0
+or HTTP/1.1 will do, so the downloaders can be run against a local stub server by pointing their URL constants at it.
+
+Example:
+    requests = [Request(x, "http://www.disprot.org/ws/get/" + x, x + ".json") for x in ids]
+    for result in fetch_all(requests, max_concurrency=20, rate_limits={"www.disprot.org": 5}):
+        if not result.ok:
+            print(result.key, result.error)
+"""
+
+import asyncio
+import collections
+import hashlib
+import os
+import random
+import ssl
+import urllib.parse
+
+DEFAULT_MAX_CONCURRENCY = 50  # number of requests in flight at once
+DEFAULT_MAX_PER_HOST = 10  # number of open connections to one host
+DEFAULT_MAX_RETRIES = 8
+DEFAULT_TIMEOUT = 60  # seconds allowed for one attempt, from sending the request to reading the whole body
+BACKOFF_BASE = 0.5  # seconds before the first retry, doubled for each further retry
+BACKOFF_MAX = 60  # longest wait in seconds between retries
+MAX_REDIRECTS = 5
+READ_SIZE = 1 << 16  # number of bytes of a body read and written at once
+USER_AGENT = "YuLab-http_fetch"
+
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+REDIRECT_STATUSES = frozenset((301, 302, 303, 307, 308))
+NO_BODY_STATUSES = frozenset((204, 304))
+
+
+class Request(collections.namedtuple("Request", "key url destination headers")):
+    """A GET request. key identifies the request to the caller and is copied to its Result. If destination is a path,
+    then the body of a 200 response is streamed to that file; otherwise it is kept in memory. headers is a dictionary of
+    extra request headers."""
+    __slots__ = ()
+
+    def __new__(cls, key, url, destination=None, headers=None):
+        return super().__new__(cls, key, url, destination, headers or {})
+
+
+class Result(collections.namedtuple("Result", "key url status headers size checksum body error")):
+    """The outcome of a Request. url is the final URL after redirects. status is the HTTP status, or None if no response
+    was received. headers is a dictionary with lowercase names. size is the number of bytes of the body and checksum is
+    its SHA-256 digest in hexadecimal. body is the body in bytes if the request had no destination, and None otherwise.
+    error is None if a response was received and its status was not an error, and otherwise a description of the last
+    failure."""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class HTTPStatusError(Exception):
+    """Raised for a response whose status is an error."""
+
+    def __init__(self, status, reason, retry_after=None):
+        super().__init__("HTTP {} {}".format(status, reason))
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Connection:
+    """A connection to a host, which can be reused for further requests if the last response allows it."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+        self.used = False  # whether a request has already been served on this connection
+
+    def close(self):
+        self.writer.close()
+
+
+class HostPool:
+    """The idle connections to one host, and the limits on the connections and request rate of that host."""
+
+    def __init__(self, max_connections, rate):
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0  # loop time at which the next request may start
+
+    async def wait_turn(self):
+        """Wait until the rate limit of the host allows another request."""
+        if not self.interval:
+            return
+        now = asyncio.get_event_loop().time()
+        start = max(now, self.next_time)
+        self.next_time = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def host(url):
+    """Return the host name of url, as used for the keys of rate_limits."""
+    return urllib.parse.urlsplit(url).hostname
+
+
+def backoff_delay(attempt):
+    """Return a random delay in seconds before retry number attempt, counting from 0."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def parse_headers(lines):
+    """Given the header lines of a response as bytes, return a dictionary with lowercase names. Repeated headers are
+    joined with commas."""
+    headers = {}
+    for line in lines:
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        value = value.strip()
+        headers[name] = headers[name] + ", " + value if name in headers else value
+    return headers
+
+
+class Fetcher:
+    """Serve Requests on pooled keep-alive connections. See the module docstring."""
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST, rate_limits=None, max_retries=DEFAULT_MAX_RETRIES,
+                 timeout=DEFAULT_TIMEOUT):
+        """rate_limits maps a host name to the largest number of requests per second sent to it."""
+        self.max_per_host = max_per_host
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pools = {}  # map from (scheme, host, port) to HostPool
+        self.ssl_context = None
+
+    def pool(self, origin):
+        """Return the HostPool of origin, a tuple (scheme, host, port)."""
+        if origin not in self.pools:
+            self.pools[origin] = HostPool(self.max_per_host, self.rate_limits.get(origin[1]))
+        return self.pools[origin]
+
+    async def connect(self, origin):
+        """Return a Connection to origin, reusing an idle one if there is one. The caller must hold a slot of the
+        HostPool."""
+        pool = self.pool(origin)
+        while pool.idle:
+            connection = pool.idle.pop()
+            if not connection.reader.at_eof():
+                return connection
+            connection.close()
+        scheme, host, port = origin
+        if scheme == "https":
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            reader, writer = await asyncio.open_connection(host, port, ssl=self.ssl_context, server_hostname=host,
+                                                           limit=READ_SIZE * 4)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=READ_SIZE * 4)
+        return Connection(reader, writer)
+
+    def release(self, origin, connection):
+        """Return the connection to the idle connections of origin, or close it if it cannot be reused."""
+        if connection.reusable:
+            connection.used = True
+            self.pool(origin).idle.append(connection)
+        else:
+            connection.close()
+
+    async def read_body(self, connection, headers, sink):
+        """Read the body of a response with the given headers from the connection and pass it to sink in pieces. Return
+        the number of bytes read."""
+        reader = connection.reader
+        size = 0
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionResetError("connection closed in a chunked body")
+                chunk_size = int(line.split(b";")[0].strip(), 16)
+                if chunk_size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):  # skip trailers
+                        pass
+                    break
+                while chunk_size:
+                    data = await reader.readexactly(min(chunk_size, READ_SIZE))
+                    sink(data)
+                    size += len(data)
+                    chunk_size -= len(data)
+                await reader.readline()  # CRLF after chunk data
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                data = await reader.readexactly(min(remaining, READ_SIZE))
+                sink(data)
+                size += len(data)
+                remaining -= len(data)
+        else:  # body ends when the server closes the connection
+            connection.reusable = False
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                sink(data)
+                size += len(data)
+        return size
+
+    async def attempt(self, connection, url, request):
+        """Send the request for url on the connection and read the response. Return a tuple (status, reason, headers,
+        size, checksum, body). A 200 body is streamed to the destination of the request if it has one."""
+        parts = urllib.parse.urlsplit(url)
+        target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        lines = ["GET {} HTTP/1.1".format(target), "Host: " + parts.netloc, "User-Agent: " + USER_AGENT,
+                 "Accept-Encoding: identity", "Connection: keep-alive"]
+        lines.extend("{}: {}".format(name, value) for name, value in request.headers.items())
+        connection.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before the response")
+        while True:
+            version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+            status = int(status)
+            header_lines = []
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                header_lines.append(line)
+            headers = parse_headers(header_lines)
+            if status >= 200:
+                break
+            status_line = await reader.readline()  # skip interim 1xx responses
+        connection_header = headers.get("connection", "").lower()
+        if "close" in connection_header or (version == "HTTP/1.0" and "keep-alive" not in connection_header):
+            connection.reusable = False
+
+        if status in NO_BODY_STATUSES:
+            return status, reason, headers, 0, None, b""
+        digest = hashlib.sha256()
+        if status == 200 and request.destination is not None:
+            temp_filepath = request.destination + ".part"
+            try:
+                with open(temp_filepath, "wb") as f:
+                    size = await self.read_body(connection, headers, lambda data: (digest.update(data), f.write(data)))
+                os.replace(temp_filepath, request.destination)
+            except BaseException:
+                if os.path.exists(temp_filepath):
+                    os.remove(temp_filepath)
+                raise
+            return status, reason, headers, size, digest.hexdigest(), None
+        pieces = []
+        size = await self.read_body(connection, headers, lambda data: (digest.update(data), pieces.append(data)))
+        return status, reason, headers, size, digest.hexdigest(), b"".join(pieces)
+
+    async def fetch(self, request):
+        """Serve the request, following redirects and retrying failures, and return its Result."""
+        url = request.url
+        redirects = 0
+        attempt = 0
+        error = None
+        status = None
+        while True:
+            parts = urllib.parse.urlsplit(url)
+            origin = (parts.scheme, host(url), parts.port or (443 if parts.scheme == "https" else 80))
+            pool = self.pool(origin)
+            retry_after = None
+            await pool.slots.acquire()
+            connection = None
+            try:
+                await pool.wait_turn()
+                connection = await asyncio.wait_for(self.connect(origin), self.timeout)
+                status, reason, headers, size, checksum, body = await asyncio.wait_for(
+                    self.attempt(connection, url, request), self.timeout)
+                self.release(origin, connection)
+                connection = None
+                if status in REDIRECT_STATUSES and "location" in headers and redirects < MAX_REDIRECTS:
+                    url = urllib.parse.urljoin(url, headers["location"])
+                    redirects += 1
+                    continue
+                if status >= 400:
+                    retry_after = headers.get("retry-after")
+                    raise HTTPStatusError(status, reason, int(retry_after) if (retry_after or "").isdigit() else None)
+                return Result(request.key, url, status, headers, size, checksum, body, None)
+            except (OSError, EOFError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError,
+                    HTTPStatusError) as e:
+                stale = connection is not None and connection.used and isinstance(e, ConnectionResetError)
+                if connection is not None:
+                    connection.close()
+                error = "{}: {}".format(type(e).__name__, e) if str(e) else type(e).__name__
+                if stale:
+                    continue  # the server closed an idle keep-alive connection, so retry at once on a new one
+                if isinstance(e, HTTPStatusError):
+                    if e.status not in RETRY_STATUSES:
+                        return Result(request.key, url, e.status, {}, 0, None, None, error)
+                    retry_after = e.retry_after
+                status = getattr(e, "status", None)
+                if attempt >= self.max_retries:
+                    return Result(request.key, url, status, {}, 0, None, None, error)
+            finally:
+                pool.slots.release()
+            await asyncio.sleep(min(retry_after, BACKOFF_MAX) if retry_after is not None else backoff_delay(attempt))
+            attempt += 1
+
+    def close(self):
+        """Close the idle connections."""
+        for pool in self.pools.values():
+            for connection in pool.idle:
+                connection.close()
+            pool.idle = []
+
+
+async def fetch_iter(requests, on_result, max_concurrency, fetcher):
+    """Serve the iterable of requests with max_concurrency coroutines that share fetcher, and pass each Result to
+    on_result as it completes."""
+    requests = iter(requests)
+
+    async def worker():
+        for request in requests:  # the coroutines share one iterator, so each request is served once
+            on_result(await fetcher.fetch(request))
+
+    await asyncio.gather(*[asyncio.ensure_future(worker()) for _ in range(max_concurrency)])
+
+
+def fetch_all(requests, on_result=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, **options):
+    """Serve the iterable of Requests and return the list of their Results, in order of completion. If on_result is
+    given, then each Result is passed to it as it completes instead, and an empty list is returned, so that results need
+    not be held in memory. options are passed to Fetcher. The requests are read lazily, so they may be generated."""
+    results = []
+    fetcher = Fetcher(**options)
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(fetch_iter(requests, on_result or results.append, max_concurrency, fetcher))
+    finally:
+        fetcher.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+    return results
@@ -0,0 +1,170 @@
+"""Tests of http_fetch.py and download_manifest.py against a stub HTTP server on a random local port. Run them with
+    python -m pytest http_fetch_test.py
+
+The tests check that a request answered with a 5xx status is retried until it succeeds, that redirects are followed,
+that a refresh with the validators stored in a manifest gets a 304 Not Modified for an unchanged file, and that
+record_fetch tells a changed file from an unchanged one."""
+
+import http.server
+import os
+import socketserver
+import threading
+
+import download_manifest
+import http_fetch
+
+NUM_FAILURES = 2  # number of 503 responses sent for a path under /flaky/ before it succeeds
+
+server = None  # StubServer, started by setup_module
+base_url = None
+saved_backoff_base = None
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the paths /flaky/..., /redirect/... (a 302 to /plain/...), and /plain/... and /versioned/... (a body that
+    depends on the path and, for /versioned/, on the server's version, with an ETag)."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, headers=()):
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith("/flaky/"):
+            with server.lock:
+                server.failures[self.path] = server.failures.get(self.path, 0) + 1
+                failures = server.failures[self.path]
+            if failures <= NUM_FAILURES:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_body(self.path.encode("utf8"))
+        elif self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", "/plain/" + self.path[len("/redirect/"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path.startswith("/plain/"):
+            self.send_body(self.path.encode("utf8"))
+        elif self.path.startswith("/versioned/"):
+            etag = '"' + str(server.version) + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_body((self.path + " version " + str(server.version)).encode("utf8"), [("ETag", etag)])
+        else:
+            self.send_error(404)
+
+
+class StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def setup_module():
+    """Start a StubServer on a random local port in a background thread, and make the retries fast."""
+    global server, base_url, saved_backoff_base
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.failures = {}  # number of requests to each path under /flaky/
+    server.version = 1  # version of the bodies under /versioned/
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:" + str(server.server_address[1])
+    saved_backoff_base = http_fetch.BACKOFF_BASE
+    http_fetch.BACKOFF_BASE = 0.01
+
+
+def teardown_module():
+    http_fetch.BACKOFF_BASE = saved_backoff_base
+    server.shutdown()
+    server.server_close()
+
+
+def test_retry():
+    """Requests answered with 503 are retried until they succeed."""
+    requests = [http_fetch.Request(x, base_url + "/flaky/" + str(x)) for x in range(5)]
+    results = list(http_fetch.fetch_all(requests, max_retries=NUM_FAILURES + 1))
+    assert sorted(x.key for x in results) == list(range(5))
+    for result in results:
+        assert result.ok and result.status == 200, result
+        assert result.body == ("/flaky/" + str(result.key)).encode("utf8")
+
+
+def test_retry_gives_up():
+    """A request that fails more often than max_retries allows is reported as failed."""
+    result, = http_fetch.fetch_all([http_fetch.Request("f", base_url + "/flaky/give-up")], max_retries=1)
+    assert not result.ok and result.status == 503, result
+
+
+def test_redirect(tmp_path):
+    """A redirect is followed, and the body of the final URL is saved to the destination."""
+    destination = str(tmp_path / "redirected.txt")
+    result, = http_fetch.fetch_all([http_fetch.Request("r", base_url + "/redirect/r", destination)])
+    assert result.ok and result.status == 200, result
+    assert result.url == base_url + "/plain/r"
+    with open(destination, "rb") as f:
+        assert f.read() == b"/plain/r"
+    assert not os.path.exists(destination + ".part")
+
+
+def refresh(directory, manifest):
+    """Fetch every key of manifest from /versioned/ with the headers of manifest.refresh_list and record the results.
+    Return the list of results and the sorted list of keys whose file changed."""
+    requests = [http_fetch.Request(key, base_url + "/versioned/" + key, os.path.join(directory, key + ".txt"), headers)
+                for key, headers in manifest.refresh_list(directory)]
+    results = list(http_fetch.fetch_all(requests))
+    changed = [x.key for x in results if manifest.record_fetch(x, x.key + ".txt")]
+    return results, sorted(changed)
+
+
+def test_refresh(tmp_path):
+    """A refresh sends If-None-Match, an unchanged file gets a 304 and is not reported as changed, and a changed file
+    is reported as changed. The keys keep the order in which they were added."""
+    directory = str(tmp_path / "mirror")
+    os.mkdir(directory)
+    keys = ["P04637", "Q9Y6K9", "O15350"]
+    server.version = 1
+    with download_manifest.open_manifest(directory) as manifest:
+        manifest.expect(keys)
+        results, changed = refresh(directory, manifest)
+        assert changed == sorted(keys)
+        assert manifest.missing() == []
+        assert manifest.refresh_list(directory) == [(x, {"If-None-Match": '"1"'}) for x in keys]
+
+        # nothing changed on the server, so every file gets a 304 and none is reported
+        results, changed = refresh(directory, manifest)
+        assert all(x.ok and x.status == 304 for x in results), results
+        assert changed == []
+
+        # a new version changes every body, and a missing file is downloaded in full
+        server.version = 2
+        os.remove(os.path.join(directory, "Q9Y6K9.txt"))
+        results, changed = refresh(directory, manifest)
+        assert changed == sorted(keys)
+        with open(os.path.join(directory, "Q9Y6K9.txt"), "rb") as f:
+            assert f.read() == b"/versioned/Q9Y6K9 version 2"
+        assert manifest.entry("P04637")["etag"] == '"2"'
+        assert [x[0] for x in manifest.refresh_list(directory)] == keys
+
+
+def test_record_done_change(tmp_path):
+    """record_done reports a change only when the checksum differs from the one recorded before."""
+    directory = str(tmp_path / "mirror")
+    os.mkdir(directory)
+    with download_manifest.open_manifest(directory) as manifest:
+        manifest.expect(["A", "B"])
+        assert manifest.record_done("A", "A.txt", 1, "0" * 64)
+        assert not manifest.record_done("A", "A.txt", 1, "0" * 64)
+        assert manifest.record_done("A", "A.txt", 1, "1" * 64)
+        assert manifest.missing() == ["B"]
+        assert [x[0] for x in manifest.refresh_list(directory)] == ["A", "B"]
@@ -0,0 +1,127 @@
+"""Map RefSeq, Ensembl and gene name identifiers to UniProt IDs with a local index built from the UniProt ID mapping
+file, instead of mapping them by hand with Bisque.
+
+The ID mapping file was obtained from
+ftp://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/idmapping/by_organism/HUMAN_9606_idmapping.dat.gz
+and is in ../UniProt ID Mapping. It has tab-delimited lines with columns UniProtKB-AC, ID_type and ID. It is read
+once, gzipped, into an SQLite database next to it that holds one UniProt ID for each RefSeq protein (RefSeq), RefSeq
+transcript (RefSeq_NT), Ensembl protein (Ensembl_PRO) and gene name (Gene_Name) identifier. RefSeq and Ensembl
+identifiers are stored both with and without their version suffix, such as "NP_000537.3" and "NP_000537". When an
+identifier maps to more than one UniProt entry, canonical entries are preferred over isoforms (such as "P04637-2",
+which is stored as "P04637"), and then the entry that comes first in the file is chosen.
+
+Run this script to (re)build the index after the ID mapping file is updated."""
+
+import os
+import sqlite3
+import sys
+
+import common_tools
+
+IDMAPPING_FILEPATH = "../UniProt ID Mapping/HUMAN_9606_idmapping.dat.gz"
+INDEX_FILEPATH = "../UniProt ID Mapping/HUMAN_9606_idmapping.sqlite"
+ID_TYPES = ("RefSeq", "RefSeq_NT", "Ensembl_PRO", "Gene_Name")
+VERSIONED_ID_TYPES = ("RefSeq", "RefSeq_NT", "Ensembl_PRO")
+INSERT_BATCH_SIZE = 100000
+LOOKUP_BATCH_SIZE = 500  # number of identifiers per query, below the limit of SQLite on query parameters
+
+
+def unversioned(identifier):
+    """Given an identifier such as "NP_000537.3", return it without its version suffix, such as "NP_000537"."""
+    i = identifier.rfind(".")
+    return identifier[:i] if i != -1 and identifier[i+1:].isdigit() else identifier
+
+
+def read_idmapping(filepath):
+    """Yield tuples (identifier, UniProt ID, is_isoform) for the identifiers of the types in ID_TYPES in the ID mapping
+    file at filepath, which may be gzipped. Versioned identifiers are yielded both with and without their version."""
+    with common_tools.open_text(filepath) as idmapping_file:
+        for line in idmapping_file:
+            xl = line.rstrip("\n").split("\t")
+            if len(xl) != 3 or xl[1] not in ID_TYPES:
+                continue
+            uniprot = xl[0]
+            is_isoform = "-" in uniprot
+            if is_isoform:
+                uniprot = uniprot[:uniprot.index("-")]
+            yield xl[2], uniprot, is_isoform
+            if xl[1] in VERSIONED_ID_TYPES and unversioned(xl[2]) != xl[2]:
+                yield unversioned(xl[2]), uniprot, is_isoform
+
+
+def build_index(idmapping_filepath=IDMAPPING_FILEPATH, index_filepath=INDEX_FILEPATH):
+    """Read the ID mapping file and write the index. The index is written under a temporary name first so that readers
+    never see a partially built index."""
+    temp_filepath = index_filepath + ".tmp"
+    if os.path.exists(temp_filepath):
+        os.remove(temp_filepath)
+    connection = sqlite3.connect(temp_filepath)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("CREATE TEMP TABLE raw (identifier TEXT, uniprot TEXT, is_isoform INTEGER)")
+    rows = read_idmapping(idmapping_filepath)
+    while True:
+        batch = [row for _, row in zip(range(INSERT_BATCH_SIZE), rows)]
+        if not batch:
+            break
+        connection.executemany("INSERT INTO raw VALUES (?, ?, ?)", batch)
+    connection.execute("CREATE TABLE mapping (identifier TEXT PRIMARY KEY, uniprot TEXT NOT NULL) WITHOUT ROWID")
+    connection.execute("INSERT OR IGNORE INTO mapping SELECT identifier, uniprot FROM raw ORDER BY is_isoform, rowid")
+    connection.commit()
+    connection.close()
+    os.replace(temp_filepath, index_filepath)
+
+
+class IDMapping:
+    """Read-only lookup of UniProt IDs in the index built by build_index."""
+
+    def __init__(self, index_filepath=INDEX_FILEPATH):
+        self.connection = sqlite3.connect(index_filepath)
+
+    def get(self, identifier, default=None):
+        """Return the UniProt ID of the identifier, or default if it cannot be mapped. If the versioned identifier is
+        not in the index, then it is looked up without its version."""
+        return self.lookup([identifier]).get(identifier, default)
+
+    def lookup(self, identifiers):
+        """Given an iterable of identifiers, return a dictionary that maps each identifier that can be mapped to its
+        UniProt ID. If a versioned identifier is not in the index, then it is looked up without its version."""
+        identifiers = set(identifiers)
+        result = self.lookup_exact(identifiers)
+        fallback = {}  # map from unversioned identifier to the versioned identifiers that were not found
+        for identifier in identifiers - result.keys():
+            if unversioned(identifier) != identifier:
+                fallback.setdefault(unversioned(identifier), []).append(identifier)
+        for key, uniprot in self.lookup_exact(fallback).items():
+            for identifier in fallback[key]:
+                result[identifier] = uniprot
+        return result
+
+    def lookup_exact(self, identifiers):
+        """Given an iterable of identifiers, return a dictionary that maps each identifier that is in the index to its
+        UniProt ID."""
+        identifiers = list(identifiers)
+        result = {}
+        for i in range(0, len(identifiers), LOOKUP_BATCH_SIZE):
+            batch = identifiers[i: i + LOOKUP_BATCH_SIZE]
+            query = "SELECT identifier, uniprot FROM mapping WHERE identifier IN ({})"
+            result.update(self.connection.execute(query.format(",".join("?" * len(batch))), batch))
+        return result
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+
+def open_index(idmapping_filepath=IDMAPPING_FILEPATH, index_filepath=INDEX_FILEPATH):
+    """Return the IDMapping of the index, building it from the ID mapping file first if it does not exist yet."""
+    if not os.path.isfile(index_filepath):
+        build_index(idmapping_filepath, index_filepath)
+    return IDMapping(index_filepath)
+
+
+if __name__ == "__main__":
+    idmapping_filepath = sys.argv[1] if len(sys.argv) > 1 else IDMAPPING_FILEPATH
+    print("Indexing " + idmapping_filepath)
+    build_index(idmapping_filepath)
+    print("Done")
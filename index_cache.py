@@ -0,0 +1,161 @@
+"""Cache the parsed interface and disorder indexes on disk so that the counting scripts do not have to re-parse
+hSIN_organized.txt and DisorderData.txt on every run.
+
+Each index is saved as an uncompressed .npz file next to its source file, together with the size, modification time
+and SHA-1 hash of the source. A cache is used as is when the size and modification time of the source still match. If
+they do not match but the hash does (for example, the file was copied or touched), then the cache is kept and its
+recorded size and modification time are updated. Otherwise, the index is rebuilt from the source and saved again."""
+
+import hashlib
+import os
+
+import numpy as np
+
+import region_index
+import residue_annotation
+import sequence_store
+
+CACHE_VERSION = 3
+
+
+def file_sha1(filepath):
+    """Return the hexadecimal SHA-1 hash of the contents of the file at filepath."""
+    sha1 = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def cache_filepath(source_filepath, name):
+    """Return the path of the cache file named name that belongs to source_filepath."""
+    return source_filepath + "." + name + ".npz"
+
+
+def save_cache(filepath, arrays, source_stat, source_sha1):
+    """Write the dictionary of arrays to the cache file at filepath along with the signature of its source. The file is
+    written under a temporary name first so that an interrupted run never leaves a partial cache behind."""
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, "wb") as f:
+        np.savez(f, cache_version=CACHE_VERSION, source_size=source_stat.st_size,
+                 source_mtime_ns=source_stat.st_mtime_ns, source_sha1=source_sha1, **arrays)
+    os.replace(temp_filepath, filepath)
+
+
+def cached_arrays(source_filepath, name, build):
+    """Return the dictionary of arrays cached under name for source_filepath. If the cache is missing or out of date,
+    then call build() to construct the dictionary of arrays from the source, and save it."""
+    filepath = cache_filepath(source_filepath, name)
+    source_stat = os.stat(source_filepath)
+    try:
+        with np.load(filepath) as cache:
+            arrays = {x: cache[x] for x in cache.files}
+    except (FileNotFoundError, ValueError, OSError):
+        arrays = None
+
+    if arrays is not None and arrays.pop("cache_version") == CACHE_VERSION:
+        size = arrays.pop("source_size")
+        mtime_ns = arrays.pop("source_mtime_ns")
+        sha1 = str(arrays.pop("source_sha1"))
+        if size == source_stat.st_size and mtime_ns == source_stat.st_mtime_ns:
+            return arrays
+        source_sha1 = file_sha1(source_filepath)
+        if sha1 == source_sha1:
+            save_cache(filepath, arrays, source_stat, source_sha1)
+            return arrays
+    else:
+        source_sha1 = file_sha1(source_filepath)
+
+    arrays = build()
+    save_cache(filepath, arrays, source_stat, source_sha1)
+    return arrays
+
+
+def pack_intervals(keys, interval_lists):
+    """Given a list of keys and a parallel list of interval lists, return a dictionary of flat arrays that hold the
+    same data. The intervals of keys[i] are starts[offsets[i]: offsets[i+1]] and ends[offsets[i]: offsets[i+1]]."""
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in interval_lists], out=offsets[1:])
+    starts = np.fromiter((x[0] for intervals in interval_lists for x in intervals), dtype=np.int32, count=offsets[-1])
+    ends = np.fromiter((x[1] for intervals in interval_lists for x in intervals), dtype=np.int32, count=offsets[-1])
+    return {"keys": np.array(keys, dtype=str), "offsets": offsets, "starts": starts, "ends": ends}
+
+
+def unpack_intervals(arrays):
+    """Inverse of pack_intervals. Return a tuple (keys, interval_lists)."""
+    offsets = arrays["offsets"].tolist()
+    intervals = list(zip(arrays["starts"].tolist(), arrays["ends"].tolist()))
+    return arrays["keys"].tolist(), [intervals[offsets[i]: offsets[i+1]] for i in range(len(offsets) - 1)]
+
+
+def load_interface_index(filepath=region_index.INTERFACE_FILEPATH):
+    """Cached version of region_index.load_interface_index."""
+    def build():
+        uniprot_interface = region_index.load_interface_index(filepath)
+        return pack_intervals(list(uniprot_interface), list(uniprot_interface.values()))
+    return dict(zip(*unpack_intervals(cached_arrays(filepath, "interface", build))))
+
+
+def load_domain_index(filepath=region_index.INTERFACE_FILEPATH):
+    """Cached version of region_index.load_domain_index."""
+    def build():
+        uniprots = []
+        pfams = []
+        interval_lists = []
+        for uniprot, domains in region_index.load_domain_index(filepath).items():
+            for pfam, intervals in domains.items():
+                uniprots.append(uniprot)
+                pfams.append(pfam)
+                interval_lists.append(intervals)
+        arrays = pack_intervals(uniprots, interval_lists)
+        arrays["pfams"] = np.array(pfams, dtype=str)
+        return arrays
+
+    arrays = cached_arrays(filepath, "domain", build)
+    uniprots, interval_lists = unpack_intervals(arrays)
+    uniprot_domains = {}
+    for uniprot, pfam, intervals in zip(uniprots, arrays["pfams"].tolist(), interval_lists):
+        uniprot_domains.setdefault(uniprot, {})[pfam] = intervals
+    return uniprot_domains
+
+
+def load_disorder_indexes(filepath=region_index.DISORDER_FILEPATH):
+    """Cached version of region_index.load_disorder_indexes, for all types of disordered region."""
+    def build():
+        uniprots = []
+        types = []
+        interval_lists = []
+        for disorder_type, uniprot_disorder in region_index.load_disorder_indexes(filepath).items():
+            for uniprot, intervals in uniprot_disorder.items():
+                uniprots.append(uniprot)
+                types.append(disorder_type)
+                interval_lists.append(intervals)
+        arrays = pack_intervals(uniprots, interval_lists)
+        arrays["types"] = np.array(types, dtype=str)
+        return arrays
+
+    arrays = cached_arrays(filepath, "disorder", build)
+    uniprots, interval_lists = unpack_intervals(arrays)
+    type_indexes = {x: {} for x in region_index.INDEX_TYPES}
+    for uniprot, disorder_type, intervals in zip(uniprots, arrays["types"].tolist(), interval_lists):
+        type_indexes[disorder_type][uniprot] = intervals
+    return type_indexes
+
+
+def load_disorder_index(disorder_type, filepath=region_index.DISORDER_FILEPATH):
+    """Cached version of region_index.load_disorder_index."""
+    assert disorder_type in region_index.INDEX_TYPES, "Incorrect disorder type indicated"
+    return load_disorder_indexes(filepath)[disorder_type]
+
+
+def load_annotation(interface_filepath=region_index.INTERFACE_FILEPATH,
+                    disorder_filepath=region_index.DISORDER_FILEPATH, store_filepath=sequence_store.STORE_FILEPATH,
+                    index_filepath=sequence_store.INDEX_FILEPATH):
+    """Construct the residue_annotation.ResidueAnnotation from the cached interface and disorder indexes and the
+    lengths of the sequences in the sequence store. The disordered regions are the same as those returned by
+    load_disorder_index."""
+    store = sequence_store.open_store(store_filepath, index_filepath)
+    uniprot_lengths = dict(zip(store.uniprot_ids, store.lengths))
+    store.close()
+    return residue_annotation.build_annotation(load_interface_index(interface_filepath),
+                                               load_disorder_indexes(disorder_filepath), uniprot_lengths)
@@ -0,0 +1,74 @@
+"""Tests that the residue annotation and the disorder indexes cached by index_cache.py agree with each other and with
+region_index.py, whether they are built from the sources or read back from the caches. Run them with
+    python -m pytest index_cache_test.py"""
+
+import os
+
+import numpy as np
+
+import index_cache
+import region_index
+import residue_annotation
+import sequence_store
+from residue_annotation_test import DISORDER_LINES
+
+INTERFACE_LINES = [("UniProtA", "UniProtB", "PfamA", "ResiduesA", "PfamB", "ResiduesB"),
+                   ("P1", "P2", "PF00001", "1-50", "PF00002", "1-40"),
+                   ("P2", "P3", "PF00002", "41-80", "PF00003", "1-30"),
+                   ("P4", "P1", "PF00004", "1-10", "PF00001", "45-50")]
+SEQUENCE_LENGTHS = {"P1": 50, "P2": 80, "P3": 30, "P4": 10}
+
+
+def write_sources(tmp_path):
+    """Write the interface and disorder data files and build a sequence store in tmp_path. Return a dictionary of the
+    arguments of index_cache.load_annotation."""
+    filepaths = {"interface_filepath": str(tmp_path / "hSIN_organized.txt"),
+                 "disorder_filepath": str(tmp_path / "DisorderData.txt"),
+                 "store_filepath": str(tmp_path / "sequences.dat"),
+                 "index_filepath": str(tmp_path / "sequences.idx")}
+    for key, lines in (("interface_filepath", INTERFACE_LINES), ("disorder_filepath", DISORDER_LINES)):
+        with open(filepaths[key], "w") as f:
+            f.writelines("\t".join(x) + "\n" for x in lines)
+    os.mkdir(str(tmp_path / "sequences"))
+    for uniprot, length in SEQUENCE_LENGTHS.items():
+        with open(str(tmp_path / "sequences" / (uniprot + ".fasta")), "w") as f:
+            f.write(">" + uniprot + "\n" + "A" * length + "\n")
+    sequence_store.build_store(str(tmp_path / "sequences"), filepaths["store_filepath"], filepaths["index_filepath"])
+    return filepaths
+
+
+def check_annotation(annotation, disorder_filepath):
+    """Check that the disorder flags of every annotated residue and protein agree with the cached disorder index of
+    each type."""
+    for disorder_type in region_index.DISORDER_TYPES:
+        uniprot_disorder = index_cache.load_disorder_index(disorder_type, disorder_filepath)
+        assert uniprot_disorder == region_index.load_disorder_index(disorder_type, disorder_filepath)
+        flag = residue_annotation.DISORDER_MASKS[disorder_type]
+        for i, uniprot in enumerate(annotation.uniprot_ids):
+            assert bool(annotation.protein_flags[i] & flag) == (uniprot in uniprot_disorder)
+            residues = annotation.flags[annotation.offsets[i]: annotation.offsets[i + 1]]
+            flagged = (np.flatnonzero(residues & flag) + 1).tolist()
+            assert flagged == [p for start, end in uniprot_disorder.get(uniprot, []) for p in range(start, end + 1)]
+
+
+def test_annotation_agrees_with_disorder_index(tmp_path):
+    """The annotation built from the sources and the one read back from the caches both agree with the disorder
+    index."""
+    filepaths = write_sources(tmp_path)
+    check_annotation(index_cache.load_annotation(**filepaths), filepaths["disorder_filepath"])
+    assert os.path.isfile(index_cache.cache_filepath(filepaths["disorder_filepath"], "disorder"))
+    check_annotation(index_cache.load_annotation(**filepaths), filepaths["disorder_filepath"])
+
+
+def test_old_cache_is_rebuilt(tmp_path):
+    """A disorder cache written by an earlier version is rebuilt instead of being read."""
+    filepaths = write_sources(tmp_path)
+    disorder_filepath = filepaths["disorder_filepath"]
+    source_stat = os.stat(disorder_filepath)
+    with open(index_cache.cache_filepath(disorder_filepath, "disorder"), "wb") as f:
+        np.savez(f, cache_version=index_cache.CACHE_VERSION - 1, source_size=source_stat.st_size,
+                 source_mtime_ns=source_stat.st_mtime_ns, source_sha1=index_cache.file_sha1(disorder_filepath),
+                 flags=np.zeros(1, dtype=np.uint8))
+    assert index_cache.load_disorder_indexes(disorder_filepath) == region_index.load_disorder_indexes(
+        disorder_filepath)
+    check_annotation(index_cache.load_annotation(**filepaths), disorder_filepath)
@@ -0,0 +1,127 @@
+"""Intern UniProt accessions as 32-bit integer codes and pack mutations into 64-bit integer keys, so that sets,
+dictionaries and arrays of mutations can hold machine integers instead of tuples of strings.
+
+Codes are kept in ../UniProt Sequences.codes, a tab-delimited file with columns UniProtID and Code. A code never
+changes once it is assigned: when the sequence store gains proteins, the new accessions are appended with the next free
+codes, so keys written by one run can be read by the next.
+
+A packed mutation key is code << 32 | position << 10 | original << 5 | mutant, where position is the 1-indexed
+position and original and mutant are the 5-bit codes of the residue letters (A-Z are 1-26 and "*" is 27). Sorting keys
+sorts mutations by protein code, then position, then residues."""
+
+import os
+
+import numpy as np
+
+CODES_FILEPATH = "../UniProt Sequences.codes"
+MAX_POSITION = (1 << 22) - 1
+STOP_CODE = 27  # residue code of "*"
+
+
+class AccessionCodes:
+    """Two-way mapping between UniProt accessions and their integer codes."""
+
+    def __init__(self, filepath=CODES_FILEPATH):
+        self.filepath = filepath
+        self.accessions = []  # list of accessions indexed by code
+        self.codes = {}  # map from accession to code
+        if os.path.isfile(filepath):
+            with open(filepath) as codes_file:
+                next(codes_file)  # skip header
+                for line in codes_file:
+                    accession, code = line.split()
+                    assert int(code) == len(self.accessions)
+                    self.codes[accession] = len(self.accessions)
+                    self.accessions.append(accession)
+
+    def __contains__(self, accession):
+        return accession in self.codes
+
+    def __len__(self):
+        return len(self.accessions)
+
+    def code(self, accession):
+        """Return the code of the accession. Raise KeyError if it has none."""
+        return self.codes[accession]
+
+    def encode(self, accessions):
+        """Given a sequence of accessions, return an int32 array of their codes, with -1 for accessions that have
+        none."""
+        codes = self.codes
+        return np.fromiter((codes.get(x, -1) for x in accessions), dtype=np.int32, count=len(accessions))
+
+    def decode(self, codes):
+        """Given an iterable of codes, return the list of their accessions."""
+        accessions = self.accessions
+        return [accessions[code] for code in codes]
+
+    def update(self, accessions):
+        """Assign codes to the accessions that have none, in sorted order, and append them to the codes file. The file
+        is rewritten under a temporary name first so that readers never see a partially written file."""
+        new_accessions = sorted(set(accessions) - self.codes.keys())
+        if not new_accessions and os.path.isfile(self.filepath):
+            return
+        for accession in new_accessions:
+            self.codes[accession] = len(self.accessions)
+            self.accessions.append(accession)
+        with open(self.filepath + ".tmp", "w") as codes_file:
+            codes_file.write("UniProtID\tCode\n")
+            for code, accession in enumerate(self.accessions):
+                codes_file.write(accession + "\t" + str(code) + "\n")
+        os.replace(self.filepath + ".tmp", self.filepath)
+
+
+def open_codes(store=None, filepath=CODES_FILEPATH):
+    """Return the AccessionCodes saved in the codes file. If the SequenceStore store is given, then the proteins in it
+    that have no code yet are given codes first. Worker processes should call this without store after the main
+    process has updated the codes, so that only one process writes the file."""
+    codes = AccessionCodes(filepath)
+    if store is not None:
+        codes.update(store.uniprot_ids)
+    return codes
+
+
+def residue_code(residue):
+    """Return the 5-bit code of the residue letter. Raise KeyError if it is not a letter or "*"."""
+    if residue == "*":
+        return STOP_CODE
+    if not ("A" <= residue <= "Z" and len(residue) == 1):
+        raise KeyError(residue)
+    return ord(residue) - ord("A") + 1
+
+
+def residue_letter(code):
+    """Return the residue letter of the 5-bit code."""
+    return "*" if code == STOP_CODE else chr(code + ord("A") - 1)
+
+
+def pack_mutation(code, mutation):
+    """Given the code of a protein and a mutation such as "S180N", return the packed mutation key. Raise KeyError if an
+    amino acid is unknown and ValueError if the position is malformed or too large."""
+    position = int(mutation[1:-1])
+    if not 0 <= position <= MAX_POSITION:
+        raise ValueError("position {} out of range".format(position))
+    return code << 32 | position << 10 | residue_code(mutation[0]) << 5 | residue_code(mutation[-1])
+
+
+def unpack_mutation(key):
+    """Given a packed mutation key, return a tuple (code, mutation), such as (17, "S180N")."""
+    return key >> 32, residue_letter(key >> 5 & 31) + str(key >> 10 & MAX_POSITION) + residue_letter(key & 31)
+
+
+def mutation_keys(codes, accessions, mutations):
+    """Given AccessionCodes and parallel sequences of accessions that have codes and mutations, return a uint64 array
+    of their packed mutation keys."""
+    accession_codes = codes.codes
+    return np.fromiter((pack_mutation(accession_codes[accession], mutation)
+                        for accession, mutation in zip(accessions, mutations)), dtype=np.uint64, count=len(accessions))
+
+
+def key_codes(keys):
+    """Given an array of packed mutation keys, return an int32 array of their protein codes."""
+    return (np.asarray(keys, dtype=np.uint64) >> np.uint64(32)).astype(np.int32)
+
+
+def key_positions(keys):
+    """Given an array of packed mutation keys, return an int32 array of their positions."""
+    return (np.asarray(keys, dtype=np.uint64) >> np.uint64(10) & np.uint64(MAX_POSITION)).astype(np.int32)
@@ -0,0 +1,238 @@
+"""Store the raw JSON entries downloaded from MobiDB and DisProt in a few large compressed shard files instead of one
+small file per entry, so that reading all of them costs a few file opens rather than ~195k.
+
+The archive is the directory ../Disordered Region Data/Archive. Each entry is identified by an accession and an
+endpoint: a MobiDB entry by its UniProt ID and one of the endpoints mobidb, pfam and disorder, and a DisProt entry by
+its DisProt ID and the endpoint disprot. The UTF-8 text of an entry is compressed with zlib and appended to the current
+shard file, shard00000.dat and so on, and a new shard is started once the current one exceeds SHARD_SIZE bytes. The
+SQLite database index.sqlite maps each (accession, endpoint) to its (shard, offset, length). Storing an entry again
+appends a new record and points the index at it; the old record is left in its shard as unused bytes.
+
+The index is committed after the shard data it points to has been written, so a crash can leave unused bytes at the
+end of a shard but never an index entry without its data.
+
+Run this script to migrate the per-entry files of ../Disordered Region Data/MobiDB and ../Disordered Region Data/DisProt
+into the archive. Entries already in the archive are skipped, so an interrupted migration can be run again. With
+--changed, only the IDs listed in the reports MobiDB.changed.txt and DisProt.changed.txt written by mobidb3.py and
+disprot_query.py are stored again, which brings the archive up to date after a refresh of the mirrors. The per-entry
+files are not deleted.
+
+Example:
+    with open_archive() as archive:
+        j_mobidb = archive.load("P04637", "mobidb")
+        for accession, endpoint, text in archive.entries("disprot", by_accession=True):
+            ...
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import zlib
+
+import download_manifest
+
+ARCHIVE_DIRECTORY = "../Disordered Region Data/Archive"
+MOBIDB_DIRECTORY = "../Disordered Region Data/MobiDB"
+DISPROT_DIRECTORY = "../Disordered Region Data/DisProt"
+MOBIDB_ENDPOINTS = ("mobidb", "pfam", "disorder")
+DISPROT_ENDPOINT = "disprot"
+SHARD_SIZE = 1 << 30  # number of bytes after which a new shard is started
+COMMIT_INTERVAL = 10000  # number of entries stored between commits of the index
+COMPRESSION_LEVEL = 6
+
+
+class JSONArchive:
+    """Sharded compressed store of JSON entries. See the module docstring."""
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY, writable=False):
+        """Open the archive in directory, which is created if writable is true."""
+        self.directory = directory
+        self.writable = writable
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isfile(os.path.join(directory, "index.sqlite")):
+            raise FileNotFoundError("no archive in " + directory)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (accession TEXT NOT NULL, endpoint TEXT NOT NULL, "
+                                "shard INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, "
+                                "PRIMARY KEY (accession, endpoint)) WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_endpoint ON entries (endpoint, shard, offset)")
+        self.connection.commit()
+        self.readers = {}  # map from shard number to open file, for reading
+        self.writer = None  # open file of the shard being appended to
+        self.writer_shard = None
+        self.num_uncommitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def shard_filepath(self, shard):
+        return os.path.join(self.directory, "shard{:05d}.dat".format(shard))
+
+    def open_writer(self):
+        """Open the last shard for appending, or a new shard if the last one is full."""
+        shard = 0
+        while os.path.exists(self.shard_filepath(shard + 1)):
+            shard += 1
+        if os.path.exists(self.shard_filepath(shard)) and os.path.getsize(self.shard_filepath(shard)) >= SHARD_SIZE:
+            shard += 1
+        self.writer = open(self.shard_filepath(shard), "ab")
+        self.writer_shard = shard
+
+    def put(self, accession, endpoint, text):
+        """Store the JSON text, a str or UTF-8 bytes, as the entry (accession, endpoint), replacing any entry stored
+        before."""
+        assert self.writable
+        if isinstance(text, str):
+            text = text.encode("utf8")
+        data = zlib.compress(text, COMPRESSION_LEVEL)
+        if self.writer is None:
+            self.open_writer()
+        elif self.writer.tell() >= SHARD_SIZE:
+            self.writer.close()
+            self.writer = open(self.shard_filepath(self.writer_shard + 1), "ab")
+            self.writer_shard += 1
+        offset = self.writer.tell()
+        self.writer.write(data)
+        self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                                (accession, endpoint, self.writer_shard, offset, len(data)))
+        self.num_uncommitted += 1
+        if self.num_uncommitted >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        """Write the appended shard data to disk and then commit the index."""
+        if self.writer is not None:
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+        self.connection.commit()
+        self.num_uncommitted = 0
+
+    def read_record(self, shard, offset, length):
+        """Return the decompressed text of the record at offset in shard."""
+        if shard == self.writer_shard:
+            self.writer.flush()  # the record may still be in the write buffer
+        if shard not in self.readers:
+            self.readers[shard] = open(self.shard_filepath(shard), "rb")
+        f = self.readers[shard]
+        f.seek(offset)
+        return zlib.decompress(f.read(length)).decode("utf8")
+
+    def __contains__(self, key):
+        """Return whether the tuple key (accession, endpoint) is in the archive."""
+        row = self.connection.execute("SELECT 1 FROM entries WHERE accession = ? AND endpoint = ?", key).fetchone()
+        return row is not None
+
+    def get(self, accession, endpoint):
+        """Return the JSON text of the entry (accession, endpoint). Raise KeyError if there is none."""
+        row = self.connection.execute("SELECT shard, offset, length FROM entries WHERE accession = ? AND endpoint = ?",
+                                      (accession, endpoint)).fetchone()
+        if row is None:
+            raise KeyError((accession, endpoint))
+        return self.read_record(*row)
+
+    def load(self, accession, endpoint):
+        """Return the parsed JSON of the entry (accession, endpoint). Raise KeyError if there is none."""
+        return json.loads(self.get(accession, endpoint))
+
+    def keys(self, endpoint=None):
+        """Return the list of tuples (accession, endpoint) of the entries, or of the entries of endpoint if given."""
+        if endpoint is None:
+            return self.connection.execute("SELECT accession, endpoint FROM entries").fetchall()
+        return self.connection.execute("SELECT accession, endpoint FROM entries WHERE endpoint = ?",
+                                       (endpoint,)).fetchall()
+
+    def entries(self, endpoint=None, by_accession=False):
+        """Yield tuples (accession, endpoint, JSON text) of the entries, or of the entries of endpoint if given. By
+        default they are yielded in the order they are stored in the shards, so that the shards are read sequentially;
+        that order changes when entries are stored again. If by_accession is true, then they are yielded in order of
+        accession and endpoint instead, which does not depend on the history of the archive."""
+        query = "SELECT accession, endpoint, shard, offset, length FROM entries"
+        order = " ORDER BY accession, endpoint" if by_accession else " ORDER BY shard, offset"
+        if endpoint is None:
+            rows = self.connection.execute(query + order).fetchall()
+        else:
+            rows = self.connection.execute(query + " WHERE endpoint = ?" + order, (endpoint,)).fetchall()
+        for accession, endpoint, shard, offset, length in rows:
+            yield accession, endpoint, self.read_record(shard, offset, length)
+
+    def close(self):
+        if self.writer is not None:
+            self.commit()
+            self.writer.close()
+            self.writer = None
+        for f in self.readers.values():
+            f.close()
+        self.readers = {}
+        self.connection.close()
+
+
+def open_archive(directory=ARCHIVE_DIRECTORY, writable=False):
+    """Return the JSONArchive in directory."""
+    return JSONArchive(directory, writable)
+
+
+def mobidb_files(ids=None):
+    """Yield tuples (accession, endpoint, filepath) of the MobiDB files, or of the files of the IDs in ids if given."""
+    if ids is None:
+        for filename in sorted(os.listdir(MOBIDB_DIRECTORY)):
+            accession, _, endpoint = filename[:-len(".json")].rpartition("_")
+            if filename.endswith(".json") and endpoint in MOBIDB_ENDPOINTS:
+                yield accession, endpoint, os.path.join(MOBIDB_DIRECTORY, filename)
+    else:
+        for accession in ids:
+            for endpoint in MOBIDB_ENDPOINTS:
+                yield accession, endpoint, os.path.join(MOBIDB_DIRECTORY, accession + "_" + endpoint + ".json")
+
+
+def disprot_files(ids=None):
+    """Yield tuples (accession, endpoint, filepath) of the DisProt files, or of the files of the IDs in ids if given."""
+    if ids is None:
+        ids = [x[:-len(".json")] for x in sorted(os.listdir(DISPROT_DIRECTORY)) if x.endswith(".json")]
+    for accession in ids:
+        yield accession, DISPROT_ENDPOINT, os.path.join(DISPROT_DIRECTORY, accession + ".json")
+
+
+def read_report(directory):
+    """Return the list of IDs in the report of the changes to the mirror in directory, or an empty list if there is
+    none."""
+    filepath = download_manifest.report_filepath(directory)
+    if not os.path.isfile(filepath):
+        return []
+    with open(filepath) as report_file:
+        return report_file.read().split()
+
+
+def migrate(archive, files, replace=False):
+    """Store the files given by the iterable files of tuples (accession, endpoint, filepath) in the archive. Files
+    whose entry is already in the archive are skipped unless replace is true. Return the number of files stored."""
+    count = 0
+    for accession, endpoint, filepath in files:
+        if not replace and (accession, endpoint) in archive:
+            continue
+        if not os.path.isfile(filepath):
+            print("missing " + filepath)
+            continue
+        with open(filepath, "rb") as f:
+            archive.put(accession, endpoint, f.read())
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    changed_only = len(sys.argv) > 1
+    if changed_only:
+        assert sys.argv[1:] == ["--changed"], "Usage: json_archive.py [--changed]"
+    with open_archive(writable=True) as archive:
+        if changed_only:
+            mobidb_count = migrate(archive, mobidb_files(read_report(MOBIDB_DIRECTORY)), True)
+            disprot_count = migrate(archive, disprot_files(read_report(DISPROT_DIRECTORY)), True)
+        else:
+            mobidb_count = migrate(archive, mobidb_files())
+            disprot_count = migrate(archive, disprot_files())
+    print(str(mobidb_count) + " MobiDB entries stored")
+    print(str(disprot_count) + " DisProt entries stored")
@@ -1,28 +1,92 @@
-"""Generate raw file containing MobiDB entries to query"""
-
-from urllib.request import urlopen
-from urllib.error import HTTPError
-
-# Do one query per protein length. We can obtain at most 100 proteins per query, so our search parameters are
-# specific.
-f = open("mobidb_human_entries.txt", "w")
-for prot_length in range(1, 5460):
-    try:
-        address = "http://mobidb.bio.unipd.it/ws/search?q=organism:%22Homo%20sapiens%22%20AND%20length:[" + \
-              str(prot_length) + "%20TO%20" + str(prot_length+9) + "]"
-        json_data = urlopen(address).read().decode("ascii", "ignore")
-        f.write(json_data + "\n")
-    except HTTPError:
-        print(prot_length)
-
-# Do one query per range of 10 protein lengths to save time, as not many proteins are this large.
-for prot_length in range(5460, 35000, 10):
-    try:
-        address = "http://mobidb.bio.unipd.it/ws/search?q=organism:%22Homo%20sapiens%22%20AND%20length:[" + \
-              str(prot_length) + "%20TO%20" + str(prot_length+9) + "]"
-        json_data = urlopen(address).read().decode("ascii", "ignore")
-        f.write(json_data + "\n")
-    except HTTPError:
-        print(prot_length)
-
-f.close()
+"""Find the UniProt IDs of all human MobiDB entries and write them to mobidb_human_ids.txt, one per line.
+
+The MobiDB search API returns at most 100 entries per query, so entries are searched by ranges of protein length. The
+crawl starts with a few wide ranges and runs their searches concurrently with http_fetch.py. A range whose search
+returns the full 100 entries may have been truncated, so it is split in half and both halves are searched in the next
+round; other ranges are complete. A range of a single length that still returns 100 entries cannot be split further
+and is printed as truncated. The UniProt IDs are read from the "acc" fields of the JSON results.
+
+If a search still fails after all retries, its range is printed and mobidb_human_ids.txt is not written, so that an
+incomplete list never replaces a complete one."""
+
+import datetime
+import json
+import sys
+
+import http_fetch
+
+SEARCH_URL = "http://mobidb.bio.unipd.it/ws/search?q=organism:%22Homo%20sapiens%22%20AND%20length:[{}%20TO%20{}]"
+OUTPUT_FILEPATH = "mobidb_human_ids.txt"
+MAX_LENGTH = 40000  # longer than the longest human protein
+NUM_INITIAL_RANGES = 64
+PAGE_CAP = 100  # largest number of entries returned by a search
+MAX_CONCURRENCY = 20  # number of searches in flight at once
+MAX_PER_HOST = 10  # number of connections kept open to MobiDB
+
+
+def accessions(j):
+    """Given parsed JSON search results j, return the list of the values of all "acc" fields in it, in order."""
+    if isinstance(j, dict):
+        found = [j["acc"]] if isinstance(j.get("acc"), str) else []
+        for key, value in j.items():
+            if key != "acc":
+                found.extend(accessions(value))
+        return found
+    if isinstance(j, list):
+        return [x for value in j for x in accessions(value)]
+    return []
+
+
+def initial_ranges(max_length, num_ranges):
+    """Return a list of num_ranges tuples (start, end) of inclusive length ranges that together cover 1 to
+    max_length."""
+    bounds = [1 + (max_length * i) // num_ranges for i in range(num_ranges + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(num_ranges) if bounds[i] < bounds[i + 1]]
+
+
+def crawl(ranges):
+    """Search the length ranges, splitting the ones that reach PAGE_CAP. Return a tuple (found, failed), where found
+    maps each complete range to the list of UniProt IDs in it, and failed is the list of ranges whose search failed."""
+    found = {}
+    failed = []
+    round_number = 0
+    while ranges:
+        round_number += 1
+        print("round " + str(round_number) + ": " + str(len(ranges)) + " searches")
+        sys.stdout.flush()
+        requests = [http_fetch.Request(x, SEARCH_URL.format(*x)) for x in ranges]
+        ranges = []
+        for result in http_fetch.fetch_all(requests, max_concurrency=MAX_CONCURRENCY, max_per_host=MAX_PER_HOST):
+            start, end = result.key
+            try:
+                if not result.ok:
+                    raise ValueError(result.error)
+                ids = accessions(json.loads(result.body.decode("utf-8")))
+            except ValueError as e:
+                print("search of lengths " + str(start) + " to " + str(end) + " failed: " + str(e))
+                failed.append(result.key)
+                continue
+            if len(ids) >= PAGE_CAP and start < end:
+                middle = (start + end) // 2
+                ranges.extend([(start, middle), (middle + 1, end)])
+                continue
+            if len(ids) >= PAGE_CAP:
+                print("length " + str(start) + " has at least " + str(PAGE_CAP) + " entries; results are truncated")
+            found[result.key] = ids
+    return found, failed
+
+
+print(datetime.datetime.now())
+found, failed = crawl(initial_ranges(MAX_LENGTH, NUM_INITIAL_RANGES))
+assert not failed, "Some searches failed, so " + OUTPUT_FILEPATH + " was not written"
+
+# write the distinct IDs in order of protein length
+seen = set()
+with open(OUTPUT_FILEPATH, "w") as output_file:
+    for length_range in sorted(found):
+        for prot_id in found[length_range]:
+            if prot_id not in seen:
+                seen.add(prot_id)
+                output_file.write(prot_id + "\n")
+print(str(len(seen)) + " IDs written to " + OUTPUT_FILEPATH)
+print(datetime.datetime.now())
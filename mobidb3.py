@@ -1,60 +1,56 @@
-"""Download data from MobiDB"""
+"""Download data from MobiDB. For each ID in mobidb_human_ids.txt, the mobidb, pfam and disorder entries are saved in
+../Disordered Region Data/MobiDB as <ID>_<endpoint>.json. Downloads are made by http_fetch.py and recorded in the
+manifest of the directory (see download_manifest.py), so running the script again downloads only what is missing. The
+entries whose downloads failed after all retries are printed.
 
-from urllib.request import urlopen
-from urllib.error import HTTPError, URLError
-from http.client import IncompleteRead
+Run with --refresh to update the mirror: every entry is requested again with the validators the server sent with it,
+so that only the entries that changed are downloaded. Either way, the IDs whose entries were changed or newly
+downloaded are written to ../Disordered Region Data/MobiDB.changed.txt."""
 
-import threading
 import datetime
 import sys
-import io
 
-print(datetime.datetime.now())
+import download_manifest
+import http_fetch
+
+MOBIDB_URL = "http://mobidb.bio.unipd.it/ws/entries/"
+OUTPUT_DIRECTORY = "../Disordered Region Data/MobiDB/"
+ENDPOINTS = ("mobidb", "pfam", "disorder")
+MAX_CONCURRENCY = 100  # number of requests in flight at once
+MAX_PER_HOST = 20  # number of connections kept open to MobiDB
 
-num_threads = 100
+refresh = len(sys.argv) > 1
+if refresh:
+    assert sys.argv[1:] == ["--refresh"], "Usage: mobidb3.py [--refresh]"
+
+print(datetime.datetime.now())
 
 # obtain IDs of proteins to query
 ids_file = open("mobidb_human_ids.txt")
 ids = ids_file.read().split()
 ids_file.close()
 
+# each entry is keyed by the name of its file without the extension, such as P04637_mobidb
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY)
+manifest.expect(uniprot_id + "_" + endpoint for uniprot_id in ids for endpoint in ENDPOINTS)
+keys = manifest.refresh_list(OUTPUT_DIRECTORY) if refresh else [(key, {}) for key in manifest.missing()]
+requests = (http_fetch.Request(key, MOBIDB_URL + "/".join(key.rsplit("_", 1)), OUTPUT_DIRECTORY + key + ".json",
+                               headers) for key, headers in keys)
+changed_ids = []
+
+
+def record(result):
+    """Record a download in the manifest, and print the entry if it failed."""
+    if manifest.record_fetch(result, result.key + ".json"):
+        changed_ids.append(result.key.rsplit("_", 1)[0])
+    elif not result.ok:
+        print(result.key + ": " + result.error)
+        sys.stdout.flush()
+
 
-# perform queries and write to files
-def query(a, b):
-    i = a
-    while i < b:
-        try:
-            # write MobiDB data
-            mobidb_data = urlopen("http://mobidb.bio.unipd.it/ws/entries/" + ids[i] + "/mobidb").read().decode("utf-8")
-            with io.open("../Disordered Region Data/MobiDB/" + ids[i] + "_mobidb.json", "w", encoding="utf8") as mobidb_file:
-                mobidb_file.write(mobidb_data)
-            # write Pfam data
-            pfam_data = urlopen("http://mobidb.bio.unipd.it/ws/entries/" + ids[i] + "/pfam").read().decode("utf-8")
-            with io.open("../Disordered Region Data/MobiDB/" + ids[i] + "_pfam.json", "w", encoding="utf8") as pfam_file:
-                pfam_file.write(pfam_data)
-            # write Disorder data
-            disorder_data = urlopen("http://mobidb.bio.unipd.it/ws/entries/" + ids[i] + "/disorder").read().decode("utf-8")
-            with io.open("../Disordered Region Data/MobiDB/" + ids[i] + "_disorder.json", "w", encoding="utf8") as disorder_file:
-                disorder_file.write(disorder_data)
-            i += 1
-        except (HTTPError, URLError, ConnectionResetError, IncompleteRead):
-            print(ids[i])
-            sys.stdout.flush()
-
-
-# Divide up task between threads evenly based on number of threads specified at top of file.
-threads = []
-for a in range(num_threads):
-    start = a * (len(ids) // num_threads)
-    if a == num_threads-1:
-        end = len(ids)
-    else:
-        end = start + len(ids) // num_threads
-    t = threading.Thread(target=query, args=(start, end))
-    threads.append(t)
-    t.start()
-
-for t in threads:
-    t.join()
+http_fetch.fetch_all(requests, record, max_concurrency=MAX_CONCURRENCY, max_per_host=MAX_PER_HOST)
+manifest.close()
+download_manifest.write_report(download_manifest.report_filepath(OUTPUT_DIRECTORY), changed_ids)
+print(str(len(set(changed_ids))) + " proteins changed")
 
 print(datetime.datetime.now())
@@ -1,15 +1,22 @@
 """It seems that mobidb3.py downloaded nearly all the data but is missing a few files. This script determines which
-files are missing."""
+proteins are missing at least one of their files, from the manifest of the downloads (see download_manifest.py)."""
 
-import os
+import download_manifest
+
+OUTPUT_DIRECTORY = "../Disordered Region Data/MobiDB/"
+ENDPOINTS = ("mobidb", "pfam", "disorder")
 
 # obtain IDs of proteins
 ids_file = open("mobidb_human_ids.txt")
 ids = ids_file.read().split()
 ids_file.close()
 
-files = set(os.listdir("../Disordered Region Data/MobiDB"))
-for x in ids:
-    if (x + "_mobidb.json" not in files) or (x + "_pfam.json" not in files) or (x + "_disorder.json" not in files):
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY)
+manifest.expect(x + "_" + endpoint for x in ids for endpoint in ENDPOINTS)
+missing_ids = set()
+for key in manifest.missing():
+    x = key.rsplit("_", 1)[0]
+    if x not in missing_ids:
+        missing_ids.add(x)
         print(x)
-print("Q00535_mobidb.json" in files)
+manifest.close()
@@ -19,151 +19,90 @@ exported.
 
 Exported data are non-repetitive in the following sense: If two entries from the raw data refer to the same amino acid
 change at the same UniProt ID, then they are considered the same mutation. Also, any ambiguous mutations
-(for which there is a question mark in the mutation specified) are not extracted."""
+(for which there is a question mark in the mutation specified) are not extracted.
 
-import os
+COSMIC data and the TCGA files are parsed and validated in parallel by worker processes (see cancer_extract.py), and
+the results are written in the same order as if the files were read one line at a time.
 
-# Construct a mapping from UniProt ID to protein
-# sequence in FASTA format without the header, preceded by a ">". The reason for having a character inserted in front of
-# the protein sequence is so that the sequence can be 1-indexed instead of 0-indexed.
-print("Constructing mapping from UniProt ID to protein sequence")
-uniprot_seq = {}
-for uniprot in (x[:x.index(".")] for x in os.listdir("../UniProt Sequences/")):
-    with open("../UniProt Sequences/" + uniprot + ".fasta") as seq_file:
-        seq = seq_file.read()
-        try:
-            seq = ">" + seq[seq.index("\n")+1:].replace("\n", "")
-        except ValueError:  # ignore obsolete UniProt entries, which have empty FASTA files
-            print("\tCheck that this is obsolete: " + uniprot)
-            continue
-        uniprot_seq[uniprot] = seq
-print("Done\n")
+The validated mutations of all inputs are first written to a spool file, and repeats are then removed from it with
+external_dedup.py, so the mutations encountered so far are never held in memory. Progress is saved to a checkpoint file
+(see checkpoint.py) after each part of the COSMIC file and each TCGA file is written to the spool file. If the script is
+interrupted, running it again on the same input files resumes from the last checkpoint and produces the same output
+file."""
+
+import itertools
+import os
+import cancer_extract
+import checkpoint
+import external_dedup
+import interning
+import sequence_store
+
+OUTPUT_FILEPATH = "CancerMutationData.txt"
+SPOOL_FILEPATH = OUTPUT_FILEPATH + ".spool"  # validated mutations before repeats across inputs are removed
+DEDUP_BATCH_SIZE = 1 << 20  # number of lines of the spool file read at once
+COSMIC_UNIPROT_FILEPATH = "../Mutation Data/COSMIC/CosmicUniProt.txt"
+COSMIC_FILEPATH = "../Mutation Data/COSMIC/CosmicMutantExport.tsv"
+TCGA_DIRECTORY = "../Mutation Data/TCGA"
+
+# The TCGA files are read in sorted order so that a checkpoint refers to the same files on every run. A checkpoint
+# position is a tuple [file index, byte offset], where file index 0 is the COSMIC file and file index i > 0 is the TCGA
+# file raw_files[i - 1].
+raw_files = sorted(os.listdir(TCGA_DIRECTORY))
+signature = checkpoint.input_signature([COSMIC_UNIPROT_FILEPATH, COSMIC_FILEPATH] +
+                                       [TCGA_DIRECTORY + "/" + filename for filename in raw_files])
+state = checkpoint.load_checkpoint(SPOOL_FILEPATH, signature)
+fwrite = checkpoint.open_output(SPOOL_FILEPATH, state, "")
+resume_position = [0, 0]
+if state is not None:
+    resume_position = state["position"]
+    print("Resuming from checkpoint at file {}, byte {}\n".format(*resume_position))
 
 # extract COSMIC data
 print("Extracting COSMIC data\n")
-# create mapping between gene name and UniProt ID for COSMIC
-uniprot_file = open("../Mutation Data/COSMIC/CosmicUniProt.txt")
-next(uniprot_file)
-cosmic_to_uniprot = {}
-for line in uniprot_file:
-    line = line.split()
-    if len(line) == 2:
-        cosmic_to_uniprot[line[0]] = line[1]
-uniprot_file.close()
-
-cosmic_data = open("../Mutation Data/COSMIC/CosmicMutantExport.tsv")
-next(cosmic_data)
-fwrite = open("CancerMutationData.txt", "w")
-fwrite.write("GeneName\tUniProtID\tMutationID\tProteinMutation\tMutationType\tSource\n")
-
-write_data = []
-prev_mutations = set()
-relevant_mutations = ("Substitution - Missense", "Missense_Mutation")
-mutation_type_convert = {"Deletion - Frameshift":           "Del_Frameshift",
-                         "Deletion - In frame":             "Del_Inframe",
-                         "Insertion - Frameshift":          "Ins_Frameshift",
-                         "Insertion - In frame":            "Ins_Inframe",
-                         "Substitution - Missense":         "Missense",
-                         "Substitution - coding silent":    "Silent",
-                         "Missense_Mutation":               "Missense",
-                         "Silent":                          "Silent",
-                         "Frame_Shift_Del":                 "Del_Frameshift",
-                         "In_Frame_Del":                    "Del_Inframe",
-                         "Frame_Shift_Ins":                 "Ins_Frameshift",
-                         "In_Frame_Ins":                    "Ins_Inframe"}
-source = "COSMIC"
-for line in cosmic_data:
-    line = line.rstrip("\n").split("\t")
-    gene_name = line[0]
-    if "_" in gene_name:
-        gene_name = gene_name[:gene_name.index("_")]
-    mutation_type = line[19]
-    protein_mutation = line[18][2:]
-    try:
-        uniprot_id = cosmic_to_uniprot[gene_name]
-    except KeyError:
-        uniprot_id = "-"
-    if (mutation_type not in relevant_mutations or (uniprot_id, protein_mutation) in prev_mutations
-        or "?" in protein_mutation or uniprot_id == "-"):
-        # If this mutation has an unwanted type, has been encountered before, or has unknown UniProt ID, then ignore it.
-        continue
-    # invariant: this mutation has not been previously encountered
-
-    # validate the mutation against UniProt sequence
-    mutation_original = protein_mutation[0]
-    try:
-        mutation_position = int(protein_mutation[1:-1])
-    except ValueError:  # if mutation is formatted weirdly, skip it
-        print("\t" + protein_mutation + "is formatted weirdly, skipping")
-        continue
-    try:
-        seq = uniprot_seq[uniprot_id]
-    except KeyError:
-        continue
-    if mutation_position >= len(seq) or seq[mutation_position] != mutation_original:
-        continue
-
-    prev_mutations.add((uniprot_id, protein_mutation))
-    mutation_type = mutation_type_convert[mutation_type]
-    mutation_id = line[16]
-    new_data = [gene_name, uniprot_id, mutation_id, protein_mutation, mutation_type, source]
-    for x in range(len(new_data)):
-        if not new_data[x]:
-            new_data[x] = "-"
-    write_data.append(new_data)
+if resume_position[0] == 0:
+    # create mapping between gene name and UniProt ID for COSMIC
+    cosmic_to_uniprot = cancer_extract.load_cosmic_uniprot(COSMIC_UNIPROT_FILEPATH)
+    num_skipped = 0
+    for rows, chunk_skipped, offset in cancer_extract.extract_cosmic(COSMIC_FILEPATH, cosmic_to_uniprot,
+                                                                     start=resume_position[1]):
+        fwrite.writelines(row for key, row in rows)
+        num_skipped += chunk_skipped
+        checkpoint.save_checkpoint(fwrite, SPOOL_FILEPATH, signature, [0, offset])
+    print("\t" + str(num_skipped) + " valid mutations skipped because a residue is not a letter or *")
+    checkpoint.save_checkpoint(fwrite, SPOOL_FILEPATH, signature, [1, 0])
+    resume_position = [1, 0]
 print("Done\n")
 
-
-
 # extract TCGA data
 print("Extracting TCGA data")
-raw_files = os.listdir("../Mutation Data/TCGA")
-mutation_id = "-"
-source = "TCGA"
-
-for filename in raw_files:
-    print("\tExtracting file " + filename)
-    tcga_data = open("../Mutation Data/TCGA/" + filename)
-    next(tcga_data)
-    next(tcga_data)  # skip first 2 lines
-
-    for line in tcga_data:
-        line = line.rstrip("\n").split("\t")
-        mutation_type = line[8]
-        gene_name = line[60]
-        protein_mutation = line[36][2:]
-        uniprot_id = line[67]
-        if (mutation_type not in relevant_mutations or (uniprot_id, protein_mutation) in prev_mutations
-            or "?" in protein_mutation or not uniprot_id or not protein_mutation):
-            # If this mutation has an unwanted type, has been encountered before, or has unknown UniProt ID, then ignore it.
-            continue
-
-        # validate the mutation against UniProt sequence
-        mutation_original = protein_mutation[0]
-        try:
-            mutation_position = int(protein_mutation[1:-1])
-        except ValueError:
-            print("\t" + protein_mutation + "is formatted weirdly, skipping")
-            continue
-        try:
-            seq = uniprot_seq[uniprot_id]
-        except KeyError:
-            continue
-        if mutation_position >= len(seq) or seq[mutation_position] != mutation_original:
-            continue
-
-        prev_mutations.add((uniprot_id, protein_mutation))
-        mutation_type = mutation_type_convert[mutation_type]
-        new_data = [gene_name, uniprot_id, mutation_id, protein_mutation, mutation_type, source]
-        for x in range(len(new_data)):
-            if not new_data[x]:
-                new_data[x] = "-"
-        write_data.append(new_data)
+if resume_position[0] <= len(raw_files):
+    tcga_filepaths = [TCGA_DIRECTORY + "/" + filename for filename in raw_files[resume_position[0] - 1:]]
+    for file_index, (rows, num_skipped) in enumerate(
+            cancer_extract.extract_tcga(tcga_filepaths, start=resume_position[1]), resume_position[0]):
+        print("\tWriting file " + raw_files[file_index - 1])
+        if num_skipped:
+            print("\t" + str(num_skipped) + " valid mutations skipped because a residue is not a letter or *")
+        fwrite.writelines(rows)
+        checkpoint.save_checkpoint(fwrite, SPOOL_FILEPATH, signature, [file_index + 1, 0])
+fwrite.close()
 print("Done\n")
 
-# write_data.sort(key=lambda x: x[4])  # sort data by mutation type
-print("Writing file")
-for line in write_data:
-    fwrite.write("\t".join(line) + "\n")
-fwrite.close()
+# remove repeats across COSMIC ranges and TCGA files, keeping the first occurrence of each mutation
+print("Removing repeated mutations")
+uniprot_codes = interning.open_codes(sequence_store.open_store())
+with external_dedup.Deduplicator(directory=".") as dedup:
+    with open(SPOOL_FILEPATH, encoding="utf8") as spool:
+        for lines in iter(lambda: list(itertools.islice(spool, DEDUP_BATCH_SIZE)), []):
+            rows = [line.split("\t", 4) for line in lines]
+            dedup.add(interning.mutation_keys(uniprot_codes, [x[1] for x in rows], [x[3] for x in rows]))
+    dedup.finish()
+    with open(SPOOL_FILEPATH, encoding="utf8") as spool, open(OUTPUT_FILEPATH, "w") as output_file:
+        output_file.write("GeneName\tUniProtID\tMutationID\tProteinMutation\tMutationType\tSource\n")
+        for start in range(0, dedup.count, DEDUP_BATCH_SIZE):
+            flags = dedup.keep_flags(start, min(start + DEDUP_BATCH_SIZE, dedup.count))
+            output_file.writelines(line for is_kept, line in zip(flags.tolist(), spool) if is_kept)
 print("Done\n")
+
+checkpoint.remove_checkpoint(SPOOL_FILEPATH)
+os.remove(SPOOL_FILEPATH)
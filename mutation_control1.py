@@ -1,51 +1,54 @@
-"""Download FASTA sequences from UniProt."""
+"""Download FASTA sequences from UniProt. For each ID in uniprot_human_ids.txt, the sequence is saved in
+../Mutation Control/UniProt/<ID>.fasta. Downloads are made by http_fetch.py and recorded in the manifest of the
+directory (see download_manifest.py), so running the script again downloads only what is missing. The IDs whose
+downloads failed after all retries are printed.
 
-from urllib.request import urlopen
-from urllib.error import HTTPError, URLError
-from http.client import IncompleteRead
+Run with --refresh to update the mirror: every sequence is requested again with the validators the server sent with it,
+so that only the sequences that changed are downloaded. Either way, the IDs whose sequences were changed or newly
+downloaded are written to ../Mutation Control/UniProt.changed.txt."""
 
-import threading
 import datetime
 import sys
-import io
 
-print(datetime.datetime.now())
+import download_manifest
+import http_fetch
+
+UNIPROT_URL = "http://www.uniprot.org/uniprot/"
+OUTPUT_DIRECTORY = "../Mutation Control/UniProt/"
+MAX_CONCURRENCY = 100  # number of requests in flight at once
+MAX_PER_HOST = 20  # number of connections kept open to UniProt
 
-num_threads = 100
+refresh = len(sys.argv) > 1
+if refresh:
+    assert sys.argv[1:] == ["--refresh"], "Usage: mutation_control1.py [--refresh]"
+
+print(datetime.datetime.now())
 
 # obtain IDs of proteins to query
 ids_file = open("uniprot_human_ids.txt")
 ids = ids_file.read().split()
 ids_file.close()
 
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY)
+manifest.expect(ids)
+keys = manifest.refresh_list(OUTPUT_DIRECTORY) if refresh else [(key, {}) for key in manifest.missing()]
+requests = (http_fetch.Request(uniprot_id, UNIPROT_URL + uniprot_id + ".fasta",
+                               OUTPUT_DIRECTORY + uniprot_id + ".fasta", headers) for uniprot_id, headers in keys)
+changed_ids = []
+
+
+def record(result):
+    """Record a download in the manifest, and print the ID if it failed."""
+    if manifest.record_fetch(result, result.key + ".fasta"):
+        changed_ids.append(result.key)
+    elif not result.ok:
+        print(result.key + ": " + result.error)
+        sys.stdout.flush()
+
 
-def query(a, b):
-    """Perform queries and write files."""
-    i = a
-    while i < b:
-        try:
-            uniprot_data = urlopen("http://www.uniprot.org/uniprot/" + ids[i] + ".fasta").read().decode("utf-8")
-            with io.open("../Mutation Control/UniProt/" + ids[i] + ".fasta", "w", encoding="utf8") as uniprot_file:
-                uniprot_file.write(uniprot_data)
-            i += 1
-        except (HTTPError, URLError, ConnectionResetError, IncompleteRead, TimeoutError):
-            print(ids[i])
-            sys.stdout.flush()
-
-
-# Divide up task between threads evenly based on number of threads specified at top of file.
-threads = []
-for a in range(num_threads):
-    start = a * (len(ids) // num_threads)
-    if a == num_threads-1:
-        end = len(ids)
-    else:
-        end = start + len(ids) // num_threads
-    t = threading.Thread(target=query, args=(start, end))
-    threads.append(t)
-    t.start()
-
-for t in threads:
-    t.join()
+http_fetch.fetch_all(requests, record, max_concurrency=MAX_CONCURRENCY, max_per_host=MAX_PER_HOST)
+manifest.close()
+download_manifest.write_report(download_manifest.report_filepath(OUTPUT_DIRECTORY), changed_ids)
+print(str(len(changed_ids)) + " sequences changed")
 
 print(datetime.datetime.now())
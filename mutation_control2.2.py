@@ -1,81 +1,87 @@
-"""Download XML data from dbSNP. Remember to specify at the top of the file the number of threads and the size of each
-query. Each downloaded file is named with the refSNP of the first mutation of the file.
+"""Download XML data from dbSNP. Remember to specify at the top of the file the number of concurrent queries and the
+size of each query. Each downloaded file is named with the refSNP of the first mutation of the file. Downloads are made
+by http_fetch.py within the rate limit of the NCBI E-utilities. Each refSNP ID is recorded in the manifest of the
+directory (see download_manifest.py) with the file it was saved in, so running the script again queries only the IDs
+that are missing. The queries that failed after all retries are printed."""
 
-Since I have had """
-
-from urllib.request import urlopen
-from urllib.error import HTTPError, URLError
-from http.client import IncompleteRead
-
-import threading
 import datetime
+import hashlib
 import io
-import sys
 import os
+import sys
 
-print(datetime.datetime.now())
+import download_manifest
+import http_fetch
 
-num_threads = 20  # number of threads that perform web queries simultaneously
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+OUTPUT_DIRECTORY = "../Mutation Control/dbSNP/XML/"
+max_concurrency = 20  # number of web queries performed simultaneously
 mutations_per_query = 100  # number of mutations to download per query
+rate_limit = 3  # largest number of queries per second, which NCBI allows without an API key
+
+print(datetime.datetime.now())
 
-# obtain IDs of Reference SNP cluster reports already obtained
-done_ids = set()
-for f in os.listdir("../Mutation Control/dbSNP/XML"):
-    done_ids.add(f.split(".")[0])
-    with open("../Mutation Control/dbSNP/XML/" + f) as f2:
+
+def file_rsids(filepath):
+    """Return the list of refSNP IDs held by a file downloaded before the manifest existed: the ID in its name, and
+    those of its Rs elements."""
+    rsids = download_manifest.file_stem(filepath)
+    with open(filepath) as f2:
         for line in f2:
             try:
                 rsid_start = line.index('<Rs rsId="') + len('<Rs rsId="')
                 rsid_end = line.index('"', rsid_start)
-                done_ids.add("rs" + line[rsid_start: rsid_end])
+                rsids.append("rs" + line[rsid_start: rsid_end])
             except ValueError:
                 if line != "\n":
-                    print(f)
+                    print(filepath)
                     print(line)
+    return rsids
+
 
 # obtain IDs of Reference SNP cluster reports to query
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY, file_rsids)
 ids_file = open("../Mutation Control/dbSNP/refseq_list.txt")
-ids = [x for x in ids_file.read().split() if x not in done_ids]
+manifest.expect(ids_file.read().split())
 ids_file.close()
+ids = manifest.missing()
+
+# each query fetches the next mutations_per_query IDs and is keyed by the list of them
+requests = (http_fetch.Request(ids[i: i + mutations_per_query], EFETCH_URL + "?db=snp&id="
+                               + ",".join(x[2:] for x in ids[i: i + mutations_per_query]) + "&report=XML")
+            for i in range(0, len(ids), mutations_per_query))
 
 
-def query(a, b):
-    """Perform queries and write files."""
-    i = a
-    while i < b:
-        url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=snp&id="
-        for x in range(i, min(i+mutations_per_query, b)):
-            url += ids[x][2:] + ","
-        url = url[:-1] + "&report=XML"  # remove final comma
+def save(result):
+    """Write the Rs elements of a downloaded query to a file and record its IDs in the manifest."""
+    if not result.ok:
+        error = result.error
+        print(result.key[0] + " failed: " + error)
+    else:
+        dbsnp_data = result.body.decode("utf-8")
         try:
-            dbsnp_data = urlopen(url).read().decode("utf-8")
             data_start = dbsnp_data.index('<Rs rsId="')
             data_end = dbsnp_data.index("</ExchangeSet>")
-            with io.open("../Mutation Control/dbSNP/XML/" + ids[i] + ".xml", "w", encoding="utf8") as dbsnp_file:
-                dbsnp_file.write(dbsnp_data[data_start: data_end])
-            i = i + mutations_per_query
-        except (HTTPError, URLError, ConnectionResetError, IncompleteRead, TimeoutError):
-            print(ids[i] + " failed, retrying")
-            sys.stdout.flush()
         except ValueError:
-            print("Skipping: " + url)
-            sys.stdout.flush()
-            i = i + mutations_per_query
-
+            error = "no Rs elements in response"
+            print("Skipping: " + result.url)
+        else:
+            filename = result.key[0] + ".xml"
+            data = dbsnp_data[data_start: data_end].encode("utf8")
+            with io.open(OUTPUT_DIRECTORY + filename + ".part", "wb") as dbsnp_file:
+                dbsnp_file.write(data)
+            os.replace(OUTPUT_DIRECTORY + filename + ".part", OUTPUT_DIRECTORY + filename)
+            checksum = hashlib.sha256(data).hexdigest()
+            for rsid in result.key:
+                manifest.record_done(rsid, filename, len(data), checksum)
+            return
+    for rsid in result.key:
+        manifest.record_failed(rsid, error)
+    sys.stdout.flush()
 
-# Divide up task between threads evenly based on number of threads specified at top of file.
-threads = []
-for a in range(num_threads):
-    start = a * (len(ids) // num_threads)
-    if a == num_threads-1:
-        end = len(ids)
-    else:
-        end = start + len(ids) // num_threads
-    t = threading.Thread(target=query, args=(start, end))
-    threads.append(t)
-    t.start()
 
-for t in threads:
-    t.join()
+http_fetch.fetch_all(requests, save, max_concurrency=max_concurrency,
+                     rate_limits={http_fetch.host(EFETCH_URL): rate_limit})
+manifest.close()
 
 print(datetime.datetime.now())
@@ -1,23 +1,37 @@
 """mutation_control2.2.py downloaded all human missense SNPs from dbSNP, split into many files. Combine all the data
 into 1 file and remove repeat entries. Repeat entries can arise when two refSNP IDs have been merged but were downloaded
-in separate queries. Save new large file in neutral.xml."""
+in separate queries. Save new large file in neutral.xml.
+
+Repeats are removed with external_dedup.py, keyed by the number of the refSNP ID, so the IDs seen so far are not held
+in memory."""
 
 import os
 
-fwrite = open("../Mutation Control/dbSNP/neutral.xml", "w")
-done_ids = set()
-for f in os.listdir("../Mutation Control/dbSNP/XML"):
-    with open("../Mutation Control/dbSNP/XML/" + f) as f2:
-        for line in f2:
-            if line == "\n":  # move to next line if this one is blank
-                continue
-            try:
-                rsid_start = line.index('<Rs rsId="') + len('<Rs rsId="')
-                rsid_end = line.index('"', rsid_start)
-                rsid = "rs" + line[rsid_start: rsid_end]
-                if rsid not in done_ids:
-                    fwrite.write(line)
-                done_ids.add(rsid)
-            except ValueError:
-                print("Error occurred at file " + f + " at line " + line)
-fwrite.close()
+import external_dedup
+
+BATCH_SIZE = 1 << 16  # number of lines passed to the deduplicator at once
+
+with external_dedup.Deduplicator(directory="../Mutation Control/dbSNP") as dedup:
+    keys = []  # refSNP ID numbers of the lines in the current batch
+    lines = []
+    for f in os.listdir("../Mutation Control/dbSNP/XML"):
+        with open("../Mutation Control/dbSNP/XML/" + f) as f2:
+            for line in f2:
+                if line == "\n":  # move to next line if this one is blank
+                    continue
+                try:
+                    rsid_start = line.index('<Rs rsId="') + len('<Rs rsId="')
+                    rsid_end = line.index('"', rsid_start)
+                    keys.append(int(line[rsid_start: rsid_end]))
+                    lines.append(line if line.endswith("\n") else line + "\n")
+                except ValueError:
+                    print("Error occurred at file " + f + " at line " + line)
+                if len(keys) >= BATCH_SIZE:
+                    dedup.add(keys, lines)
+                    keys = []
+                    lines = []
+    dedup.add(keys, lines)
+
+    fwrite = open("../Mutation Control/dbSNP/neutral.xml", "w")
+    fwrite.writelines(dedup.kept_lines())
+    fwrite.close()
@@ -1,14 +1,17 @@
 """It seems that mutation_control1.py downloaded nearly all the data but is missing a few files. This script determines
-which files are missing."""
+which files are missing, from the manifest of the downloads (see download_manifest.py)."""
 
-import os
+import download_manifest
+
+OUTPUT_DIRECTORY = "../Mutation Control/UniProt/"
 
 # obtain IDs of proteins
 ids_file = open("uniprot_human_ids.txt")
 ids = ids_file.read().split()
 ids_file.close()
 
-files = set(os.listdir("../Mutation Control/UniProt/"))
-for x in ids:
-    if (x + ".fasta") not in files:
-        print(x)
+manifest = download_manifest.open_manifest(OUTPUT_DIRECTORY)
+manifest.expect(ids)
+for x in manifest.missing():
+    print(x)
+manifest.close()
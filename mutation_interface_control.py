@@ -2,76 +2,41 @@
 structured interface regions. Also count the number of residues in disordered and structured regions for all
 proteins for which there is at least one mutation, disorder data are available, and interface data are available."""
 
+import index_cache
+import mutation_reader
+import region_index
 
-def range_to_set(r):
-    """Given a string r similar to the form "a;b-c", return the set {a, b, b+1, ... , c-1, c}"""
-    r = [x.split("-") for x in r.split(";")]
-    s = set()
-    for x in r:
-        if len(x) == 1:
-            s.add(int(x[0]))
-        else:
-            s.update(list(range(int(x[0]), int(x[1])+1)))
-    return s
 
+# read cached interface data and construct mapping from UniProt ID to merged intervals of interface domains
+uniprot_interface = index_cache.load_interface_index()
 
-# read interface data file and construct mapping from UniProt ID to set containing locations of interface domains
-with open("../Interface Data/hSIN_organized.txt") as idataf:
-    idata = [x.split() for x in idataf.readlines() if x[:8] != "UniProtA"]
-uniprot_interface = {}
-for x in idata:
-    uniprotid_a = x[0]
-    uniprotid_b = x[1]
-    iregion_a = x[3]
-    iregion_b = x[5]
-    if uniprotid_a in uniprot_interface:
-        uniprot_interface[uniprotid_a].update(range_to_set(iregion_a))
-    else:
-        uniprot_interface[uniprotid_a] = range_to_set(iregion_a)
-    if uniprotid_b in uniprot_interface:
-        uniprot_interface[uniprotid_b].update(range_to_set(iregion_b))
-    else:
-        uniprot_interface[uniprotid_b] = range_to_set(iregion_b)
+# Read cached disorder region data and construct mapping from UniProt ID to merged intervals of disordered
+# regions. Include only DisProt data with experimental evidence.
+uniprot_disorder = index_cache.load_disorder_index("ExpDisProt")
 
-# Read disorder region data file and construct mapping from UniProt ID to set containing locations of disordered
-# regions. Include experimental and predicted data.
-with open("../Disordered Region Data/DisorderData.txt") as ddataf:
-    ddata = []
-    for x in ddataf.readlines():
-        xl = x.rstrip().split("\t")
-        if xl[0] != "Source" and xl[7] == "Exp" and xl[0] == "DisProt":
-            ddata.append(xl)
-uniprot_disorder = {}
-for x in ddata:
-    uniprot = x[1]
-    dregion = x[5]
-    uniprot_disorder[uniprot] = range_to_set(dregion)
-
-# read dbSNP mutation data and consider only missense mutations for proteins that show up in the interface data and
-# the disorder data
-with open("../Mutation Control/MutationControlNeutral.txt") as mutf:
-    mutdata = []
-    for x in mutf.readlines():
-        xl = x.split()
-        if xl[4] == "Missense" and xl[1] in uniprot_interface and xl[1] in uniprot_disorder:
-            mutdata.append(xl)
-
-# count number of mutations in each category
+# Read dbSNP mutation data in batches and count number of mutations in each category. Consider only missense mutations
+# for proteins that show up in the interface data and the disorder data.
+uniprot_codes = {}
+label_codes = {}
+missense = mutation_reader.intern(label_codes, "Missense")
 in_disordered_interface = 0
 in_structured_interface = 0
 mut_uniprot = set()
-for x in mutdata:
-    uniprot = x[1]
-    try:
-        mut_location = int(x[3][1:-1])
-    except ValueError:
-        continue
-    if mut_location in uniprot_interface[uniprot]:
-        if mut_location in uniprot_disorder[uniprot]:
-            in_disordered_interface += 1
-        else:
-            in_structured_interface += 1
-    mut_uniprot.add(uniprot)
+mutation_filepath = "../Mutation Control/MutationControlNeutral.txt"
+for batch in mutation_reader.read_mutation_batches(mutation_filepath, uniprot_codes, label_codes):
+    uniprot_names = mutation_reader.code_names(uniprot_codes)
+    for code, mut_location, mutation_type in zip(batch.uniprot.tolist(), batch.position.tolist(),
+                                                 batch.mutation_type.tolist()):
+        uniprot = uniprot_names[code]
+        if (mutation_type != missense or not mut_location or uniprot not in uniprot_interface
+                or uniprot not in uniprot_disorder):
+            continue
+        if region_index.contains(uniprot_interface[uniprot], mut_location):
+            if region_index.contains(uniprot_disorder[uniprot], mut_location):
+                in_disordered_interface += 1
+            else:
+                in_structured_interface += 1
+        mut_uniprot.add(uniprot)
 
 # count total number of residues in each category
 disordered_interface_size = 0
@@ -80,9 +45,9 @@ total_interface_size = 0
 total_protein_count = 0
 for x in uniprot_interface:
     if x in uniprot_disorder and x in mut_uniprot:
-        disordered_interface_size += len(uniprot_interface[x].intersection(uniprot_disorder[x]))
-        structured_interface_size += len(uniprot_interface[x].difference(uniprot_disorder[x]))
-        total_interface_size += len(uniprot_interface[x])
+        disordered_interface_size += region_index.intersection_size(uniprot_interface[x], uniprot_disorder[x])
+        structured_interface_size += region_index.difference_size(uniprot_interface[x], uniprot_disorder[x])
+        total_interface_size += region_index.size(uniprot_interface[x])
         total_protein_count += 1
 
 print("Control mutations in disordered interface\t" + str(in_disordered_interface))
@@ -0,0 +1,88 @@
+"""Read mutation files in the standard format (columns GeneName, UniProtID, MutationID, ProteinMutation, and optionally
+MutationType and Source) in batches of compact columnar arrays, so that memory use is bounded by the batch size instead
+of the size of the file.
+
+UniProt IDs, mutation types and sources are interned as integer codes. Codes are handed out in order of first
+appearance from dictionaries supplied by the caller, so the same dictionary can be shared across files and batches.
+Residues are stored as their ASCII codes."""
+
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+import common_tools
+
+BATCH_SIZE = 1000000
+
+# Columns of a batch of mutations. uniprot, mutation_type and source hold integer codes. position is the 1-indexed
+# position of the mutation, or 0 if the protein mutation could not be read. original and mutant are ASCII codes of the
+# residues. mutation_type and source are -1 where the file has no such column.
+MutationBatch = namedtuple("MutationBatch", ["uniprot", "position", "original", "mutant", "mutation_type", "source"])
+
+
+def intern(codes, s):
+    """Return the integer code of the string s in the dictionary codes, adding s with the next free code if needed."""
+    code = codes.get(s)
+    if code is None:
+        code = codes[s] = len(codes)
+    return code
+
+
+def code_names(codes):
+    """Given a dictionary of codes, return the list of strings indexed by their code."""
+    names = [None] * len(codes)
+    for s, code in codes.items():
+        names[code] = s
+    return names
+
+
+def make_batch(uniprot, position, original, mutant, mutation_type, source):
+    """Convert the accumulated arrays of one batch into a MutationBatch of NumPy arrays."""
+    return MutationBatch(np.frombuffer(uniprot, dtype=np.int32), np.frombuffer(position, dtype=np.int32),
+                         np.frombuffer(original, dtype=np.uint8), np.frombuffer(mutant, dtype=np.uint8),
+                         np.frombuffer(mutation_type, dtype=np.int32), np.frombuffer(source, dtype=np.int32))
+
+
+def read_mutation_lines(lines, uniprot_codes, label_codes, batch_size=BATCH_SIZE):
+    """Yield MutationBatch objects of at most batch_size mutations from the iterable of lines of a mutation file. A
+    header line is skipped. uniprot_codes and label_codes are dictionaries that intern UniProt IDs and the mutation
+    types and sources respectively."""
+    columns = None
+    for line in lines:
+        xl = line.split()
+        if not xl or xl[0] == "GeneName":
+            continue
+        if columns is None:
+            columns = (array("i"), array("i"), array("B"), array("B"), array("i"), array("i"))
+        uniprot, position, original, mutant, mutation_type, source = columns
+        uniprot.append(intern(uniprot_codes, xl[1]))
+        protein_mutation = xl[3]
+        try:
+            position.append(int(protein_mutation[1:-1]))
+            original.append(ord(protein_mutation[0]))
+            mutant.append(ord(protein_mutation[-1]))
+        except (ValueError, OverflowError):
+            position.append(0)
+            original.append(0)
+            mutant.append(0)
+        mutation_type.append(intern(label_codes, xl[4]) if len(xl) > 4 else -1)
+        source.append(intern(label_codes, xl[5]) if len(xl) > 5 else -1)
+        if len(uniprot) >= batch_size:
+            yield make_batch(*columns)
+            columns = None
+    if columns is not None:
+        yield make_batch(*columns)
+
+
+def read_mutation_batches(filepath, uniprot_codes, label_codes=None, batch_size=BATCH_SIZE, start=0, end=None):
+    """Yield MutationBatch objects of at most batch_size mutations from the mutation file at filepath. If start and end
+    are given, then only the lines that begin within that byte range are read (see common_tools.file_chunks)."""
+    if label_codes is None:
+        label_codes = {}
+    if end is None:
+        with open(filepath) as mutf:
+            yield from read_mutation_lines(mutf, uniprot_codes, label_codes, batch_size)
+    else:
+        yield from read_mutation_lines(common_tools.chunk_lines(filepath, start, end), uniprot_codes, label_codes,
+                                       batch_size)
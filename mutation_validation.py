@@ -0,0 +1,63 @@
+"""Validate many mutations against the canonical UniProt sequences at once. A mutation is valid if its UniProt ID has a
+sequence in the sequence store and the residue at its position is the original residue given in the mutation.
+
+The check is done with NumPy on the memory-mapped residue file of a sequence_store.SequenceStore, and each mutation
+gets one of the following reason codes:
+
+VALID - the original residue matches the sequence
+UNMAPPED - there is no sequence for the UniProt ID
+OUT_OF_RANGE - the position is not within the sequence
+MISMATCH - the residue at the position is not the original residue"""
+
+import numpy as np
+
+VALID = 0
+UNMAPPED = 1
+OUT_OF_RANGE = 2
+MISMATCH = 3
+
+REASON_NAMES = ("Valid", "Unmapped", "OutOfRange", "Mismatch")
+
+
+def residue_codes(residues):
+    """Given a sequence of 1-letter residues or an array of their ASCII codes, return a uint8 array of ASCII codes.
+    Raise ValueError if a residue is not a single character, which would shift the residues after it."""
+    if isinstance(residues, np.ndarray):
+        return residues.astype(np.uint8, copy=False)
+    joined = "".join(residues)
+    if len(joined) != len(residues):
+        raise ValueError("residues must be single characters")
+    return np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+
+
+def validate(store, uniprots, positions, originals):
+    """Given a sequence_store.SequenceStore, a sequence of UniProt IDs, an array of 1-indexed positions, and a
+    sequence of original residues (see residue_codes), return a tuple (valid, reasons). valid is a boolean array that
+    tells whether each mutation is valid, and reasons is a uint8 array of reason codes."""
+    rows = np.fromiter((store.index.get(x, -1) for x in uniprots), dtype=np.int64, count=len(uniprots))
+    positions = np.asarray(positions, dtype=np.int64)
+    originals = residue_codes(originals)
+    # pad with one empty protein so that unmapped rows (-1) can be looked up like the others
+    offsets = np.asarray(store.offsets + [0], dtype=np.int64)
+    lengths = np.asarray(store.lengths + [0], dtype=np.int64)
+
+    reasons = np.full(len(rows), UNMAPPED, dtype=np.uint8)
+    mapped = rows >= 0
+    in_range = mapped & (positions >= 1) & (positions <= lengths[rows])
+    reasons[mapped & ~in_range] = OUT_OF_RANGE
+    residues = np.frombuffer(store.residue_buffer, dtype=np.uint8)
+    matches = np.zeros(len(rows), dtype=bool)
+    matches[in_range] = residues[offsets[rows[in_range]] + positions[in_range] - 1] == originals[in_range]
+    reasons[in_range & ~matches] = MISMATCH
+    reasons[matches] = VALID
+    return matches, reasons
+
+
+def validation_statistics(reasons):
+    """Given an array of reason codes, return a dictionary that maps each name in REASON_NAMES to the number of
+    mutations with that reason. "Invalid" maps to the number of mutations that have a sequence but fail validation,
+    which is how the extraction scripts count invalid mutations and mismatches."""
+    counts = np.bincount(reasons, minlength=len(REASON_NAMES))
+    statistics = {name: int(count) for name, count in zip(REASON_NAMES, counts)}
+    statistics["Invalid"] = statistics["OutOfRange"] + statistics["Mismatch"]
+    return statistics
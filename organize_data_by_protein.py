@@ -4,14 +4,15 @@ potential data overlaps where two experimental regions
 
 Source - database of origin
 
+The raw DisProt and MobiDB entries are read from the archive of json_archive.py.
 """
 
 
 import json
-import io
-import os
 import time
 
+import json_archive
+
 
 def disprot_pfamid(j):
     """Given DisProt json data j, return a semicolon-separated string of the Pfam accession ID(s) for disordered regions
@@ -168,10 +169,11 @@ fwrite = open("DisorderData2.txt", "w")
 fwrite.write("Source\tUniProtID\tLocalID\tPfamID\tSeq\tDRegions\tDMethods\tDMethodType\tPMID\n")
 used_uniprot_ids = set()  # track UniProt IDs of already-used UniProt IDs so that repeat entries can be ignored
 
-# organize DisProt data
-for prot in os.listdir("../Disordered Region Data/DisProt"):
-    with io.open("../Disordered Region Data/DisProt/"+prot, "r", encoding='utf8') as f:
-        text = f.read()
+archive = json_archive.open_archive()
+
+# organize DisProt data in order of DisProt ID, so that the order of the lines does not depend on when the entries
+# were stored in the archive
+for _, _, text in archive.entries(json_archive.DISPROT_ENDPOINT, by_accession=True):
     j = json.loads(text)
     source = "DisProt"
     uniprotid = j["protein"]["uniprot_accession"]
@@ -196,19 +198,13 @@ with open("mobidb_human_ids.txt") as ids_file:
 
 for prot in ids:
     # read and parse files
-    with io.open("../Disordered Region Data/MobiDB/" + prot + "_disorder.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_disorder = json.loads(text)
+    j_disorder = archive.load(prot, "disorder")
     if "error" in j_disorder:
         # If file containing disorder information has an error, then go onto next protein. This means that the
         # database has not been updated to contain detailed information about this protein.
         continue
-    with io.open("../Disordered Region Data/MobiDB/"+prot+"_mobidb.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_mobidb = json.loads(text)
-    with io.open("../Disordered Region Data/MobiDB/"+prot+"_pfam.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_pfam = json.loads(text)
+    j_mobidb = archive.load(prot, "mobidb")
+    j_pfam = archive.load(prot, "pfam")
 
     # obtain experimental data
     source = "MobiDB"
@@ -236,5 +232,6 @@ for prot in ids:
                          "\t" + dmethods + "\t" + dmethodtype + "\t" + dnotes + "\n")
 
 fwrite.close()
+archive.close()
 
 print("Total runtime (s): " + str(time.time()-start_time))
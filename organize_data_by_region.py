@@ -2,11 +2,13 @@
 PfamID, Seq, DStart, DEnd, DSeq, DMethodType, DMethod, DNotes. Each line represents a single disordered region. There
 are potential data overlaps between two experimental regions if their evidence come from different papers.
 
-Source - database of origin"""
+Source - database of origin
+
+The raw DisProt and MobiDB entries are read from the archive of json_archive.py."""
 
 import json
-import io
-import os
+
+import json_archive
 
 
 def disprot_pfamid(j):
@@ -75,10 +77,11 @@ def mobidb_predicted_regions(j):
 fwrite = open("DisorderData.txt", "w")
 fwrite.write("Source\tUniProtID\tLocalID\tPfamID\tSeq\tDStart\tDEnd\tDSeq\tDMethodType\tDMethod\tDNotes\n")
 
-# organize DisProt data
-for prot in os.listdir("../Disordered Region Data/DisProt"):
-    with io.open("../Disordered Region Data/DisProt/"+prot, "r", encoding='utf8') as f:
-        text = f.read()
+archive = json_archive.open_archive()
+
+# organize DisProt data in order of DisProt ID, so that the order of the lines does not depend on when the entries
+# were stored in the archive
+for _, _, text in archive.entries(json_archive.DISPROT_ENDPOINT, by_accession=True):
     j = json.loads(text)
     source = "DisProt"
     uniprotid = j["protein"]["uniprot_accession"]
@@ -104,20 +107,14 @@ with open("mobidb_human_ids.txt") as ids_file:
     ids = ids_file.read().split()
 
 for prot in ids:
-    with io.open("../Disordered Region Data/MobiDB/" + prot + "_disorder.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_disorder = json.loads(text)
+    j_disorder = archive.load(prot, "disorder")
     if "error" in j_disorder:
         # If file containing disorder information has an error, then go onto next protein. This means that the
         # database has not been updated to contain detailed information about this protein.
         print(prot)
         continue
-    with io.open("../Disordered Region Data/MobiDB/"+prot+"_mobidb.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_mobidb = json.loads(text)
-    with io.open("../Disordered Region Data/MobiDB/"+prot+"_pfam.json", "r", encoding='utf8') as f:
-        text = f.read()
-    j_pfam = json.loads(text)
+    j_mobidb = archive.load(prot, "mobidb")
+    j_pfam = archive.load(prot, "pfam")
     source = "MobiDB"
     uniprotid = j_mobidb["acc"]
     localid = j_mobidb["ename"]
@@ -141,3 +138,5 @@ for prot in ids:
         dnotes = "None"
         fwrite.write(source + "\t" + uniprotid + "\t" + localid + "\t" + pfamid + "\t" + seq + "\t" + str(dstart) +
                        "\t" + str(dend) + "\t" + dseq + "\t" + dmethodtype + "\t" + dmethod + "\t" + dnotes + "\n")
+
+archive.close()
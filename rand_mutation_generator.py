@@ -1,46 +1,58 @@
 """Generate random protein mutations. Create the file ../Mutation Control/Random.txt"""
 
+import bisect
 import common_tools
+import external_dedup
+import interning
 import random
-import os
+import sequence_store
 
 NUM_MUTATIONS = 10_000_000
 OUTPUT = "../Mutation Control/Random.txt"
+BATCH_SIZE = 1 << 20  # number of mutations passed to the deduplicator at once
 
-uniprot_all = list(x[:x.index(".")] for x in os.listdir("../UniProt Sequences"))  # list of all UniProt IDs
 amino_acids = list(common_tools.amino_acid_abbrev.values())  # list of all 1-letter amino acid abbreviations
-uniprot2seq = common_tools.uniprot2seq(uniprot_all)  # map from UniProt ID to protein sequence prepended with >
+uniprot2seq = sequence_store.open_store()  # memory-mapped map from UniProt ID to protein sequence prepended with >
+uniprot_codes = interning.open_codes(uniprot2seq)
 
 print("begin generating random mutations")
 
-# generate sample set of all (uniprot id, mutation position) pairs
-uniprot_position_sampleset = []
-for uniprotid in uniprot2seq:
-    positions = range(1, len(uniprot2seq[uniprotid]))
-    uniprot_position_sampleset.extend((uniprotid, position) for position in positions)
-
-rand_mutations = set()  # set of (UniProt ID, mutation) tuples
-while len(rand_mutations) < NUM_MUTATIONS:
-    uniprotid, mut_position = random.choice(uniprot_position_sampleset)
-
-    # generate mutation from the UniProt ID
-    try:
-        seq = uniprot2seq[uniprotid]
-    except KeyError:
-        continue
-    mut_from = seq[mut_position]
-    mut_to = mut_from
-    while mut_to == mut_from:
-        mut_to = random.choice(amino_acids)
-    mutation = mut_from + str(mut_position) + mut_to
-
-    rand_mutations.add((uniprotid, mutation))
-
-# write to file
-output_file = open(OUTPUT, "w")
-output_file.write("GeneName\tUniProtID\tMutationID\tProteinMutation\n")
-i = 1
-for rand_mutation in rand_mutations:
-    output_file.write(f"-\t{rand_mutation[0]}\tRandom{i}\t{rand_mutation[1]}\n")
-    i += 1
-output_file.close()
+# Every (UniProt ID, mutation position) pair is equally likely. A pair is sampled by drawing one of all residues of all
+# proteins and finding the protein it belongs to from the offsets of the sequence store.
+total_residues = uniprot2seq.offsets[-1] + uniprot2seq.lengths[-1]
+
+# Mutations are generated in rounds, each of which generates as many mutations as are still missing. Repeats are removed
+# with external_dedup.py, so the mutations generated so far are not held in memory.
+with external_dedup.Deduplicator(directory="../Mutation Control") as dedup:
+    num_distinct = 0
+    while num_distinct < NUM_MUTATIONS:
+        for batch_start in range(num_distinct, NUM_MUTATIONS, BATCH_SIZE):
+            keys = []
+            lines = []  # lines of "UniProt ID\tmutation"
+            for _ in range(min(BATCH_SIZE, NUM_MUTATIONS - batch_start)):
+                residue = random.randrange(total_residues)
+                i = bisect.bisect_right(uniprot2seq.offsets, residue) - 1
+                uniprotid = uniprot2seq.uniprot_ids[i]
+                mut_position = residue - uniprot2seq.offsets[i] + 1
+
+                # generate mutation from the UniProt ID
+                mut_from = uniprot2seq.residue(uniprotid, mut_position)
+                mut_to = mut_from
+                while mut_to == mut_from:
+                    mut_to = random.choice(amino_acids)
+                mutation = mut_from + str(mut_position) + mut_to
+
+                keys.append(interning.pack_mutation(uniprot_codes.code(uniprotid), mutation))
+                lines.append(f"{uniprotid}\t{mutation}\n")
+            dedup.add(keys, lines)
+        num_distinct = dedup.merge()
+
+    # write to file
+    output_file = open(OUTPUT, "w")
+    output_file.write("GeneName\tUniProtID\tMutationID\tProteinMutation\n")
+    i = 1
+    for line in dedup.kept_lines():
+        uniprotid, mutation = line.rstrip("\n").split("\t")
+        output_file.write(f"-\t{uniprotid}\tRandom{i}\t{mutation}\n")
+        i += 1
+    output_file.close()
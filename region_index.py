@@ -0,0 +1,153 @@
+"""Represent regions of a protein as sorted lists of merged (start, end) intervals instead of sets of residue
+positions.
+
+A region string of the form "a;b-c" (as found in hSIN_organized.txt and DisorderData.txt) becomes the list
+[(a, a), (b, c)] after overlapping and adjacent intervals are merged. Point lookups are done by bisection, and sizes of
+intersections and differences are computed by walking both interval lists at once, so no residue sets are built."""
+
+import bisect
+import sys
+
+INTERFACE_FILEPATH = "../Interface Data/hSIN_organized.txt"
+DISORDER_FILEPATH = "../Disordered Region Data/DisorderData.txt"
+DISORDER_TYPES = ("All", "Exp", "DisProt")  # types of disordered region accepted by the counting scripts
+# all types of disordered region that can be indexed, where "ExpDisProt" is the DisProt regions with experimental
+# evidence, used by mutation_interface_control.py
+INDEX_TYPES = DISORDER_TYPES + ("ExpDisProt",)
+
+
+def merge_intervals(intervals):
+    """Given an iterable of (start, end) tuples, return a sorted list of (start, end) tuples that covers exactly the
+    same residues, where no two intervals overlap or are adjacent. Intervals with end < start are empty and are
+    dropped."""
+    merged = []
+    for start, end in sorted(x for x in intervals if x[1] >= x[0]):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def region_to_intervals(r):
+    """Given a string r similar to the form "a;b-c", return the list of merged intervals [(a, a), (b, c)]. This covers
+    the same residues as the set {a, b, b+1, ... , c-1, c}."""
+    intervals = []
+    for x in r.split(";"):
+        x = x.split("-")
+        if len(x) == 1:
+            intervals.append((int(x[0]), int(x[0])))
+        else:
+            intervals.append((int(x[0]), int(x[1])))
+    return merge_intervals(intervals)
+
+
+def contains(intervals, position):
+    """Return whether the integer position lies within one of the merged intervals."""
+    i = bisect.bisect_right(intervals, (position, sys.maxsize)) - 1
+    return i >= 0 and intervals[i][1] >= position
+
+
+def size(intervals):
+    """Return the number of residues covered by the merged intervals."""
+    return sum(end - start + 1 for start, end in intervals)
+
+
+def intersection(a, b):
+    """Given two lists of merged intervals a and b, return the list of merged intervals covering the residues that are
+    in both a and b."""
+    result = []
+    i = 0
+    j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def intersection_size(a, b):
+    """Return the number of residues that are in both lists of merged intervals a and b."""
+    return size(intersection(a, b))
+
+
+def difference_size(a, b):
+    """Return the number of residues that are in the list of merged intervals a but not in b."""
+    return size(a) - intersection_size(a, b)
+
+
+def load_interface_index(filepath=INTERFACE_FILEPATH):
+    """Read the organized hSIN interface data file and return a dictionary that maps each UniProt ID to the merged
+    intervals of all its interface regions, taken over every interaction the protein takes part in."""
+    uniprot_intervals = {}
+    with open(filepath) as idataf:
+        for line in idataf:
+            if line[:8] == "UniProtA":
+                continue
+            x = line.split()
+            uniprot_intervals.setdefault(x[0], []).extend(region_to_intervals(x[3]))
+            uniprot_intervals.setdefault(x[1], []).extend(region_to_intervals(x[5]))
+    return {uniprot: merge_intervals(intervals) for uniprot, intervals in uniprot_intervals.items()}
+
+
+def load_domain_index(filepath=INTERFACE_FILEPATH):
+    """Read the organized hSIN interface data file and return a dictionary that maps each UniProt ID to a dictionary
+    that maps each Pfam ID of its interface domains to the merged intervals of all instances of that domain. The Pfam
+    IDs in the PfamA and PfamB columns correspond in order to the regions in the ResiduesA and ResiduesB columns."""
+    uniprot_domains = {}
+    with open(filepath) as idataf:
+        for line in idataf:
+            if line[:8] == "UniProtA":
+                continue
+            x = line.split()
+            for uniprot, pfams, regions in ((x[0], x[2], x[3]), (x[1], x[4], x[5])):
+                domains = uniprot_domains.setdefault(uniprot, {})
+                for pfam, region in zip(pfams.split(";"), regions.split(";")):
+                    domains.setdefault(pfam, []).extend(region_to_intervals(region))
+    return {uniprot: {pfam: merge_intervals(intervals) for pfam, intervals in domains.items()}
+            for uniprot, domains in uniprot_domains.items()}
+
+
+def disorder_type_matches(xl, disorder_type):
+    """Given a split line xl of the disorder data file, return whether its regions belong to the type of disordered
+    region disorder_type, which must be one of INDEX_TYPES."""
+    if disorder_type == "DisProt":
+        return xl[0] == "DisProt"
+    elif disorder_type == "Exp":
+        return xl[7] == "Exp"
+    elif disorder_type == "All":
+        return True
+    elif disorder_type == "ExpDisProt":
+        return xl[0] == "DisProt" and xl[7] == "Exp"
+    assert False, "Incorrect disorder type indicated"
+
+
+def load_disorder_indexes(filepath=DISORDER_FILEPATH, disorder_types=INDEX_TYPES):
+    """Read the disorder data file and return a dictionary that maps each type of disordered region in disorder_types
+    to the index of that type, as returned by load_disorder_index. All of the types are read in a single pass."""
+    type_indexes = {x: {} for x in disorder_types}
+    with open(filepath) as ddataf:
+        for line in ddataf:
+            xl = line.rstrip().split("\t")
+            if xl[0] == "Source":
+                continue
+            intervals = None
+            for disorder_type, uniprot_intervals in type_indexes.items():
+                if disorder_type_matches(xl, disorder_type):
+                    if intervals is None:
+                        intervals = region_to_intervals(xl[5])
+                    uniprot_intervals[xl[1]] = intervals
+    return type_indexes
+
+
+def load_disorder_index(disorder_type, filepath=DISORDER_FILEPATH):
+    """Read the disorder data file and return a dictionary that maps each UniProt ID to the merged intervals of its
+    disordered regions. Only regions of type disorder_type (one of INDEX_TYPES) are included. If a protein appears on
+    more than one line, then the last line is used."""
+    return load_disorder_indexes(filepath, (disorder_type,))[disorder_type]
@@ -0,0 +1,167 @@
+"""Annotate every residue of every protein with bit flags stored in a single compact uint8 array.
+
+The residues of all proteins are laid out one after another. Residue p (1-indexed) of the protein with index i is at
+flags[offsets[i] + p - 1], and the residues of that protein end at offsets[i+1]. Each residue carries the following
+flags:
+
+INTERFACE - the residue is in an interface region of hSIN_organized.txt
+ALL_DISORDER - the residue is in a disordered region of type "All"
+EXP_DISORDER - the residue is in a disordered region of type "Exp"
+DISPROT_DISORDER - the residue is in a disordered region of type "DisProt"
+
+The disordered regions of each type are those of region_index.load_disorder_index, so if a protein appears on more
+than one line of that type in DisorderData.txt, then only the last line is used.
+
+protein_flags holds the same flags for each protein and records whether any interface or disorder data of that kind are
+available for it, even if the data cover no residues. Classifying mutations then becomes a single gather over
+offsets + positions, and numbers of residues become counts of set flags."""
+
+from collections import namedtuple
+
+import numpy as np
+
+INTERFACE = 1
+ALL_DISORDER = 2
+EXP_DISORDER = 4
+DISPROT_DISORDER = 8
+
+# flag of each type of disordered region that the counting scripts accept
+DISORDER_MASKS = {"All": ALL_DISORDER,
+                  "Exp": EXP_DISORDER,
+                  "DisProt": DISPROT_DISORDER}
+
+ResidueAnnotation = namedtuple("ResidueAnnotation", ["uniprot_ids", "protein_index", "offsets", "flags",
+                                                     "protein_flags"])
+
+# Interface domains laid out over the residues of a ResidueAnnotation, with one element for each merged interval of a
+# Pfam domain on a protein. protein holds protein indexes, pfam holds indexes into pfam_ids, and starts and ends are
+# the indexes into the flags array of the first residue and one past the last residue of the interval.
+DomainTable = namedtuple("DomainTable", ["pfam_ids", "protein", "pfam", "starts", "ends"])
+
+
+def build_annotation(uniprot_interface, disorder_indexes, uniprot_lengths):
+    """Construct the ResidueAnnotation.
+
+    uniprot_interface maps UniProt ID to the merged intervals of its interface regions.
+    disorder_indexes maps each type of disordered region to a dictionary that maps UniProt ID to the merged intervals
+    of its disordered regions of that type, as returned by region_index.load_disorder_indexes. Types that are not in
+    DISORDER_MASKS are ignored.
+    uniprot_lengths maps UniProt ID to the length of its sequence.
+
+    Each protein gets as many residues as its sequence or its last annotated residue, whichever is larger, so that no
+    annotated residue is lost when a region runs past the end of the sequence or when a sequence is missing. Proteins
+    with no residues at all are left out."""
+    lengths = dict(uniprot_lengths)
+    for uniprot, intervals in uniprot_interface.items():
+        if intervals:
+            lengths[uniprot] = max(lengths.get(uniprot, 0), intervals[-1][1])
+    disorder_indexes = {x: disorder_indexes[x] for x in DISORDER_MASKS if x in disorder_indexes}
+    for uniprot_disorder in disorder_indexes.values():
+        for uniprot, intervals in uniprot_disorder.items():
+            if intervals:
+                lengths[uniprot] = max(lengths.get(uniprot, 0), intervals[-1][1])
+    uniprot_ids = sorted(x for x in lengths if lengths[x] > 0)
+    protein_index = {uniprot: i for i, uniprot in enumerate(uniprot_ids)}
+    offsets = np.zeros(len(uniprot_ids) + 1, dtype=np.int64)
+    np.cumsum([lengths[x] for x in uniprot_ids], out=offsets[1:])
+
+    flags = np.zeros(offsets[-1], dtype=np.uint8)
+    protein_flags = np.zeros(len(uniprot_ids), dtype=np.uint8)
+
+    def mark(uniprot, intervals, flag):
+        i = protein_index[uniprot]
+        protein_flags[i] |= flag
+        for start, end in intervals:
+            flags[offsets[i] + max(start, 1) - 1: offsets[i] + end] |= flag
+
+    for uniprot, intervals in uniprot_interface.items():
+        if uniprot in protein_index:
+            mark(uniprot, intervals, INTERFACE)
+    for disorder_type, uniprot_disorder in disorder_indexes.items():
+        for uniprot, intervals in uniprot_disorder.items():
+            if uniprot in protein_index:
+                mark(uniprot, intervals, DISORDER_MASKS[disorder_type])
+    return ResidueAnnotation(uniprot_ids, protein_index, offsets, flags, protein_flags)
+
+
+def build_domain_table(annotation, uniprot_domains):
+    """Given a dictionary that maps UniProt ID to a dictionary that maps Pfam ID to merged intervals (as returned by
+    region_index.load_domain_index), return the DomainTable of the annotated proteins."""
+    pfam_ids = sorted({pfam for domains in uniprot_domains.values() for pfam in domains})
+    pfam_index = {pfam: i for i, pfam in enumerate(pfam_ids)}
+    protein = []
+    pfam = []
+    starts = []
+    ends = []
+    for uniprot, domains in uniprot_domains.items():
+        i = annotation.protein_index.get(uniprot)
+        if i is None:
+            continue
+        offset = int(annotation.offsets[i])
+        for pfam_id, intervals in domains.items():
+            for start, end in intervals:
+                protein.append(i)
+                pfam.append(pfam_index[pfam_id])
+                starts.append(offset + max(start, 1) - 1)
+                ends.append(offset + end)
+    return DomainTable(pfam_ids, np.array(protein, dtype=np.int64), np.array(pfam, dtype=np.int64),
+                       np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64))
+
+
+def protein_codes(annotation, uniprot_ids):
+    """Given a sequence of UniProt IDs, return an array of their protein indexes in annotation, where IDs that are not
+    annotated get -1."""
+    return np.fromiter((annotation.protein_index.get(x, -1) for x in uniprot_ids), dtype=np.int64,
+                       count=len(uniprot_ids))
+
+
+def classify(annotation, codes, positions):
+    """Given an array of protein indexes and an array of 1-indexed positions, return a tuple (residue_flags,
+    protein_flags) of uint8 arrays that hold the flags of each mutated residue and of its protein. Indexes that are
+    negative or past the last annotated protein stand for unknown proteins, which get no flags. Positions outside the
+    annotated protein get no residue flags."""
+    codes = np.asarray(codes, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64)
+    known = (codes >= 0) & (codes < len(annotation.protein_flags))
+    safe_codes = np.where(known, codes, 0)
+    starts = annotation.offsets[safe_codes]
+    inside = known & (positions >= 1) & (positions <= annotation.offsets[safe_codes + 1] - starts)
+    residue_flags = np.zeros(len(codes), dtype=np.uint8)
+    residue_flags[inside] = annotation.flags[starts[inside] + positions[inside] - 1]
+    protein_flags = np.where(known, annotation.protein_flags[safe_codes], 0).astype(np.uint8)
+    return residue_flags, protein_flags
+
+
+def count_per_range(residue_mask, starts, ends):
+    """Given a boolean array with one element per residue and arrays of range boundaries, return an array with the
+    number of True elements in residue_mask[starts[i]: ends[i]] for each i."""
+    cumulative = np.zeros(len(residue_mask) + 1, dtype=np.int64)
+    np.cumsum(residue_mask, out=cumulative[1:])
+    return cumulative[ends] - cumulative[starts]
+
+
+def count_per_protein(annotation, residue_mask):
+    """Given a boolean array with one element per residue, return an array with the number of True elements in each
+    protein."""
+    return count_per_range(residue_mask, annotation.offsets[:-1], annotation.offsets[1:])
+
+
+def interface_residue_masks(annotation, disorder_type):
+    """Return a tuple (disordered, structured) of boolean arrays that tell whether each residue is a disordered
+    interface residue or a structured interface residue, where disorder_type is "All", "Exp", or "DisProt"."""
+    interface = (annotation.flags & INTERFACE) != 0
+    disordered = (annotation.flags & DISORDER_MASKS[disorder_type]) != 0
+    return interface & disordered, interface & ~disordered
+
+
+def interface_residue_totals(annotation, disorder_type):
+    """Return a tuple (disordered, structured) of arrays that hold the number of disordered interface residues and
+    structured interface residues of each protein, where disorder_type is "All", "Exp", or "DisProt"."""
+    return tuple(count_per_protein(annotation, x) for x in interface_residue_masks(annotation, disorder_type))
+
+
+def domain_residue_totals(annotation, domain_table, disorder_type):
+    """Return a tuple (disordered, structured) of arrays that hold the number of disordered interface residues and
+    structured interface residues in each interval of domain_table."""
+    return tuple(count_per_range(x, domain_table.starts, domain_table.ends)
+                 for x in interface_residue_masks(annotation, disorder_type))
@@ -0,0 +1,78 @@
+"""Tests of the disordered regions read by region_index.py and of the residue flags that residue_annotation.py builds
+from them, on a small disorder data file with more than one line for some proteins. Run them with
+    python -m pytest residue_annotation_test.py"""
+
+import numpy as np
+
+import region_index
+import residue_annotation
+
+# P1 and P2 have several lines of different sources and evidence, and only the last line of each type counts
+DISORDER_LINES = [("Source", "UniProtID", "LocalID", "PfamID", "Seq", "DRegions", "DMethods", "DMethodType", "PMID"),
+                  ("MobiDB", "P1", "x", "None", "", "1-10", "m", "Exp", "None"),
+                  ("DisProt", "P2", "x", "None", "", "1-50", "m", "Exp", "None"),
+                  ("DisProt", "P1", "x", "None", "", "20-30", "m", "Exp", "None"),
+                  ("IDEAL", "P2", "x", "None", "", "60-70", "m", "Exp", "None"),
+                  ("MobiDB", "P3", "x", "None", "", "10-20", "m", "Pred", "None"),
+                  ("MobiDB", "P1", "x", "None", "", "5-8;40-45", "m", "Pred", "None"),
+                  ("DisProt", "P2", "x", "None", "", "2-3", "m", "Pred", "None")]
+
+EXPECTED_INDEXES = {"All": {"P1": [(5, 8), (40, 45)], "P2": [(2, 3)], "P3": [(10, 20)]},
+                    "Exp": {"P1": [(20, 30)], "P2": [(60, 70)]},
+                    "DisProt": {"P1": [(20, 30)], "P2": [(2, 3)]},
+                    "ExpDisProt": {"P1": [(20, 30)], "P2": [(1, 50)]}}
+
+UNIPROT_INTERFACE = {"P1": [(1, 50)], "P2": [(1, 80)], "P3": [(1, 30)], "P4": [(1, 10)]}
+UNIPROT_LENGTHS = {"P1": 50, "P2": 80, "P3": 30, "P4": 10}
+
+# numbers of disordered and structured interface residues of the proteins with disorder data of each type
+EXPECTED_TOTALS = {"All": (23, 137), "Exp": (22, 108), "DisProt": (13, 117)}
+
+
+def write_disorder_file(tmp_path):
+    filepath = str(tmp_path / "DisorderData.txt")
+    with open(filepath, "w") as ddataf:
+        ddataf.writelines("\t".join(x) + "\n" for x in DISORDER_LINES)
+    return filepath
+
+
+def test_last_line_of_each_type(tmp_path):
+    """Each type of disordered region keeps the regions of the last line of that type for a protein."""
+    filepath = write_disorder_file(tmp_path)
+    assert region_index.load_disorder_indexes(filepath) == EXPECTED_INDEXES
+    for disorder_type in region_index.INDEX_TYPES:
+        assert region_index.load_disorder_index(disorder_type, filepath) == EXPECTED_INDEXES[disorder_type]
+
+
+def test_interface_residue_totals(tmp_path):
+    """The residue counts of the annotation agree with the sets of residues of the last lines."""
+    annotation = residue_annotation.build_annotation(
+        UNIPROT_INTERFACE, region_index.load_disorder_indexes(write_disorder_file(tmp_path)), UNIPROT_LENGTHS)
+    for disorder_type, expected in EXPECTED_TOTALS.items():
+        considered = ((annotation.protein_flags & residue_annotation.INTERFACE) != 0) & (
+            (annotation.protein_flags & residue_annotation.DISORDER_MASKS[disorder_type]) != 0)
+        totals = residue_annotation.interface_residue_totals(annotation, disorder_type)
+        assert tuple(int(x[considered].sum()) for x in totals) == expected
+
+        uniprot_disorder = EXPECTED_INDEXES[disorder_type]
+        sizes = [0, 0]
+        for uniprot in uniprot_disorder:
+            interface = {p for start, end in UNIPROT_INTERFACE[uniprot] for p in range(start, end + 1)}
+            disorder = {p for start, end in uniprot_disorder[uniprot] for p in range(start, end + 1)}
+            sizes[0] += len(interface & disorder)
+            sizes[1] += len(interface - disorder)
+        assert tuple(sizes) == expected
+
+
+def test_classify(tmp_path):
+    """A residue is disordered for a type only if the last line of that type covers it."""
+    annotation = residue_annotation.build_annotation(
+        UNIPROT_INTERFACE, region_index.load_disorder_indexes(write_disorder_file(tmp_path)), UNIPROT_LENGTHS)
+    codes = residue_annotation.protein_codes(annotation, ["P1", "P1", "P2", "P3", "P4"])
+    residue_flags, protein_flags = residue_annotation.classify(annotation, codes, np.array([25, 6, 65, 15, 5]))
+    all_flag = residue_annotation.ALL_DISORDER
+    exp_flag = residue_annotation.EXP_DISORDER
+    disprot_flag = residue_annotation.DISPROT_DISORDER
+    disorder_flags = all_flag | exp_flag | disprot_flag
+    assert (residue_flags & disorder_flags).tolist() == [exp_flag | disprot_flag, all_flag, exp_flag, all_flag, 0]
+    assert (protein_flags & disorder_flags).tolist() == [disorder_flags, disorder_flags, disorder_flags, all_flag, 0]
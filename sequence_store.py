@@ -0,0 +1,114 @@
+"""Pack the FASTA files in ../UniProt Sequences into a single file of concatenated residues with an offset/length
+index, and read residues from it through a memory map without loading every sequence.
+
+The residue file holds the sequences of all proteins one after another as ASCII, without headers or newlines. The
+index is a tab-delimited file with columns UniProtID, Offset, and Length, sorted by UniProt ID. Obsolete UniProt
+entries, which have empty FASTA files, are left out.
+
+Run this script to (re)build the store after the contents of ../UniProt Sequences change."""
+
+import collections.abc
+import mmap
+import os
+
+SEQUENCE_DIRECTORY = "../UniProt Sequences"
+STORE_FILEPATH = "../UniProt Sequences.dat"
+INDEX_FILEPATH = "../UniProt Sequences.idx"
+
+
+def build_store(directory=SEQUENCE_DIRECTORY, store_filepath=STORE_FILEPATH, index_filepath=INDEX_FILEPATH):
+    """Read every FASTA file in directory and write the residue file and its index. Both files are written under
+    temporary names first so that readers never see a partially built store."""
+    uniprots = sorted(x[:x.index(".")] for x in os.listdir(directory))
+    offset = 0
+    with open(store_filepath + ".tmp", "wb") as store_file, open(index_filepath + ".tmp", "w") as index_file:
+        index_file.write("UniProtID\tOffset\tLength\n")
+        for uniprot in uniprots:
+            with open(os.path.join(directory, uniprot + ".fasta")) as seq_file:
+                seq = seq_file.read()
+            try:
+                seq = seq[seq.index("\n")+1:].replace("\n", "")
+            except ValueError:  # ignore obsolete UniProt entries, which have empty FASTA files
+                continue
+            store_file.write(seq.encode("ascii"))
+            index_file.write(uniprot + "\t" + str(offset) + "\t" + str(len(seq)) + "\n")
+            offset += len(seq)
+    os.replace(store_filepath + ".tmp", store_filepath)
+    os.replace(index_filepath + ".tmp", index_filepath)
+
+
+class SequenceStore(collections.abc.Mapping):
+    """Read-only mapping from UniProt ID to protein sequence backed by the memory-mapped residue file.
+
+    Like the dictionaries returned by common_tools.uniprot2seq, store[uniprot] is the sequence prepended with ">", so
+    that it can be indexed by 1-indexed position. residue() and residues() read single residues or ranges without
+    building the whole sequence string."""
+
+    def __init__(self, store_filepath=STORE_FILEPATH, index_filepath=INDEX_FILEPATH):
+        self.uniprot_ids = []
+        self.offsets = []
+        self.lengths = []
+        with open(index_filepath) as index_file:
+            next(index_file)  # skip header
+            for line in index_file:
+                uniprot, offset, length = line.split()
+                self.uniprot_ids.append(uniprot)
+                self.offsets.append(int(offset))
+                self.lengths.append(int(length))
+        self.index = {uniprot: i for i, uniprot in enumerate(self.uniprot_ids)}
+        with open(store_filepath, "rb") as store_file:
+            if os.fstat(store_file.fileno()).st_size:
+                self.residue_buffer = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.residue_buffer = b""  # an empty file cannot be memory-mapped
+
+    def __getitem__(self, uniprot):
+        i = self.index[uniprot]
+        return ">" + self.residue_buffer[self.offsets[i]: self.offsets[i] + self.lengths[i]].decode("ascii")
+
+    def __contains__(self, uniprot):
+        return uniprot in self.index
+
+    def __iter__(self):
+        return iter(self.uniprot_ids)
+
+    def __len__(self):
+        return len(self.uniprot_ids)
+
+    def length(self, uniprot):
+        """Return the number of residues of the protein. Raise KeyError if the protein is not in the store."""
+        return self.lengths[self.index[uniprot]]
+
+    def residue(self, uniprot, position):
+        """Return the residue at the 1-indexed position of the protein. Raise KeyError if the protein is not in the
+        store and IndexError if the position is out of range."""
+        i = self.index[uniprot]
+        if not 1 <= position <= self.lengths[i]:
+            raise IndexError("position {} out of range for {}".format(position, uniprot))
+        return chr(self.residue_buffer[self.offsets[i] + position - 1])
+
+    def residues(self, uniprot, start, end):
+        """Return the residues from 1-indexed position start through end, inclusive, of the protein. The range is
+        clipped to the sequence. Raise KeyError if the protein is not in the store."""
+        i = self.index[uniprot]
+        start = max(start, 1)
+        end = min(end, self.lengths[i])
+        return self.residue_buffer[self.offsets[i] + start - 1: self.offsets[i] + max(end, start - 1)].decode("ascii")
+
+    def close(self):
+        """Release the memory map."""
+        if isinstance(self.residue_buffer, mmap.mmap):
+            self.residue_buffer.close()
+
+
+def open_store(store_filepath=STORE_FILEPATH, index_filepath=INDEX_FILEPATH):
+    """Return the SequenceStore, building it from ../UniProt Sequences first if it does not exist yet."""
+    if not (os.path.isfile(store_filepath) and os.path.isfile(index_filepath)):
+        build_store(store_filepath=store_filepath, index_filepath=index_filepath)
+    return SequenceStore(store_filepath, index_filepath)
+
+
+if __name__ == "__main__":
+    print("Packing sequences from " + SEQUENCE_DIRECTORY)
+    build_store()
+    print("Done")